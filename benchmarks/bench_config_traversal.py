@@ -0,0 +1,152 @@
+"""
+Compares the iterative NeXus JSON traversal in config_from_json with the
+previous recursive implementation on synthetic deep and wide trees.
+
+Run from the repository root, e.g.:
+
+    python -m benchmarks.bench_config_traversal --depth 8 --width 6 --repeat 5 -o results.json
+
+The results are printed as JSON and optionally written to a file.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src.config_from_json import find_all_modules_with_named_paths
+
+
+def recursive_traverse_json_named_paths(json_obj, condition_fn, action_fn, path=[]):
+    """
+    The recursive traversal this benchmark compares against, copying the path at every level.
+    """
+    if isinstance(json_obj, dict):
+        if "name" in json_obj:
+            current_path = path + [json_obj["name"]]
+        else:
+            current_path = path
+
+        if condition_fn(json_obj):
+            action_fn(json_obj, current_path)
+
+        for key, value in json_obj.items():
+            if key != "name" and (current_path == path or key == "children"):
+                recursive_traverse_json_named_paths(value, condition_fn, action_fn, current_path)
+    elif isinstance(json_obj, list):
+        for item in json_obj:
+            recursive_traverse_json_named_paths(item, condition_fn, action_fn, path)
+
+
+def recursive_find_all_modules_with_named_paths(json_obj):
+    found_modules = []
+
+    def condition_fn(node):
+        return isinstance(node, dict) and "module" in node
+
+    def action_fn(node, path):
+        if "config" in node and "source" in node["config"]:
+            found_modules.append({"path": "/".join(path), "config": node["config"], "module": node["module"]})
+
+    recursive_traverse_json_named_paths(json_obj, condition_fn, action_fn)
+    return found_modules
+
+
+def make_tree(depth, width, level=0):
+    """
+    A NeXus-like tree of groups `depth` levels deep with `width` subgroups
+    per group. Every group has attributes, a dataset and an f144 module.
+    """
+    group = {
+        "name": f"group_{level}",
+        "type": "group",
+        "attributes": [{"name": "NX_class", "dtype": "string", "values": "NXcollection"}],
+        "children": [
+            {"module": "dataset", "config": {"name": "description", "values": "synthetic"}},
+            {
+                "module": "f144",
+                "config": {"source": f"SIM_{level}", "topic": "motion", "dtype": "double", "value_units": "mm"},
+            },
+        ],
+    }
+    if level < depth:
+        group["children"].extend(make_tree(depth, width, level + 1) for _ in range(width))
+    return group
+
+
+def make_deep_tree(depth):
+    """
+    A single chain of groups, deeper than the recursion limit for large depths.
+    """
+    node = {"module": "f144", "config": {"source": "SIM_deep", "topic": "motion"}}
+    for level in range(depth):
+        node = {"name": f"group_{level}", "children": [node]}
+    return node
+
+
+def count_nodes(json_obj):
+    count = 0
+    stack = [json_obj]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if isinstance(node, dict):
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return count
+
+
+def time_function(function, tree, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            modules = function(tree)
+        except RecursionError:
+            return {"error": "RecursionError"}
+        timings.append(time.perf_counter() - start)
+    return {"modules": len(modules), "best_s": min(timings), "mean_s": sum(timings) / len(timings)}
+
+
+def run_case(name, tree, repeat):
+    recursive = time_function(recursive_find_all_modules_with_named_paths, tree, repeat)
+    iterative = time_function(find_all_modules_with_named_paths, tree, repeat)
+    result = {"case": name, "nodes": count_nodes(tree), "recursive": recursive, "iterative": iterative}
+    if "best_s" in recursive and "best_s" in iterative:
+        result["speedup"] = recursive["best_s"] / iterative["best_s"]
+    return result
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the NeXus JSON traversal.")
+    parser.add_argument("--depth", type=int, default=7, help="Depth of the wide tree.")
+    parser.add_argument("--width", type=int, default=6, help="Number of subgroups per group of the wide tree.")
+    parser.add_argument("--deep", type=int, default=5000, help="Depth of the single chain tree.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs per case.")
+    parser.add_argument("-o", "--output", default=None, help="Also write the results to this JSON file.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    results = {
+        "environment": {"python": platform.python_version(), "machine": platform.machine()},
+        "results": [
+            run_case(f"wide depth={args.depth} width={args.width}", make_tree(args.depth, args.width), args.repeat),
+            run_case(f"deep depth={args.deep}", make_deep_tree(args.deep), args.repeat),
+        ],
+    }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+
+
+if __name__ == "__main__":
+    main()
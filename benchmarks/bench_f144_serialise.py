@@ -0,0 +1,99 @@
+"""
+Compares serialising f144 messages with serialise_f144 for every message
+against the per-device templates of DeviceF144.gen_message, in messages
+per second on one core.
+
+Run from the repository root, e.g.:
+
+    python -m benchmarks.bench_f144_serialise --messages 200000 --repeat 5 -o results.json
+
+The results are printed as JSON and optionally written to a file.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+from streaming_data_types import serialise_f144
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src.module_f144 import DeviceF144
+
+
+def make_cases(array_size):
+    rng = np.random.default_rng(0)
+    return {
+        "double": [float(value) for value in rng.normal(10, 1, 1000)],
+        "long": [int(value) for value in rng.integers(1, 1 << 40, 1000)],
+        "float": list(rng.normal(10, 1, 1000).astype(np.float32)),
+        f"double[{array_size}]": [rng.normal(10, 1, array_size) for _ in range(10)],
+    }
+
+
+def time_function(function, values, messages, repeat):
+    timestamp_ns = time.time_ns()
+    rounds = max(messages // len(values), 1)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for value in values:
+                function(value, timestamp_ns)
+        timings.append(time.perf_counter() - start)
+    count = rounds * len(values)
+    return {"messages": count, "best_per_s": count / min(timings), "mean_per_s": count * repeat / sum(timings)}
+
+
+def run_case(name, values, messages, repeat):
+    device = DeviceF144(source_name="SIM:instrument:motor:position", topic="motion")
+
+    def reference(value, timestamp_ns):
+        return serialise_f144(device.source_name, value, timestamp_ns)
+
+    identical = all(device.gen_message(value, 1) == reference(value, 1) for value in values)
+    serialise = time_function(reference, values, messages, repeat)
+    template = time_function(device.gen_message, values, messages, repeat)
+    return {
+        "case": name,
+        "identical": identical,
+        "serialise_f144": serialise,
+        "template": template,
+        "speedup": template["best_per_s"] / serialise["best_per_s"],
+    }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark f144 message serialisation.")
+    parser.add_argument("--messages", type=int, default=100000, help="Messages per timed run of a scalar case.")
+    parser.add_argument("--array-size", type=int, default=1000, help="Number of elements of the waveform case.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs per case.")
+    parser.add_argument("-o", "--output", default=None, help="Also write the results to this JSON file.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    results = []
+    for name, values in make_cases(args.array_size).items():
+        messages = args.messages if np.ndim(values[0]) == 0 else max(args.messages // 10, 1)
+        results.append(run_case(name, values, messages, args.repeat))
+
+    output = json.dumps(
+        {
+            "environment": {"python": platform.python_version(), "machine": platform.machine()},
+            "results": results,
+        },
+        indent=2,
+    )
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+
+
+if __name__ == "__main__":
+    main()
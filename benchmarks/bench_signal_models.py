@@ -0,0 +1,83 @@
+"""
+Compares the cost of simulating PVs with each signal model against the
+constant target value plus noise, in samples per second on one core.
+
+Every PV of a case uses the same model and is sampled once per tick, like
+the simulation threads do. Run from the repository root, e.g.:
+
+    python -m benchmarks.bench_signal_models --pvs 10000 --ticks 200 -o results.json
+
+The results are printed as JSON and optionally written to a file.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src.signal_models import FirstOrderLag, RandomWalk, Ramp, Sine
+from src.simulation_core import SimulationCore
+
+CASES = {
+    "constant": lambda: None,
+    "random_walk": lambda: RandomWalk(step=0.05, reversion=0.01),
+    "sine": lambda: Sine(amplitude=2.5, period=10),
+    "ramp": lambda: Ramp(start=1e-3, end=1e-7, duration=600),
+    "lag": lambda: FirstOrderLag(time_constant=2, initial_value=0),
+}
+
+
+def run_case(name, make_model, pvs, ticks, repeat):
+    timings = []
+    for _ in range(repeat):
+        core = SimulationCore(seed=0)
+        slots = [core.add(20.0, 0.01, make_model(), 0.5) for _ in range(pvs)]
+        sample = core.sample
+        start = time.perf_counter()
+        for _ in range(ticks):
+            for slot in slots:
+                sample(slot)
+        timings.append(time.perf_counter() - start)
+    count = pvs * ticks
+    return {
+        "case": name,
+        "samples": count,
+        "best_per_s": count / min(timings),
+        "mean_per_s": count * repeat / sum(timings),
+    }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the signal models of the simulation core.")
+    parser.add_argument("--pvs", type=int, default=10000, help="Number of PVs per case.")
+    parser.add_argument("--ticks", type=int, default=100, help="Number of samples per PV in a timed run.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per case.")
+    parser.add_argument("-o", "--output", default=None, help="Also write the results to this JSON file.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    results = [run_case(name, make_model, args.pvs, args.ticks, args.repeat) for name, make_model in CASES.items()]
+    constant = results[0]["best_per_s"]
+    for result in results:
+        result["relative_to_constant"] = result["best_per_s"] / constant
+
+    output = json.dumps(
+        {
+            "environment": {"python": platform.python_version(), "machine": platform.machine()},
+            "results": results,
+        },
+        indent=2,
+    )
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+
+
+if __name__ == "__main__":
+    main()
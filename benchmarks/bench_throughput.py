@@ -0,0 +1,286 @@
+"""
+Measures update throughput, timing jitter, CPU and memory use of the
+simulator for a number of f144 devices, on the EPICS and the Kafka path.
+
+Run from the repository root, e.g.:
+
+    python -m benchmarks.bench_throughput --backend all --devices 100 1000 --rate 10 -o results.json
+
+The results are printed as JSON and optionally written to a file so they
+can be compared between releases.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src.batch_producer import BatchProducer
+from src.module_f144 import DeviceF144
+from src.pva_server import EpicsPVAServer
+from src.run_thread import SKIP, EpicsThreadF144, KafkaThreadF144
+from src.scheduler import Scheduler
+from src.simulation_core import SimulationCore
+
+ISOLATED_SERVER_CONFIG = {
+    "EPICS_PVAS_INTF_ADDR_LIST": "127.0.0.1",
+    "EPICS_PVA_ADDR_LIST": "127.0.0.1",
+    "EPICS_PVA_AUTO_ADDR_LIST": "NO",
+    "EPICS_PVA_SERVER_PORT": "0",
+    "EPICS_PVA_BROADCAST_PORT": "0",
+}
+
+BACKENDS = ("epics", "kafka")
+
+
+class NullProducer:
+    """
+    Local stand-in for a Kafka producer that accepts messages and reports
+    them as delivered on the next poll, without keeping them.
+    """
+
+    def __init__(self, conf):
+        self.conf = conf
+        self.produced = 0
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def produce(self, topic, value=None, key=None, timestamp=None, callback=None):
+        with self._lock:
+            self.produced += 1
+            if callback is not None:
+                self._callbacks.append(callback)
+
+    def poll(self, timeout=None):
+        with self._lock:
+            callbacks, self._callbacks = self._callbacks, []
+        if not callbacks and timeout:
+            # Like a real producer, block for the timeout when there is nothing to serve
+            time.sleep(timeout)
+        for callback in callbacks:
+            callback(None, None)
+        return len(callbacks)
+
+    def flush(self, timeout=None):
+        self.poll()
+        return 0
+
+    def __len__(self):
+        return len(self._callbacks)
+
+
+class NullProducerFactory:
+    def create_producer(self, config):
+        return NullProducer(config)
+
+
+def make_devices(num_devices):
+    return {
+        f"entry/bench/device_{i}": DeviceF144(
+            source_name=f"SIM_bench:device_{i}", topic="bench", dtype="double", value_units="mm",
+        )
+        for i in range(num_devices)
+    }
+
+
+class TimedUpdates:
+    """
+    Records the time of every update of a simulation thread in `update_times`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.update_times = []
+        super().__init__(*args, **kwargs)
+
+    def _inner_run(self):
+        super()._inner_run()
+        self.update_times.append(time.monotonic())
+
+
+class TimedEpicsThreadF144(TimedUpdates, EpicsThreadF144):
+    pass
+
+
+class TimedKafkaThreadF144(TimedUpdates, KafkaThreadF144):
+    pass
+
+
+def current_rss_bytes():
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def summarise_jitter(update_times, period):
+    deviations = []
+    for times in update_times:
+        if len(times) > 1:
+            deviations.append(np.diff(times) - period)
+    if not deviations:
+        return {}
+    deviations = np.abs(np.concatenate(deviations))
+    return {
+        "mean_abs_s": float(deviations.mean()),
+        "p50_abs_s": float(np.percentile(deviations, 50)),
+        "p99_abs_s": float(np.percentile(deviations, 99)),
+        "max_abs_s": float(deviations.max()),
+    }
+
+
+def build_threads(backend, devices, args, scheduler, core, work_dir):
+    config = {"target_value": 1.0, "std_dev": 0.1}
+    options = {
+        "config": config,
+        "update_period": 1.0 / args.rate,
+        "scheduler": scheduler,
+        "core": core,
+        "fixed_rate": args.fixed_rate,
+        "missed_tick_policy": SKIP,
+    }
+
+    if backend == "epics":
+        target_config_path = os.path.join(work_dir, "targets.json")
+        with open(target_config_path, "w") as file:
+            json.dump({dev.source_name: config for dev in devices.values()}, file)
+        server = EpicsPVAServer(
+            devices=devices,
+            gateway_config=ISOLATED_SERVER_CONFIG,
+            target_config_path=target_config_path,
+        )
+        server.start()
+        server.ready.wait()
+        threads = [TimedEpicsThreadF144(dev, server=server, **options) for dev in devices.values()]
+
+        def close():
+            server.stop()
+            server.join()
+
+        return threads, close
+
+    producer = BatchProducer({}, producer_factory=NullProducerFactory())
+    producer.start()
+    threads = [TimedKafkaThreadF144(dev, producer, **options) for dev in devices.values()]
+    return threads, producer.close
+
+
+def run_benchmark(backend, num_devices, args):
+    devices = make_devices(num_devices)
+    scheduler = Scheduler(num_workers=args.workers) if args.workers > 0 else None
+    core = SimulationCore(seed=0)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        rss_before = current_rss_bytes()
+        threads, close = build_threads(backend, devices, args, scheduler, core, work_dir)
+        update_times = [thread.update_times for thread in threads]
+
+        if scheduler is not None:
+            scheduler.start()
+        cpu_start = time.process_time()
+        wall_start = time.monotonic()
+        for thread in threads:
+            thread.start()
+
+        time.sleep(args.duration)
+
+        for thread in threads:
+            thread.stop()
+        wall = time.monotonic() - wall_start
+        cpu = time.process_time() - cpu_start
+        rss_after = current_rss_bytes()
+        if scheduler is not None:
+            scheduler.stop()
+        close()
+
+    updates = sum(len(times) for times in update_times)
+    configured = num_devices * args.rate
+    return {
+        "backend": backend,
+        "devices": num_devices,
+        "rate_hz": args.rate,
+        "workers": args.workers,
+        "fixed_rate": args.fixed_rate,
+        "duration_s": wall,
+        "updates": updates,
+        "updates_per_s": updates / wall,
+        "configured_updates_per_s": configured,
+        "achieved_fraction": updates / wall / configured,
+        "late_ticks": sum(thread.late_ticks for thread in threads),
+        "skipped_ticks": sum(thread.skipped_ticks for thread in threads),
+        "jitter": summarise_jitter(update_times, 1.0 / args.rate),
+        "cpu_s": cpu,
+        "cpu_fraction": cpu / wall,
+        "rss_bytes": rss_after,
+        "rss_increase_bytes": rss_after - rss_before if rss_after and rss_before else None,
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def environment_info():
+    from importlib.metadata import version
+
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "p4p": version("p4p"),
+        "confluent_kafka": version("confluent-kafka"),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the simulator update throughput.")
+
+    parser.add_argument(
+        "--backend", default="all", choices=BACKENDS + ("all",), help="Which path to benchmark."
+    )
+    parser.add_argument(
+        "-n", "--devices", type=int, nargs="+", default=[100, 1000], help="Numbers of devices."
+    )
+    parser.add_argument("-r", "--rate", type=float, default=10.0, help="Update rate per device in Hz.")
+    parser.add_argument("-d", "--duration", type=float, default=5.0, help="Seconds per run.")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=4, help="Scheduler workers, 0 for one thread per device."
+    )
+    parser.add_argument("--fixed-rate", action="store_true", help="Use fixed rate timing.")
+    parser.add_argument("-o", "--output", help="Write the JSON results to this file.")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    backends = BACKENDS if args.backend == "all" else (args.backend,)
+
+    results = {
+        "benchmark": "throughput",
+        "environment": environment_info(),
+        "arguments": vars(args),
+        "results": [
+            run_benchmark(backend, num_devices, args)
+            for backend in backends
+            for num_devices in args.devices
+        ],
+    }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+
+from p4p.server.asyncio import SharedPV
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncScheduler:
+    """
+    Drives RunThread jobs from a single asyncio event loop.
+
+    It has the same interface as Scheduler, so the existing f144 threads can
+    be used unchanged. Each job is a timer on the loop (call_at) rather than
+    a Task, which keeps the per-PV overhead small for very large PV counts.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self._running = False
+
+    def start(self, loop=None):
+        self.loop = loop if loop is not None else asyncio.get_running_loop()
+        self._running = True
+
+    def stop(self):
+        self._running = False
+
+    def is_running(self):
+        return self._running
+
+    def add(self, job, delay=0.0):
+        job._schedule_generation += 1
+        generation = job._schedule_generation
+        self.loop.call_soon_threadsafe(self._add, job, generation, delay)
+
+    def remove(self, job):
+        job._schedule_generation += 1
+
+    def _add(self, job, generation, delay):
+        due = self.loop.time() + delay
+        self.loop.call_at(due, self._run_job, job, generation, due)
+
+    def _run_job(self, job, generation, due):
+        if not self._running or generation != job._schedule_generation:
+            return
+        try:
+            job._tick(due)
+        except Exception as e:
+            logger.error(f"Unhandled error in scheduled job {job}: {e}")
+        if self._running and generation == job._schedule_generation:
+            try:
+                next_due = job._next_due(due, self.loop.time())
+            except Exception as e:
+                logger.error(f"Not rescheduling job {job}, its next tick could not be scheduled: {e}")
+                return
+            self.loop.call_at(next_due, self._run_job, job, generation, next_due)
+
+
+class AsyncRuntime:
+    """
+    Runs the whole simulation on one asyncio event loop: the PVs are served
+    with p4p's asyncio SharedPV, PV updates are scheduled by an
+    AsyncScheduler, and Kafka polling and config reloads are coroutines.
+    """
+
+    def __init__(self, server, producer=None, watcher=None, kafka_poll_interval=0.1):
+        """
+        :param server: An EpicsPVAServer that has not been started.
+        :param producer: Optional BatchProducer, polled from the loop instead of its own thread.
+        :param watcher: Optional ConfigWatcher, checked from the loop instead of its own thread.
+        :param kafka_poll_interval: Seconds between producer polls.
+        """
+        self.server = server
+        self.producer = producer
+        self.watcher = watcher
+        self.kafka_poll_interval = kafka_poll_interval
+        self.scheduler = AsyncScheduler()
+        self.threads = []
+
+    async def run(self, make_threads, stop_event=None):
+        """
+        Serve the PVs and run the simulation until cancelled or `stop_event` is set.
+
+        :param make_threads: Called once the PVs are served, returns the
+            threads to run. They must use self.scheduler.
+        :param stop_event: Optional threading or multiprocessing Event.
+        """
+        config = self.server.read_config()
+        self.server.create_pvs(config, shared_pv_class=SharedPV)
+        if self.server.update_targets:
+            self.server.update_config(config)
+        self.server.serve()
+        self.scheduler.start()
+
+        self.threads = make_threads()
+        for thread in self.threads:
+            thread.start()
+        logger.info(f"Running {len(self.threads)} simulated devices on the event loop")
+
+        tasks = []
+        if self.producer is not None:
+            tasks.append(asyncio.create_task(self._poll_producer()))
+        if self.watcher is not None:
+            tasks.append(asyncio.create_task(self._watch_config()))
+
+        try:
+            if stop_event is not None:
+                await asyncio.get_running_loop().run_in_executor(None, stop_event.wait)
+            else:
+                await asyncio.Event().wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            for thread in self.threads:
+                thread.stop()
+            self.scheduler.stop()
+            if self.producer is not None:
+                self.producer.close()
+            self.server.stop()
+
+    async def _poll_producer(self):
+        while True:
+            self.producer.poll(0)
+            await asyncio.sleep(self.kafka_poll_interval)
+
+    async def _watch_config(self):
+        while True:
+            await asyncio.sleep(self.watcher.poll_interval)
+            try:
+                self.watcher.check()
+            except Exception as e:
+                logger.error(f"Failed to reload target config {self.watcher.path}: {e}")
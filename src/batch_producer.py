@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from functools import partial
+
+from src.producer_factory import ProducerFactory
+
+logger = logging.getLogger(__name__)
+
+
+class BatchProducer:
+    """
+    A Kafka producer shared by all simulated devices.
+
+    Messages are only queued by produce(); librdkafka batches them according
+    to the linger and batch size settings, and a background thread serves
+    the delivery callbacks with periodic poll() calls. Nothing is flushed
+    per message, only on close().
+    """
+
+    def __init__(
+        self,
+        config,
+        producer_factory=None,
+        linger_ms=5,
+        batch_size=10000,
+        queue_size=1000000,
+        poll_interval=0.1,
+        queue_full_timeout=0.1,
+    ):
+        """
+        :param config: Producer configuration, e.g. bootstrap.servers and security settings.
+            Entries here take precedence over the batching arguments.
+        :param producer_factory: Factory used to create the underlying producer.
+        :param linger_ms: How long librdkafka waits to fill a batch.
+        :param batch_size: Maximum number of messages in a batch.
+        :param queue_size: Maximum number of messages queued in the producer.
+        :param poll_interval: Timeout of each poll() call in the background thread.
+        :param queue_full_timeout: How long produce() waits for room in a full queue before giving up.
+        """
+        producer_config = {
+            "linger.ms": linger_ms,
+            "batch.num.messages": batch_size,
+            "queue.buffering.max.messages": queue_size,
+        }
+        producer_config.update(config)
+
+        factory = producer_factory if producer_factory is not None else ProducerFactory()
+        self.producer = factory.create_producer(producer_config)
+        self.poll_interval = poll_interval
+        self.queue_full_timeout = queue_full_timeout
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self._closing = False
+        self._poll_thread = None
+        self._run_event = threading.Event()
+
+    def start(self):
+        self._run_event.set()
+        self._poll_thread = threading.Thread(
+            target=self._poll, name="batch-producer-poll", daemon=True
+        )
+        self._poll_thread.start()
+
+    def close(self, timeout=10):
+        self._closing = True
+        self._run_event.clear()
+        if self._poll_thread is not None:
+            self._poll_thread.join()
+            self._poll_thread = None
+        remaining = self.producer.flush(timeout)
+        if remaining:
+            logger.warning(f"{remaining} messages were not delivered before closing")
+
+    def produce(self, topic, value, key=None, timestamp=None, callback=None):
+        """
+        Queue a message. If the local queue is full the call polls for up to
+        `queue_full_timeout` seconds until there is room, so a broker that is
+        down does not block the callers, which may be shared scheduler workers.
+
+        :param callback: Optional per-message delivery callback, called with (err, msg) from poll().
+        :raises BufferError: If the queue stayed full, or the producer is closing.
+        """
+        on_delivery = self._on_delivery if callback is None else partial(self._on_delivery, callback=callback)
+        kwargs = {"key": key, "callback": on_delivery}
+        if timestamp is not None:
+            kwargs["timestamp"] = timestamp
+        deadline = time.monotonic() + self.queue_full_timeout
+        while True:
+            try:
+                self.producer.produce(topic, value, **kwargs)
+                return
+            except BufferError:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closing:
+                    self.dropped += 1
+                    raise
+                logger.debug("Producer queue is full, waiting for deliveries")
+                self.producer.poll(min(self.poll_interval, remaining))
+
+    def poll(self, timeout=0):
+        return self.producer.poll(timeout)
+
+    def flush(self, timeout=None):
+        if timeout is None:
+            return self.producer.flush()
+        return self.producer.flush(timeout)
+
+    def queue_depth(self):
+        return len(self.producer)
+
+    def _poll(self):
+        while self._run_event.is_set():
+            self.producer.poll(self.poll_interval)
+
+    def _on_delivery(self, err, msg, callback=None):
+        if err is not None:
+            self.failed += 1
+            logger.error(f"Failed to deliver message to {msg.topic()}: {err}")
+        else:
+            self.delivered += 1
+        if callback is not None:
+            callback(err, msg)
@@ -1,36 +1,63 @@
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Tuple
 
+from src.config_stream import iter_modules_streaming
 
-def traverse_json(json_obj, condition_fn, action_fn, path=[]) -> None:
+
+def traverse_json(json_obj, condition_fn, action_fn, path=None) -> None:
     """
-    Recursively traverse the JSON object applying a condition function
+    Traverse the JSON object depth first, applying a condition function
     at each node. If the condition is met, applies an action function.
 
+    The traversal uses an explicit stack of iterators, so deep trees do not
+    hit the recursion limit, and a single path buffer that is updated in place.
+    The action function must copy the path if it keeps it.
+
     :param json_obj: The JSON object or part of it being traversed.
     :param condition_fn: A function that takes a node and returns True if the condition is met.
     :param action_fn: A function that performs an action on nodes that meet the condition.
-    :param path: The current path to the node, used for tracking the node's location within the JSON.
+    :param path: The path to the json_obj, used for tracking the node's location within the JSON.
     """
+    path = list(path) if path is not None else []
     if condition_fn(json_obj):
         action_fn(json_obj, path)
 
+    # One iterator over the (key, value) pairs of each container being visited,
+    # the keys of all but the outermost one are on the path
+    iterators = []
     if isinstance(json_obj, dict):
-        for key, value in json_obj.items():
-            traverse_json(value, condition_fn, action_fn, path + [key])
+        iterators.append(iter(json_obj.items()))
     elif isinstance(json_obj, list):
-        for index, item in enumerate(json_obj):
-            traverse_json(item, condition_fn, action_fn, path + [index])
+        iterators.append(enumerate(json_obj))
+
+    while iterators:
+        for key, node in iterators[-1]:
+            path.append(key)
+            if condition_fn(node):
+                action_fn(node, path)
+            if isinstance(node, dict):
+                iterators.append(iter(node.items()))
+                break
+            if isinstance(node, list):
+                iterators.append(enumerate(node))
+                break
+            path.pop()
+        else:
+            iterators.pop()
+            if iterators:
+                path.pop()
 
 
-def find_modules_with_type(json_obj, module_type, found_modules=[]) -> List[Tuple]:
+def find_modules_with_type(json_obj, module_type, found_modules=None) -> List[Tuple]:
     """
     Finds all modules within the JSON structure that have the specified type.
 
     :param json_obj: The JSON object to search within.
     :param module_type: The type of module to find.
-    :param found_modules: A list to hold the found modules and their paths.
+    :param found_modules: An optional list to hold the found modules and their paths, it is cleared first.
     :return: A list of tuples with found modules and their paths.
     """
+    if found_modules is None:
+        found_modules = []
 
     def condition_fn(node):
         # Checks if the node is a dict, has a 'module' key, and its value matches the module_type
@@ -41,8 +68,8 @@ def find_modules_with_type(json_obj, module_type, found_modules=[]) -> List[Tupl
         )
 
     def action_fn(node, path):
-        # Adds the node and its path to the found_modules list
-        found_modules.append((node, path))
+        # Adds the node and a copy of the shared path buffer to the found_modules list
+        found_modules.append((node, list(path)))
 
     # Reset found_modules list to ensure it's empty for each call
     found_modules.clear()
@@ -71,32 +98,51 @@ def find_all_modules(json_obj) -> List[Dict]:
     return found_modules
 
 
-def traverse_json_named_paths(json_obj, condition_fn, action_fn, path=[]) -> None:
+def traverse_json_named_paths(json_obj, condition_fn, action_fn, path=None) -> None:
     """
-    Recursively traverse the JSON object, only diving deeper into nodes with a "name" key.
+    Traverse the JSON object, only diving deeper into nodes with a "name" key through their children.
     Applies a condition function at each node. If the condition is met, applies an action function.
 
+    Like traverse_json this uses an explicit stack of iterators and a shared
+    path buffer, which the action function must copy if it keeps it.
+
     :param json_obj: The JSON object or part of it being traversed.
     :param condition_fn: A function that takes a node and returns True if the condition is met.
     :param action_fn: A function that performs an action on nodes that meet the condition.
-    :param path: The current path to the node, using names of groups for tracking the node's location.
+    :param path: The path to the json_obj, using names of groups for tracking the node's location.
     """
-    if isinstance(json_obj, dict):
-        if "name" in json_obj:  # Only add to path if 'name' exists
-            current_path = path + [json_obj["name"]]
+    path = list(path) if path is not None else []
+    # One iterator per container being visited, and whether it added a name to the path
+    iterators = [iter((json_obj,))]
+    named = [False]
+
+    while iterators:
+        for node in iterators[-1]:
+            if isinstance(node, dict):
+                if "name" in node:  # Only add to path if 'name' exists
+                    path.append(node["name"])
+                    if condition_fn(node):
+                        action_fn(node, path)
+                    # Named groups are only traversed further through their children
+                    if "children" not in node:
+                        path.pop()
+                        continue
+                    iterators.append(iter((node["children"],)))
+                    named.append(True)
+                else:
+                    if condition_fn(node):
+                        action_fn(node, path)
+                    iterators.append(iter(node.values()))
+                    named.append(False)
+                break
+            if isinstance(node, list):
+                iterators.append(iter(node))
+                named.append(False)
+                break
         else:
-            current_path = path
-
-        if condition_fn(json_obj):
-            action_fn(json_obj, current_path)
-
-        for key, value in json_obj.items():
-            # Only continue traversing if we have not updated the path, or if this is the iteration over children
-            if key != "name" and (current_path == path or key == "children"):
-                traverse_json_named_paths(value, condition_fn, action_fn, current_path)
-    elif isinstance(json_obj, list):
-        for item in json_obj:
-            traverse_json_named_paths(item, condition_fn, action_fn, path)
+            iterators.pop()
+            if named.pop():
+                path.pop()
 
 
 def find_all_modules_with_named_paths(json_obj) -> List[Dict]:
@@ -121,7 +167,24 @@ def find_all_modules_with_named_paths(json_obj) -> List[Dict]:
 
 
 def build_config(json_obj) -> Dict:
-    all_modules = find_all_modules_with_named_paths(json_obj)
+    return build_config_from_modules(find_all_modules_with_named_paths(json_obj))
+
+
+def build_config_streaming(file) -> Dict:
+    """
+    Build the same config as build_config, but from a NeXus JSON file that
+    is parsed incrementally instead of being loaded as a whole.
+
+    :param file: A text file object with the NeXus JSON.
+    """
+    return build_config_from_modules(iter_modules_streaming(file))
+
+
+def build_config_from_modules(all_modules: Iterable[Dict]) -> Dict:
+    """
+    Build the device config from the modules found in a NeXus JSON, keeping
+    the simulated (SIM_ prefixed) f144 and tdct sources.
+    """
     config = {}
 
     for module in all_modules:
@@ -141,6 +204,9 @@ def build_config(json_obj) -> Dict:
             "value_units": module["config"]["value_units"]
             if "value_units" in module["config"]
             else None,
+            "array_size": module["config"]["array_size"]
+            if "array_size" in module["config"]
+            else None,
         }
 
     return config
@@ -0,0 +1,253 @@
+import re
+from json import JSONDecodeError
+from json.decoder import scanstring
+
+CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?")
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+_STRING_TAIL = re.compile(r'(?:[^"\\]|\\.)*"', re.DOTALL)
+_SCALAR_CHARS = re.compile(r"[0-9A-Za-z.+\-]*")
+_LITERALS = {"true": True, "false": False, "null": None}
+
+
+class JsonTokenizer:
+    """
+    Incremental JSON tokenizer reading a text file in chunks.
+
+    Only the current chunk (plus an unfinished token) is held in memory.
+    skip_value() skips a whole value without tokenizing it, jumping over
+    long runs of numbers with a regex search, which is what makes large
+    embedded datasets cheap to pass over.
+    """
+
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+
+    def peek(self):
+        """
+        Return the first character of the next token, or "" at the end of the input.
+        """
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def next(self):
+        """
+        Return the next token as a (kind, value) tuple. The kind is one of
+        "{", "}", "[", "]", ":", "," or "value" for strings, numbers and literals.
+        """
+        char = self.peek()
+        if char == "":
+            raise ValueError("Unexpected end of JSON input")
+        if char in "{}[]:,":
+            self._pos += 1
+            return char, None
+        if char == '"':
+            return "value", self._read_string()
+        return "value", self._read_scalar()
+
+    def expect(self, kind):
+        found, _ = self.next()
+        if found != kind:
+            raise ValueError(f"Expected '{kind}' but found '{found}' in JSON input")
+
+    def skip_value(self):
+        """
+        Skip the next value, including everything inside it if it is an object or array.
+        """
+        char = self.peek()
+        if char not in "{[":
+            self.next()
+            return
+
+        depth = 0
+        while True:
+            match = _STRUCTURAL.search(self._buffer, self._pos)
+            if match is None:
+                self._pos = len(self._buffer)
+                if not self._fill():
+                    raise ValueError("Unexpected end of JSON input")
+                continue
+
+            self._pos = match.end()
+            char = match.group()
+            if char == '"':
+                self._skip_string_tail()
+            elif char in "{[":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def _fill(self):
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            return False
+        self._buffer = self._buffer[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def _read_string(self):
+        while True:
+            try:
+                value, self._pos = scanstring(self._buffer, self._pos + 1)
+                return value
+            except JSONDecodeError:
+                if not self._fill():
+                    raise
+
+    def _skip_string_tail(self):
+        while True:
+            match = _STRING_TAIL.match(self._buffer, self._pos)
+            if match is not None:
+                self._pos = match.end()
+                return
+            if not self._fill():
+                raise ValueError("Unterminated string in JSON input")
+
+    def _read_scalar(self):
+        while True:
+            # A token touching the end of the buffer may continue in the next chunk
+            if _SCALAR_CHARS.match(self._buffer, self._pos).end() == len(self._buffer) and self._fill():
+                continue
+            match = _NUMBER.match(self._buffer, self._pos)
+            if match is not None:
+                self._pos = match.end()
+                if match.group(1) or match.group(2):
+                    return float(match.group())
+                return int(match.group())
+            for literal, value in _LITERALS.items():
+                if self._buffer.startswith(literal, self._pos):
+                    self._pos += len(literal)
+                    return value
+            raise ValueError(f"Invalid JSON value at: {self._buffer[self._pos:self._pos + 20]!r}")
+
+
+class _ObjectFrame:
+    def __init__(self):
+        self.key = None
+        self.name = None
+        self.module = None
+        self.config = None
+        self.children_modules = []
+        self.other_modules = []
+
+    def add(self, modules):
+        if self.key == "children":
+            self.children_modules.extend(modules)
+        else:
+            self.other_modules.extend(modules)
+
+    def close(self):
+        modules = []
+        if self.module is not None and self.config is not None and "source" in self.config:
+            modules.append(([], {"config": self.config, "module": self.module}))
+        if self.name is None:
+            return modules + self.children_modules + self.other_modules
+        # Like traverse_json_named_paths, a named group is only descended into through its children
+        return [([self.name] + path, info) for path, info in modules + self.children_modules]
+
+
+class _ArrayFrame:
+    def __init__(self):
+        self.modules = []
+
+    def add(self, modules):
+        self.modules.extend(modules)
+
+    def close(self):
+        return self.modules
+
+
+def _read_flat_object(tokens):
+    """
+    Read an object keeping only its scalar members. Nested objects and
+    arrays, e.g. the values of a dataset, are skipped without being built.
+    """
+    tokens.expect("{")
+    result = {}
+    while True:
+        kind, key = tokens.next()
+        if kind == "}":
+            return result
+        if kind == ",":
+            continue
+        tokens.expect(":")
+        if tokens.peek() in "{[":
+            tokens.skip_value()
+        else:
+            _, result[key] = tokens.next()
+
+
+def iter_modules_streaming(file, chunk_size=CHUNK_SIZE):
+    """
+    Extract the modules from a NeXus JSON file without loading the whole tree.
+
+    Yields the same dicts, with the same named paths, as
+    find_all_modules_with_named_paths does for the loaded JSON. Only the
+    scalar members of module configs are kept. As the name of a group may
+    come after its children in the file, the modules are yielded once the
+    top level value has been read; memory use is bounded by the number of
+    modules, not the size of the file.
+
+    :param file: A text file object.
+    :param chunk_size: Number of characters read at a time.
+    """
+    tokens = JsonTokenizer(file, chunk_size)
+    found = []
+    stack = []
+
+    def close_frame():
+        modules = stack.pop().close()
+        if stack:
+            stack[-1].add(modules)
+        else:
+            found.extend(modules)
+
+    char = tokens.peek()
+    if char not in "{[":
+        return
+    tokens.next()
+    stack.append(_ObjectFrame() if char == "{" else _ArrayFrame())
+
+    while stack:
+        frame = stack[-1]
+        char = tokens.peek()
+
+        if char == ",":
+            tokens.next()
+            continue
+        if char in "}]":
+            tokens.next()
+            close_frame()
+            continue
+
+        if isinstance(frame, _ObjectFrame):
+            _, frame.key = tokens.next()
+            tokens.expect(":")
+            char = tokens.peek()
+            if frame.key == "config" and char == "{":
+                frame.config = _read_flat_object(tokens)
+                continue
+            if frame.key in ("name", "module") and char == '"':
+                _, value = tokens.next()
+                setattr(frame, frame.key, value)
+                continue
+
+        if char in "{[":
+            tokens.next()
+            stack.append(_ObjectFrame() if char == "{" else _ArrayFrame())
+        else:
+            tokens.skip_value()
+
+    for path, info in found:
+        yield {"path": "/".join(path), **info}
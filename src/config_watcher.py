@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def diff_configs(old_config, new_config):
+    """
+    Find the PVs whose target config has changed.
+
+    :param old_config: The previous target config, keyed by PV name.
+    :param new_config: The new target config, keyed by PV name.
+    :return: A dict with the new config of every PV that was added or changed.
+    """
+    old_config = old_config or {}
+    return {
+        pv_name: pv_config
+        for pv_name, pv_config in new_config.items()
+        if old_config.get(pv_name) != pv_config
+    }
+
+
+class ConfigWatcher:
+    """
+    Watches a target config file by polling its modification time and size.
+
+    The file is only re-parsed when it has changed, and the callback is only
+    called with the PVs whose config differs from the previous version.
+    A file caught in the middle of being written (invalid JSON) is retried
+    on the next poll.
+    """
+
+    def __init__(self, path, on_change, poll_interval=1.0):
+        """
+        :param path: Path to the target config file.
+        :param on_change: Called with a dict of the changed PV configs.
+        :param poll_interval: Seconds between checks of the file.
+        """
+        self.path = path
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.config = None
+        self._file_state = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        if self.config is None:
+            self.load()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def load(self):
+        """
+        Read the current file as the baseline, without calling the callback.
+        """
+        self.check(notify=False)
+        return self.config
+
+    def check(self, notify=True):
+        """
+        Check the file once and report the PVs that changed.
+
+        :return: A dict with the changed PV configs, empty if nothing changed.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            logger.debug(f"Target config {self.path} does not exist")
+            return {}
+
+        file_state = (stat.st_mtime_ns, stat.st_size)
+        if file_state == self._file_state:
+            return {}
+
+        try:
+            with open(self.path, "r") as file:
+                config = json.load(file)
+        except json.JSONDecodeError as e:
+            logger.debug(f"Could not parse target config {self.path}, retrying: {e}")
+            return {}
+
+        self._file_state = file_state
+        changed = diff_configs(self.config, config)
+        self.config = config
+
+        if notify and changed:
+            logger.info(f"Target config changed for {len(changed)} PVs")
+            self.on_change(changed)
+        return changed
+
+    def _run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Failed to reload target config {self.path}: {e}")
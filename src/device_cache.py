@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import os
+import struct
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAGIC = b"PVSC"
+CACHE_VERSION = 1
+
+# magic, version, mtime_ns and size of the JSON, content digest, string and record counts
+_HEADER = struct.Struct("<4sHxxqQ32sII")
+_FIELDS = ["path", "module", "source", "topic", "dtype", "value_units"]
+_RECORD_DTYPE = np.dtype([(field, "<u4") for field in _FIELDS] + [("array_size", "<u4")])
+_NONE = 0xFFFFFFFF
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def default_cache_dir():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "pv-simulator")
+
+
+def file_digest(path):
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as file:
+        while chunk := file.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.digest()
+
+
+class DeviceCache:
+    """
+    On-disk cache of the device config extracted from a NeXus JSON file.
+
+    There is one cache file per JSON file. It is valid while the JSON has
+    the same mtime and size; if only the mtime changed (e.g. the file was
+    copied or touched) the content digest is compared before the cache is
+    discarded. The config is stored as a table of fixed-size records that
+    index into a table of unique strings, so loading it is a single read.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+
+    def cache_path(self, json_path):
+        key = hashlib.blake2b(os.path.abspath(json_path).encode(), digest_size=8).hexdigest()
+        return os.path.join(self.cache_dir, f"{os.path.basename(json_path)}.{key}.devices")
+
+    def load(self, json_path):
+        """
+        Return the cached device config for a JSON file, or None if there is no valid cache.
+        """
+        path = self.cache_path(json_path)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            header, config = self._decode(data)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error, UnicodeDecodeError) as e:
+            logger.warning(f"Ignoring unreadable device cache {path}: {e}")
+            return None
+
+        _, _, mtime_ns, size, digest, num_strings, num_records = header
+        stat = os.stat(json_path)
+        if stat.st_size != size:
+            return None
+        if stat.st_mtime_ns != mtime_ns:
+            if file_digest(json_path) != digest:
+                return None
+            # Same content, record the new mtime so the digest is not needed next time
+            try:
+                self._write(path, stat, digest, num_strings, num_records, data[_HEADER.size :])
+            except OSError as e:
+                logger.warning(f"Could not update device cache {path}: {e}")
+        return config
+
+    def store(self, json_path, config):
+        """
+        Store the device config extracted from a JSON file. Failures are only logged.
+
+        :param json_path: The NeXus JSON file the config was built from.
+        :param config: The config, as returned by build_config.
+        """
+        path = self.cache_path(json_path)
+        try:
+            stat = os.stat(json_path)
+            digest = file_digest(json_path)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._write(path, stat, digest, *self._encode(config))
+        except OSError as e:
+            logger.warning(f"Could not write device cache {path}: {e}")
+
+    @staticmethod
+    def _write(path, stat, digest, num_strings, num_records, body):
+        header = _HEADER.pack(
+            CACHE_MAGIC, CACHE_VERSION, stat.st_mtime_ns, stat.st_size, digest, num_strings, num_records
+        )
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(header)
+            file.write(body)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _encode(config):
+        strings = {}
+
+        def intern(value):
+            if value is None:
+                return _NONE
+            return strings.setdefault(str(value), len(strings))
+
+        records = np.empty(len(config), dtype=_RECORD_DTYPE)
+        for index, (path, details) in enumerate(config.items()):
+            row = [intern(path)] + [intern(details.get(field)) for field in _FIELDS[1:]]
+            row.append(details.get("array_size") or 0)
+            records[index] = tuple(row)
+
+        encoded = [string.encode() for string in strings]
+        lengths = np.array([len(string) for string in encoded], dtype="<u4")
+        return len(encoded), len(records), lengths.tobytes() + b"".join(encoded) + records.tobytes()
+
+    @staticmethod
+    def _decode(data):
+        header = _HEADER.unpack_from(data)
+        magic, version, _, _, _, num_strings, num_records = header
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            raise ValueError(f"unsupported cache format {magic!r} version {version}")
+
+        offset = _HEADER.size
+        lengths = np.frombuffer(data, dtype="<u4", count=num_strings, offset=offset)
+        offset += lengths.nbytes
+        ends = offset + np.cumsum(lengths, dtype=np.int64)
+        starts = ends - lengths
+        strings = [data[start:end].decode() for start, end in zip(starts.tolist(), ends.tolist())]
+        offset = int(ends[-1]) if num_strings else offset
+
+        records = np.frombuffer(data, dtype=_RECORD_DTYPE, count=num_records, offset=offset)
+        if offset + records.nbytes != len(data):
+            raise ValueError("truncated cache file")
+
+        config = {}
+        columns = [records[field].tolist() for field in _FIELDS]
+        for row, array_size in zip(zip(*columns), records["array_size"].tolist()):
+            values = [None if index == _NONE else strings[index] for index in row]
+            details = dict(zip(_FIELDS[1:], values[1:]))
+            details["array_size"] = array_size or None
+            config[values[0]] = details
+        return header, config
+
+
+def load_device_config(json_path, build, cache=None):
+    """
+    Return the device config for a NeXus JSON file from the cache, or build it and cache it.
+
+    :param json_path: The NeXus JSON file.
+    :param build: Called with the path to build the config on a cache miss.
+    :param cache: A DeviceCache, or None to always build the config.
+    """
+    if cache is not None:
+        config = cache.load(json_path)
+        if config is not None:
+            logger.info(f"Loaded {len(config)} devices from cache {cache.cache_path(json_path)}")
+            return config
+
+    config = build(json_path)
+    if cache is not None:
+        cache.store(json_path, config)
+    return config
@@ -0,0 +1,155 @@
+import logging
+import sys
+
+import numpy as np
+
+from src.module_f144 import DeviceF144
+from src.module_tdct import DeviceTDCT
+
+logger = logging.getLogger(__name__)
+
+DEVICE_CLASSES = {"f144": DeviceF144, "tdct": DeviceTDCT}
+MODULES = tuple(DEVICE_CLASSES)
+
+# Columns that index into the table of unique strings
+STRING_FIELDS = ["path", "source_name", "topic", "dtype", "value_units"]
+_ROW_DTYPE = np.dtype([(field, "<u4") for field in STRING_FIELDS] + [("module", "u1"), ("array_size", "<u4")])
+_NONE = 0xFFFFFFFF
+
+
+class DeviceTable:
+    """
+    Columnar registry of the simulated devices.
+
+    Every device is one row of a NumPy record array. The strings of a row
+    (NeXus path, source name, topic, dtype and units) are indices into one
+    table of unique strings, so the topics, dtypes and units that many
+    devices share are stored once. Selecting devices by module or topic
+    is an array operation.
+
+    Per-device objects are only made when something needs them, e.g. the
+    thread that simulates the device, with device(). They are created once
+    per row and share the interned strings of the table.
+    """
+
+    def __init__(self, capacity=1024):
+        self.strings = []
+        self._string_indices = {}
+        self.rows = np.empty(capacity, dtype=_ROW_DTYPE)
+        self._size = 0
+        self._devices = []
+        self._paths = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        :param config: Device config keyed by NeXus path, as returned by build_config.
+        """
+        table = cls(capacity=max(len(config), 1))
+        for path, details in config.items():
+            table.add(path, details)
+        return table
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory of the table in bytes, without per-device objects.
+        """
+        return self.rows[: self._size].nbytes + sum(sys.getsizeof(string) for string in self.strings)
+
+    def add(self, path, details):
+        """
+        Add a device.
+
+        :param path: The NeXus path of the device.
+        :param details: Dict with the module, source, topic, dtype, value_units and optionally array_size.
+        :return: The row of the device, or None if its module is not supported.
+        """
+        module = str(details["module"]).lower()
+        if module not in DEVICE_CLASSES:
+            logger.warning(f"Unknown device class: Device{module.upper()}")
+            return None
+        if path in self._paths:
+            raise ValueError(f"Duplicate device path {path}")
+        if self._size == len(self.rows):
+            self.rows = np.concatenate([self.rows, np.empty(max(len(self.rows), 1), dtype=_ROW_DTYPE)])
+
+        row = self._size
+        values = [path, details["source"], details["topic"], details["dtype"], details["value_units"]]
+        indices = tuple(self._intern(value) for value in values)
+        self.rows[row] = indices + (MODULES.index(module), details.get("array_size") or 0)
+        self._size += 1
+        self._devices.append(None)
+        self._paths[self.strings[indices[0]]] = row
+        return row
+
+    def column(self, field):
+        """
+        Return the values of one column, a list for string columns and an array otherwise.
+        """
+        values = self.rows[field][: self._size]
+        if field not in STRING_FIELDS:
+            return values
+        return [self._string(index) for index in values.tolist()]
+
+    def select(self, module=None, topic=None):
+        """
+        Return the rows of the devices of a module and/or topic.
+        """
+        mask = np.ones(self._size, dtype=bool)
+        if module is not None:
+            mask &= self.rows["module"][: self._size] == MODULES.index(module)
+        if topic is not None:
+            index = self._string_indices.get(topic)
+            if index is None:
+                return np.empty(0, dtype=np.intp)
+            mask &= self.rows["topic"][: self._size] == index
+        return np.flatnonzero(mask)
+
+    def row(self, path):
+        """
+        Return the row of the device with a NeXus path.
+        """
+        return self._paths[path]
+
+    def device(self, row):
+        """
+        Return the device object of a row, made on first use.
+        """
+        device = self._devices[row]
+        if device is None:
+            record = self.rows[row]
+            source_name, topic, dtype, value_units = (self._string(record[field]) for field in STRING_FIELDS[1:])
+            module = MODULES[record["module"]]
+            kwargs = {}
+            if record["array_size"]:
+                kwargs["array_size"] = int(record["array_size"])
+            device = self._devices[row] = DEVICE_CLASSES[module](source_name, topic, dtype, value_units, **kwargs)
+        return device
+
+    def devices(self, rows=None):
+        """
+        Return a dict of device objects keyed by NeXus path.
+
+        :param rows: The rows to include, all by default.
+        """
+        if rows is None:
+            rows = range(self._size)
+        paths = self.rows["path"]
+        return {self.strings[paths[row]]: self.device(row) for row in rows}
+
+    def _intern(self, value):
+        if value is None:
+            return _NONE
+        value = str(value)
+        index = self._string_indices.get(value)
+        if index is None:
+            index = self._string_indices[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def _string(self, index):
+        return None if index == _NONE else self.strings[index]
@@ -0,0 +1,214 @@
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Stages recorded by the simulator, all durations in ns
+TICK_LAG = "tick_lag"  # from the time a tick was due until it started
+GENERATE = "generate"  # deciding the next value
+PUBLISH = "publish"  # SharedPV.post, client put or producer.produce call
+DELIVERY = "delivery"  # from producer.produce until the delivery report
+END_TO_END = "end_to_end"  # from the start of the tick until delivery (Kafka) or the end of the post (EPICS)
+PUT = "put"  # handling a client put in the PVA server
+
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram of non-negative integer values.
+
+    Values below 2**significant_bits are counted exactly. Above that every
+    power of two range is split into 2**(significant_bits - 1) buckets, so
+    a value is known to within 1 / 2**(significant_bits - 1) of itself, 3%
+    with the default of 6 bits, over the whole 64 bit range. The counts
+    are kept sparse as only the buckets that are hit take memory.
+    """
+
+    def __init__(self, significant_bits=6):
+        self.significant_bits = significant_bits
+        self._exact = 1 << significant_bits
+        self._half = 1 << (significant_bits - 1)
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        value = max(int(value), 0)
+        if value < self._exact:
+            index = value
+        else:
+            exponent = value.bit_length() - self.significant_bits
+            index = self._exact + (exponent - 1) * self._half + (value >> exponent) - self._half
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def bucket_bounds(self, index):
+        """
+        Return the lowest and highest value counted in a bucket.
+        """
+        if index < self._exact:
+            return index, index
+        exponent, offset = divmod(index - self._exact, self._half)
+        exponent += 1
+        mantissa = offset + self._half
+        return mantissa << exponent, ((mantissa + 1) << exponent) - 1
+
+    def merge(self, other):
+        # Copy first, the other histogram may be recorded into concurrently
+        for index, count in list(other.counts.items()):
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def percentile(self, percent):
+        """
+        Return the value at a percentile, as the upper bound of its bucket capped at the maximum.
+        """
+        if self.count == 0:
+            return None
+        rank = max(percent / 100 * self.count, 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.bucket_bounds(index)[1], self.max)
+        return self.max
+
+    def summary(self, percentiles=(50, 90, 99, 99.9)):
+        summary = {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+        }
+        for percent in percentiles:
+            summary[f"p{percent:g}"] = self.percentile(percent)
+        return summary
+
+
+class Instrumentation:
+    """
+    Records per-stage timings of the simulator into LatencyHistograms per
+    stage, device type and PV.
+
+    Every recording thread has its own set of histograms, so recording
+    takes no lock and threads never contend. dump() merges the histograms
+    of all threads, it may miss values recorded while it runs.
+    """
+
+    def __init__(self, significant_bits=6):
+        self.significant_bits = significant_bits
+        self._local = threading.local()
+        self._thread_histograms = []
+        self._lock = threading.Lock()
+
+    def record(self, stage, device_type, pv_name, value_ns):
+        """
+        :param stage: The stage, e.g. PUBLISH.
+        :param device_type: The kind of device or thread, e.g. "KafkaThreadF144".
+        :param pv_name: The PV or source name.
+        :param value_ns: The duration in ns.
+        """
+        histograms = getattr(self._local, "histograms", None)
+        if histograms is None:
+            histograms = self._local.histograms = {}
+            with self._lock:
+                self._thread_histograms.append(histograms)
+
+        key = (stage, device_type, pv_name)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = LatencyHistogram(self.significant_bits)
+        histogram.record(value_ns)
+
+    def merged(self):
+        """
+        Return the histograms of all threads merged, keyed by (stage, device_type, pv_name).
+        """
+        with self._lock:
+            thread_histograms = list(self._thread_histograms)
+
+        merged = {}
+        for histograms in thread_histograms:
+            for key, histogram in list(histograms.items()):
+                if key not in merged:
+                    merged[key] = LatencyHistogram(self.significant_bits)
+                merged[key].merge(histogram)
+        return merged
+
+    def dump(self, per_pv=True):
+        """
+        Return the timing statistics in ns, per stage and device type and optionally per PV.
+        """
+        merged = self.merged()
+        totals = {}
+        for (stage, device_type, _), histogram in merged.items():
+            key = (stage, device_type)
+            if key not in totals:
+                totals[key] = LatencyHistogram(self.significant_bits)
+            totals[key].merge(histogram)
+
+        stats = {}
+        for (stage, device_type), histogram in sorted(totals.items()):
+            stats.setdefault(stage, {})[device_type] = histogram.summary()
+        dump = {"time": time.time(), "unit": "ns", "stages": stats}
+        if per_pv:
+            pvs = {}
+            for (stage, device_type, pv_name), histogram in sorted(merged.items(), key=lambda item: str(item[0])):
+                pvs.setdefault(str(pv_name), {}).setdefault(stage, {})[device_type] = histogram.summary()
+            dump["pvs"] = pvs
+        return dump
+
+    def write(self, path, per_pv=True):
+        with open(path, "w") as file:
+            json.dump(self.dump(per_pv=per_pv), file, indent=2)
+
+
+class StatsDumper:
+    """
+    Periodically writes the dump of an Instrumentation to a JSON file.
+    """
+
+    def __init__(self, instrumentation, path, interval=10.0):
+        self.instrumentation = instrumentation
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop dumping and write the final statistics.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._write()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._write()
+
+    def _write(self):
+        try:
+            self.instrumentation.write(self.path)
+        except Exception as e:
+            logger.error(f"Failed to write latency statistics to {self.path}: {e}")
@@ -1,64 +1,262 @@
+import argparse
 import json
-import os
+import logging
+import math
+import threading
 import time
 
+import numpy as np
 from p4p.client.thread import Context
 
+logger = logging.getLogger(__name__)
 
-def pv_callback(pv_name):
+
+class PVStats:
+    """
+    Aggregated statistics of the updates of one PV since the last snapshot.
+
+    Updates are folded into counters and running sums as they arrive, the
+    value mean and variance with Welford's algorithm, so the cost per
+    update is constant and nothing is kept per update.
+    """
+
+    def __init__(self, expected_period=None, gap_factor=2.0):
+        """
+        :param expected_period: The update period of the PV in seconds, used to detect gaps.
+        :param gap_factor: An interval longer than this many expected periods counts as a gap.
+        """
+        self.expected_period = expected_period
+        self.gap_factor = gap_factor
+        self.total_updates = 0
+        self.last_received = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.updates = 0
+        self.disconnects = 0
+        self.gaps = 0
+        self.max_interval = 0.0
+        self.latency_sum = 0.0
+        self.latency_max = -math.inf
+        self.value_count = 0
+        self.value_mean = 0.0
+        self._value_m2 = 0.0
+        self.value_min = math.inf
+        self.value_max = -math.inf
+        self.last_value = None
+
+    def update(self, value, timestamp, received):
+        """
+        :param value: The new value, arrays are reduced to their mean.
+        :param timestamp: The timeStamp of the update in seconds since the epoch.
+        :param received: The time the update was received in seconds since the epoch.
+        """
+        with self._lock:
+            self.updates += 1
+            self.total_updates += 1
+
+            if self.last_received is not None:
+                interval = received - self.last_received
+                self.max_interval = max(self.max_interval, interval)
+                if self.expected_period and interval > self.gap_factor * self.expected_period:
+                    self.gaps += 1
+            self.last_received = received
+
+            latency = received - timestamp
+            self.latency_sum += latency
+            self.latency_max = max(self.latency_max, latency)
+
+            self.last_value = value
+            if isinstance(value, np.ndarray):
+                if value.size == 0:
+                    return
+                value = value.mean()
+            elif isinstance(value, str):
+                return
+            value = float(value)
+            self.value_count += 1
+            delta = value - self.value_mean
+            self.value_mean += delta / self.value_count
+            self._value_m2 += delta * (value - self.value_mean)
+            self.value_min = min(self.value_min, value)
+            self.value_max = max(self.value_max, value)
+
+    def disconnected(self):
+        with self._lock:
+            self.disconnects += 1
+            self.last_received = None
+
+    def snapshot(self, elapsed, reset=True):
+        """
+        Return the statistics as a dict and optionally start a new interval.
+
+        :param elapsed: Seconds since the last snapshot, used for the update rate.
+        """
+        with self._lock:
+            stats = {
+                "updates": self.updates,
+                "rate": self.updates / elapsed if elapsed > 0 else 0.0,
+                "gaps": self.gaps,
+                "disconnects": self.disconnects,
+                "max_interval": self.max_interval,
+                "latency_mean": self.latency_sum / self.updates if self.updates else None,
+                "latency_max": self.latency_max if self.updates else None,
+                "value_mean": self.value_mean if self.value_count else None,
+                "value_std": math.sqrt(self._value_m2 / self.value_count) if self.value_count else None,
+                "value_min": self.value_min if self.value_count else None,
+                "value_max": self.value_max if self.value_count else None,
+            }
+            if reset:
+                self._reset()
+        return stats
+
+
+def summarise(snapshots, elapsed):
     """
-    Creates a callback function for a specific PV.
+    Aggregate the per-PV snapshots of one interval.
+
+    :param snapshots: Dict of PV name to PVStats.snapshot().
+    :param elapsed: The length of the interval in seconds.
+    """
+    updates = sum(stats["updates"] for stats in snapshots.values())
+    latencies = [stats["latency_mean"] for stats in snapshots.values() if stats["updates"]]
+    max_latencies = [stats["latency_max"] for stats in snapshots.values() if stats["updates"]]
+    return {
+        "time": time.time(),
+        "interval": elapsed,
+        "pvs": len(snapshots),
+        "silent_pvs": sum(1 for stats in snapshots.values() if stats["updates"] == 0),
+        "updates": updates,
+        "rate": updates / elapsed if elapsed > 0 else 0.0,
+        "gaps": sum(stats["gaps"] for stats in snapshots.values()),
+        "disconnects": sum(stats["disconnects"] for stats in snapshots.values()),
+        "latency_mean": sum(latencies) / len(latencies) if latencies else None,
+        "latency_max": max(max_latencies) if max_latencies else None,
+    }
+
+
+def format_summary(summary):
+    latency_mean = summary["latency_mean"]
+    latency_max = summary["latency_max"]
+    latency = (
+        f"latency mean {latency_mean * 1e3:.2f} ms max {latency_max * 1e3:.2f} ms"
+        if latency_mean is not None
+        else "latency n/a"
+    )
+    return (
+        f"{summary['pvs'] - summary['silent_pvs']}/{summary['pvs']} PVs updating | "
+        f"{summary['rate']:.1f} updates/s | {latency} | "
+        f"{summary['gaps']} gaps | {summary['disconnects']} disconnects"
+    )
+
+
+def pv_callback(pv_name, stats, print_updates=False):
+    """
+    Creates a monitor callback for a specific PV.
 
     :param pv_name: The name of the PV.
-    :return: A callback function that prints the PV's new values and timestamps.
+    :param stats: The PVStats of the PV.
+    :param print_updates: Also print every update, only usable for a few PVs.
+    :return: A callback function that records the PV's new values and timestamps.
     """
 
-    def callback(monitor):
-        # Extract the value and timestamp from the monitor update
-        raw_data = monitor.raw
-        value = raw_data["value"]
-        seconds_past_epoch = raw_data["timeStamp"]["secondsPastEpoch"]
-        nanoseconds = raw_data["timeStamp"]["nanoseconds"]
-        print(
-            f"PV: {pv_name:<50} | val: {str(round(value,3)):<20} | Timestamp: {seconds_past_epoch}.{nanoseconds} seconds past epoch"
-        )
-        # print(f"PV: {pv_name} | Value: {value} | Timestamp: {seconds_past_epoch}.{nanoseconds} seconds past epoch")
+    def callback(update):
+        received = time.time()
+        if isinstance(update, Exception):
+            stats.disconnected()
+            logger.debug(f"PV {pv_name}: {update}")
+            return
+
+        value = update["value"]
+        seconds_past_epoch = update["timeStamp.secondsPastEpoch"]
+        nanoseconds = update["timeStamp.nanoseconds"]
+        stats.update(value, seconds_past_epoch + nanoseconds * 1e-9, received)
+        if print_updates:
+            print(
+                f"PV: {pv_name:<50} | val: {str(np.round(value, 3)):<20} | Timestamp: {seconds_past_epoch}.{nanoseconds:09d} seconds past epoch"
+            )
 
     return callback
 
 
-def main(config_path):
-    """
-    Monitors all PVs defined in the JSON config file.
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Monitor the PVs of a target config and report statistics.")
+    parser.add_argument(
+        "-t", "--target-path", required=True, help="The path to the target json file with the PVs to monitor."
+    )
+    parser.add_argument(
+        "-i", "--interval", type=float, default=5.0, help="Seconds between summaries."
+    )
+    parser.add_argument(
+        "--gap-factor",
+        type=float,
+        default=2.0,
+        help="Count an interval between updates longer than this many update periods as a gap.",
+    )
+    parser.add_argument(
+        "-o",
+        "--log-file",
+        default=None,
+        help="Append one JSON line per interval with the summary and the per-PV statistics to this file.",
+    )
+    parser.add_argument(
+        "--print-updates",
+        action="store_true",
+        help="Also print every update, like the original listener. Only usable for a few PVs.",
+    )
+    parser.add_argument(
+        "-l", "--log-level", default="INFO", help="The log level.",
+    )
+    return parser.parse_args(argv)
+
 
-    :param config_path: Path to the JSON config file.
+def main(argv=None):
     """
-    # Load the JSON config file
-    with open(config_path, "r") as file:
+    Monitors all PVs defined in a target config file and periodically reports their statistics.
+    """
+    args = parse_arguments(argv)
+    logging.basicConfig(level=args.log_level, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    with open(args.target_path, "r") as file:
         config = json.load(file)
 
-    # Create a p4p context for monitoring
-    with Context("pva") as context:
-        monitors = []
-        # Set up a monitor for each PV in the config
-        for pv_name in config.keys():
-            print(f"Monitoring PV: {pv_name}")
-            # The callback function is specific to each PV
-            callback = pv_callback(pv_name)
-            # Start monitoring the PV
-            monitor = context.monitor(pv_name, callback)
-            monitors.append(monitor)
-
-        # Keep the script running to continue monitoring
+    stats = {
+        pv_name: PVStats(
+            expected_period=(pv_config or {}).get("update_period") or 1.0, gap_factor=args.gap_factor
+        )
+        for pv_name, pv_config in config.items()
+    }
+
+    log_file = open(args.log_file, "a") if args.log_file else None
+    # nt=False delivers the raw Values, which skips unwrapping every update
+    with Context("pva", nt=False) as context:
+        monitors = [
+            context.monitor(pv_name, pv_callback(pv_name, pv_stats, args.print_updates), notify_disconnect=True)
+            for pv_name, pv_stats in stats.items()
+        ]
+        logger.info(f"Monitoring {len(monitors)} PVs from {args.target_path}")
+
+        last = time.monotonic()
         try:
             while True:
-                # The monitors are active in this loop, receiving updates.
-                time.sleep(1)
+                time.sleep(args.interval)
+                now = time.monotonic()
+                elapsed, last = now - last, now
+                snapshots = {pv_name: pv_stats.snapshot(elapsed) for pv_name, pv_stats in stats.items()}
+                summary = summarise(snapshots, elapsed)
+                logger.info(format_summary(summary))
+                if log_file is not None:
+                    log_file.write(json.dumps({**summary, "per_pv": snapshots}) + "\n")
+                    log_file.flush()
         except KeyboardInterrupt:
-            print("Stopping PV monitoring...")
+            logger.info("Stopping PV monitoring...")
+        finally:
+            for monitor in monitors:
+                monitor.close()
+            if log_file is not None:
+                log_file.close()
 
 
 if __name__ == "__main__":
-    current_path = os.path.dirname(__file__)
-    config_path = os.path.join(current_path, "ioc_config", "odin_targets.json")
-    main(config_path)
+    main()
@@ -1,7 +1,9 @@
 import argparse
+import asyncio
 import json
 import logging
 import os
+import signal
 import sys
 import time
 
@@ -9,16 +11,32 @@ from p4p.client.thread import Context
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
-from src.config_from_json import build_config
+from src.async_runtime import AsyncRuntime
+from src.batch_producer import BatchProducer
+from src.config_from_json import build_config, build_config_streaming
+from src.config_watcher import ConfigWatcher
+from src.device_cache import DeviceCache, load_device_config
+from src.instrumentation import Instrumentation, StatsDumper
+from src.metrics import MetricsServer, Registry, register_simulator_metrics
 from src.module_f144 import DeviceF144
+from src.module_tdct import DeviceTDCT
 from src.pv_factory import PVFactory
 from src.pva_server import EpicsPVAServer
-from src.run_thread import EpicsThreadF144
+from src.recording import Recorder, Recording, Replayer
+from src.run_thread import (
+    MISSED_TICK_POLICIES,
+    SKIP,
+    EpicsThreadF144,
+    KafkaThreadF144,
+    KafkaThreadTDCT,
+)
+from src.sasl_utils import add_sasl_commandline_options, generate_kafka_security_config
+from src.scheduler import Scheduler
+from src.sharding import Supervisor, shard_devices
+from src.simulation_core import SimulationCore
 
 logger = logging.getLogger(__name__)
 
-context = Context("pva")
-
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Fill this out later.")
@@ -27,6 +45,24 @@ def parse_arguments():
         "-j", "--json", required=True, help="The path to the json file."
     )
 
+    parser.add_argument(
+        "--stream-json",
+        action="store_true",
+        help="Parse the json file incrementally instead of loading it whole, for very large files.",
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Directory for the cache of devices parsed from json files, ~/.cache/pv-simulator by default.",
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always parse the json file instead of using the device cache.",
+    )
+
     parser.add_argument(
         "-t", "--target-path", required=True, help="The path to the target json file."
     )
@@ -35,6 +71,155 @@ def parse_arguments():
         "-c", "--config", required=False, help="The path to the config file."
     )
 
+    parser.add_argument(
+        "--runtime",
+        default="thread",
+        choices=["thread", "asyncio"],
+        help="Drive the simulation from scheduler threads or from a single asyncio event loop.",
+    )
+
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        default=1,
+        help="Split the PVs over this many worker processes, each with its own PVA server.",
+    )
+
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of scheduler worker threads driving the PVs, 0 runs one thread per PV.",
+    )
+
+    parser.add_argument(
+        "--fixed-rate",
+        action="store_true",
+        help="Schedule updates on absolute deadlines instead of sleeping a period after each update.",
+    )
+
+    parser.add_argument(
+        "--missed-ticks",
+        default=SKIP,
+        choices=MISSED_TICK_POLICIES,
+        help="What to do with missed deadlines in fixed rate mode.",
+    )
+
+    parser.add_argument(
+        "--reload-interval",
+        type=float,
+        default=1.0,
+        help="Seconds between checks of the target file for changes, 0 disables hot reload.",
+    )
+
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve Prometheus metrics on this port. With several processes, worker N uses the port plus N.",
+    )
+
+    parser.add_argument(
+        "--metrics-host",
+        default="127.0.0.1",
+        help="The address to serve the metrics on.",
+    )
+
+    parser.add_argument(
+        "--latency-stats",
+        default=None,
+        help="Record the timings of every stage of the updates and write them to this JSON file.",
+    )
+
+    parser.add_argument(
+        "--latency-stats-interval",
+        type=float,
+        default=10.0,
+        help="Seconds between writes of the latency statistics.",
+    )
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed for the noise generator, to get the same noise on every run.",
+    )
+
+    parser.add_argument(
+        "--record",
+        default=None,
+        help="Record every value posted to the PVs to this file, for --replay.",
+    )
+
+    parser.add_argument(
+        "--replay",
+        default=None,
+        help="Publish the values of a recording instead of simulating new ones, then exit.",
+    )
+
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="Replay speed relative to the recording, 0 replays as fast as possible.",
+    )
+
+    parser.add_argument(
+        "--replay-original-timestamps",
+        action="store_true",
+        help="Publish the replayed values with their recorded timestamps instead of the time of the replay.",
+    )
+
+    parser.add_argument(
+        "--lazy-pvs",
+        action="store_true",
+        help="Only create and simulate a PV when a client connects to it, instead of all PVs at startup.",
+    )
+
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=60.0,
+        help="With --lazy-pvs, seconds without clients after which a PV is closed and no longer simulated.",
+    )
+
+    parser.add_argument(
+        "--suspend-unwatched",
+        action="store_true",
+        help="Only simulate the PVs that have a client connected, PVs resume with a fresh value on connect.",
+    )
+
+    parser.add_argument(
+        "--put-via-client",
+        action="store_true",
+        help="Update PVs with a p4p client put instead of posting directly to the served PVs.",
+    )
+
+    parser.add_argument(
+        "-b",
+        "--broker",
+        required=False,
+        help="Kafka broker to also produce the simulated f144 messages to.",
+    )
+
+    parser.add_argument(
+        "--linger-ms",
+        type=int,
+        default=5,
+        help="How long the Kafka producer waits to fill a batch.",
+    )
+
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10000,
+        help="Maximum number of messages in a Kafka batch.",
+    )
+
+    add_sasl_commandline_options(parser)
+
     parser.add_argument(
         "-l",
         "--log_level",
@@ -43,7 +228,20 @@ def parse_arguments():
         help="Set the logging level.",
     )
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.runtime == "asyncio" and args.put_via_client:
+        parser.error("--put-via-client is not supported with the asyncio runtime")
+    if (args.record or args.replay) and (args.runtime == "asyncio" or args.processes > 1):
+        parser.error("--record and --replay are only supported with the thread runtime and a single process")
+    if args.lazy_pvs and (args.runtime == "asyncio" or args.put_via_client):
+        parser.error("--lazy-pvs is only supported with the thread runtime, without --put-via-client")
+    if args.suspend_unwatched and args.put_via_client:
+        parser.error("--suspend-unwatched cannot be combined with --put-via-client, which keeps every PV connected")
+    if args.record and args.replay:
+        parser.error("--record and --replay cannot be combined")
+    if args.replay and args.lazy_pvs:
+        parser.error("--replay cannot be combined with --lazy-pvs, values of PVs that were not created would be lost")
+    return args
 
 
 def configure_logging(level):
@@ -53,61 +251,355 @@ def configure_logging(level):
     logging.basicConfig(level=numeric_level)
 
 
-def read_config(path):
-    with open(path, "r") as f:
-        return json.load(f)
+def create_producer(args):
+    if args.broker is None:
+        return None
 
+    kafka_config = generate_kafka_security_config(
+        args.security_protocol,
+        args.sasl_mechanism,
+        args.sasl_username,
+        args.sasl_password,
+        args.ssl_cafile,
+    )
+    kafka_config["bootstrap.servers"] = args.broker
+    return BatchProducer(kafka_config, linger_ms=args.linger_ms, batch_size=args.batch_size)
 
-def main():
-    args = parse_arguments()
 
-    configure_logging(args.log_level)
+def create_threads(args, devices, target_config, server, context, producer, scheduler, core, recorder=None):
+    common = {
+        "scheduler": scheduler,
+        "fixed_rate": args.fixed_rate,
+        "missed_tick_policy": args.missed_ticks,
+        "instrumentation": server.instrumentation,
+    }
+    threads = [
+        EpicsThreadF144(
+            dev,
+            context=context,
+            config=target_config.get(dev.source_name, None),
+            server=None if context is not None else server,
+            core=core,
+            recorder=recorder,
+            **common,
+        )
+        for dev in devices.values()
+        if isinstance(dev, DeviceF144)
+    ]
 
-    with open(args.json, "r") as file:
-        json_data = json.load(file)
+    if producer is not None:
+        threads += [
+            KafkaThreadF144(
+                dev,
+                producer,
+                config=target_config.get(dev.source_name, None),
+                core=core,
+                **common,
+            )
+            for dev in devices.values()
+            if isinstance(dev, DeviceF144)
+        ]
+        threads += [
+            KafkaThreadTDCT(
+                dev,
+                producer,
+                config=target_config.get(dev.source_name, None),
+                rng=core.spawn_rng(),
+                **common,
+            )
+            for dev in devices.values()
+            if isinstance(dev, DeviceTDCT)
+        ]
+
+    return threads
+
+
+def create_stats_dumper(args, instrumentation):
+    if instrumentation is None:
+        return None
+    path = args.latency_stats
+    if args.processes > 1:
+        # One file per worker process
+        root, extension = os.path.splitext(path)
+        path = f"{root}.{os.getpid()}{extension}"
+    stats_dumper = StatsDumper(instrumentation, path, interval=args.latency_stats_interval)
+    stats_dumper.start()
+    logger.info(f"Writing latency statistics to {path}")
+    return stats_dumper
+
+
+def create_replayer(args, threads):
+    if args.replay is None:
+        return None
+    # Only the values posted to the PVs are recorded, so they are replayed to the PVs only
+    targets = {pv_name: thread.publish for pv_name, thread in epics_threads_by_pv(threads).items()}
+    return Replayer(
+        Recording(args.replay),
+        targets,
+        speed=args.replay_speed,
+        original_timestamps=args.replay_original_timestamps,
+    )
 
-    dev_config = build_config(json_data)
 
-    pv_factory = PVFactory(dev_config)
-    devices = pv_factory.get_devices()
+def epics_threads_by_pv(threads):
+    return {thread.pv_name: thread for thread in threads if isinstance(thread, EpicsThreadF144)}
+
+
+def suspend_unwatched(args, threads, server):
+    """
+    With --suspend-unwatched, suspend the EPICS threads of PVs without clients, before they are started.
+    """
+    if not args.suspend_unwatched:
+        return
+    epics_threads = epics_threads_by_pv(threads)
+
+    def on_subscribe(pv_name):
+        thread = epics_threads.get(pv_name)
+        if thread is not None:
+            thread.resume()
+
+    def on_unsubscribe(pv_name):
+        thread = epics_threads.get(pv_name)
+        if thread is not None:
+            thread.suspend()
+
+    server.set_subscription_callbacks(on_subscribe, on_unsubscribe)
 
-    if args.config is not None:
-        with open(args.config, "r") as file:
-            server_config = json.load(file)
-    else:
-        server_config = {}
 
+def start_threads(args, threads, server):
+    """
+    Start simulating. With lazy PVs the EPICS threads only run while their PV exists.
+    """
+    suspend_unwatched(args, threads, server)
+    if not args.lazy_pvs:
+        for thread in threads:
+            thread.start()
+        return
+
+    epics_threads = epics_threads_by_pv(threads)
+    for thread in threads:
+        if not isinstance(thread, EpicsThreadF144):
+            thread.start()
+
+    def on_materialise(pv_name):
+        thread = epics_threads.get(pv_name)
+        if thread is not None:
+            thread.start()
+
+    def on_evict(pv_name):
+        thread = epics_threads.get(pv_name)
+        if thread is not None:
+            thread.stop()
+
+    server.set_lifecycle_callbacks(on_materialise, on_evict)
+
+
+def start_metrics_server(args, threads_by_pv, server, producer, scheduler):
+    if args.metrics_port is None:
+        return None
+    registry = Registry()
+    register_simulator_metrics(
+        registry,
+        lambda: [thread for threads in threads_by_pv.values() for thread in threads],
+        server=server,
+        producer=producer,
+        scheduler=scheduler,
+    )
+    metrics_server = MetricsServer(registry, port=args.metrics_port, host=args.metrics_host)
+    metrics_server.start()
+    return metrics_server
+
+
+def run_simulation(args, devices, server_config, stop_event=None, update_targets=True):
+    """
+    Serve and simulate the devices until interrupted or until `stop_event` is set.
+    """
+    instrumentation = Instrumentation() if args.latency_stats else None
     server = EpicsPVAServer(
-        devices=devices, gateway_config=server_config, target_config_path=args.target_path,
+        devices=devices,
+        gateway_config=server_config,
+        target_config_path=args.target_path,
+        update_targets=update_targets,
+        instrumentation=instrumentation,
+        lazy=args.lazy_pvs,
+        idle_timeout=args.idle_timeout,
     )
-    server.start()
+    stats_dumper = create_stats_dumper(args, instrumentation)
 
-    target_config = read_config(args.target_path)
+    threads_by_pv = {}
 
-    threads = [
-        EpicsThreadF144(
-            dev, context=context, config=target_config.get(dev.source_name, None)
+    def apply_config_changes(changed):
+        for pv_name, pv_config in changed.items():
+            for thread in threads_by_pv.get(pv_name, []):
+                logger.info(f"Reloading config for {pv_name}")
+                try:
+                    thread.set_config(pv_config)
+                except Exception as e:
+                    logger.error(f"Failed to apply the new config of {pv_name}, keeping the old one: {e}")
+
+    watcher = ConfigWatcher(
+        args.target_path, apply_config_changes, poll_interval=args.reload_interval
+    )
+    core = SimulationCore(seed=args.seed)
+    producer = create_producer(args)
+
+    metrics_server = None
+
+    if args.runtime == "asyncio":
+        runtime = AsyncRuntime(
+            server, producer=producer, watcher=watcher if args.reload_interval > 0 else None
         )
-        for dev in devices.values()
-        if isinstance(dev, DeviceF144)
-    ]
 
-    for thread in threads:
-        thread.start()
+        def make_threads():
+            nonlocal metrics_server
+            target_config = watcher.load() or {}
+            threads = create_threads(
+                args, devices, target_config, server, None, producer, runtime.scheduler, core
+            )
+            for thread in threads:
+                threads_by_pv.setdefault(thread.device.source_name, []).append(thread)
+            suspend_unwatched(args, threads, server)
+            metrics_server = start_metrics_server(args, threads_by_pv, server, producer, None)
+            logger.info(f"Configuration for server: {server.get_context().conf()}")
+            return threads
+
+        try:
+            asyncio.run(runtime.run(make_threads, stop_event=stop_event))
+        except KeyboardInterrupt:
+            pass
+        if metrics_server is not None:
+            metrics_server.stop()
+        if stats_dumper is not None:
+            stats_dumper.stop()
+        return
 
+    server.start()
     #  Make sure that the server is started before continuing
-    time.sleep(0.5)
+    while not server.ready.wait(timeout=0.1):
+        if not server.is_alive():
+            logger.error("EPICS PVA server failed to start")
+            sys.exit(1)
+
+    target_config = watcher.load() or {}
+
+    scheduler = Scheduler(num_workers=args.workers) if args.workers > 0 else None
+
+    # Only the loopback put mode needs a client context
+    context = Context("pva") if args.put_via_client else None
+
+    if producer is not None:
+        producer.start()
+
+    # Only the values posted to the PVs are recorded
+    recorder = Recorder(args.record) if args.record else None
+    threads = create_threads(
+        args, devices, target_config, server, context, producer, scheduler, core, recorder
+    )
+    replayer = create_replayer(args, threads)
+    for thread in threads:
+        threads_by_pv.setdefault(thread.device.source_name, []).append(thread)
+    metrics_server = start_metrics_server(args, threads_by_pv, server, producer, scheduler)
+
+    if scheduler is not None:
+        scheduler.start()
+
+    if replayer is None:
+        start_threads(args, threads, server)
+
+        if args.reload_interval > 0:
+            watcher.start()
 
     logger.info("EPICS PVA server started")
     logger.info(f"Configuration for server: {server.get_context().conf()}")
 
     try:
-        while True:
-            time.sleep(1)
+        if replayer is not None:
+            replayer.run(stop_event)
+        elif stop_event is not None:
+            stop_event.wait()
+        else:
+            while True:
+                time.sleep(1)
     except KeyboardInterrupt:
-        for thread in threads:
-            thread.stop()
-        server.join()
+        pass
+
+    watcher.stop()
+    for thread in threads:
+        thread.stop()
+    if scheduler is not None:
+        scheduler.stop()
+    if recorder is not None:
+        recorder.close()
+    if producer is not None:
+        producer.close()
+    if context is not None:
+        context.close()
+    server.stop()
+    server.join()
+    if metrics_server is not None:
+        metrics_server.stop()
+    if stats_dumper is not None:
+        stats_dumper.stop()
+
+
+def shard_arguments(args, index):
+    """
+    Return the arguments of the worker of a shard, with its own metrics port.
+    """
+    if args.metrics_port is None:
+        return args
+    return argparse.Namespace(**{**vars(args), "metrics_port": args.metrics_port + index})
+
+
+def run_worker(args, devices, server_config, stop_event):
+    """
+    Entry point of a worker process serving one shard of the devices.
+    """
+    # The supervisor handles Ctrl-C and stops the workers through the event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_logging(args.log_level)
+    logger.info(f"Worker starting with {len(devices)} devices")
+    run_simulation(args, devices, server_config, stop_event=stop_event, update_targets=False)
+
+
+def parse_json(path, stream=False):
+    with open(path, "r") as file:
+        if stream:
+            return build_config_streaming(file)
+        return build_config(json.load(file))
+
+
+def main():
+    args = parse_arguments()
+
+    configure_logging(args.log_level)
+
+    cache = None if args.no_cache else DeviceCache(args.cache_dir)
+    dev_config = load_device_config(args.json, lambda path: parse_json(path, args.stream_json), cache)
+
+    pv_factory = PVFactory(dev_config)
+    devices = pv_factory.get_devices()
+
+    if args.config is not None:
+        with open(args.config, "r") as file:
+            server_config = json.load(file)
+    else:
+        server_config = {}
+
+    if args.processes > 1:
+        # Add missing PVs to the target file once, before the workers read it
+        EpicsPVAServer(devices, server_config, target_config_path=args.target_path).update_config()
+        supervisor = Supervisor(
+            run_worker,
+            [
+                (shard_arguments(args, index), shard, server_config)
+                for index, shard in enumerate(shard_devices(devices, args.processes))
+            ],
+        )
+        supervisor.run()
+        return
+
+    run_simulation(args, devices, server_config)
 
 
 if __name__ == "__main__":
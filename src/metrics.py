@@ -0,0 +1,249 @@
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_sample(name, labels, value):
+    if labels:
+        label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in sorted(labels.items()))
+        return f"{name}{{{label_text}}} {float(value)!r}"
+    return f"{name} {float(value)!r}"
+
+
+class Metric:
+    """
+    A named metric with optional labels, in the Prometheus text format.
+
+    The samples are either kept by the metric itself, or, when a callback
+    is given, read from the objects that already count them when the
+    metrics are scraped. The latter keeps the hot path to incrementing a
+    plain attribute.
+    """
+
+    metric_type = "untyped"
+
+    def __init__(self, name, documentation, callback=None):
+        """
+        :param name: The metric name.
+        :param documentation: The HELP text.
+        :param callback: Optional function returning a value, or a list of (labels dict, value) tuples.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        if self.callback is not None:
+            result = self.callback()
+            if isinstance(result, (int, float)):
+                return [({}, result)]
+            return list(result)
+        with self._lock:
+            return [(dict(labels), value) for labels, value in self._values.items()]
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def exposition(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        lines += [_format_sample(self.name, labels, value) for labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    metric_type = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, callback=None):
+        return self.register(Counter(name, documentation, callback))
+
+    def gauge(self, name, documentation, callback=None):
+        return self.register(Gauge(name, documentation, callback))
+
+    def exposition(self):
+        """
+        Return all metrics in the Prometheus text exposition format.
+        """
+        blocks = []
+        for metric in self.metrics.values():
+            try:
+                blocks.append(metric.exposition())
+            except Exception as e:
+                logger.error(f"Failed to collect metric {metric.name}: {e}")
+        return "\n".join(blocks) + "\n"
+
+
+def _sum_by_type(threads, attribute):
+    totals = {}
+    for thread in threads:
+        device_type = type(thread).__name__
+        totals[device_type] = totals.get(device_type, 0) + getattr(thread, attribute)
+    return [({"device_type": device_type}, total) for device_type, total in sorted(totals.items())]
+
+
+def _thread_states(threads):
+    counts = {}
+    for thread in threads:
+        if not thread.is_alive():
+            state = "stopped"
+        else:
+            state = "suspended" if thread.suspended else "alive"
+        key = (type(thread).__name__, state)
+        counts[key] = counts.get(key, 0) + 1
+    return [
+        ({"device_type": device_type, "state": state}, count)
+        for (device_type, state), count in sorted(counts.items())
+    ]
+
+
+def register_simulator_metrics(registry, get_threads, server=None, producer=None, scheduler=None):
+    """
+    Register the metrics of a running simulation. They are all read from
+    the existing counters when scraped.
+
+    :param get_threads: Returns the current simulation threads.
+    :param server: The EpicsPVAServer.
+    :param producer: The BatchProducer, if producing to Kafka.
+    :param scheduler: The Scheduler, if any.
+    """
+    started = time.time()
+    registry.gauge("pv_simulator_start_time_seconds", "Start time of the simulator since the epoch.", lambda: started)
+    registry.counter(
+        "pv_simulator_updates_total",
+        "Values posted, put or produced.",
+        lambda: _sum_by_type(get_threads(), "updates"),
+    )
+    registry.counter(
+        "pv_simulator_update_errors_total",
+        "Updates that failed to be posted, put or produced.",
+        lambda: _sum_by_type(get_threads(), "errors"),
+    )
+    registry.counter(
+        "pv_simulator_late_ticks_total",
+        "Fixed-rate ticks that started late.",
+        lambda: _sum_by_type(get_threads(), "late_ticks"),
+    )
+    registry.counter(
+        "pv_simulator_skipped_ticks_total",
+        "Fixed-rate ticks that were skipped.",
+        lambda: _sum_by_type(get_threads(), "skipped_ticks"),
+    )
+    registry.gauge("pv_simulator_threads", "Simulated devices by state.", lambda: _thread_states(get_threads()))
+    if server is not None:
+        registry.gauge("pv_simulator_pvs", "PVs served.", lambda: len(server.pvs))
+    if scheduler is not None:
+        registry.gauge("pv_simulator_scheduled_jobs", "Entries in the scheduler queue.", lambda: len(scheduler))
+        registry.counter(
+            "pv_simulator_scheduler_dispatched_total", "Ticks run by the scheduler.", lambda: scheduler.dispatched
+        )
+        registry.counter(
+            "pv_simulator_scheduler_late_dispatches_total",
+            "Ticks that started later than the overload threshold.",
+            lambda: scheduler.late_dispatches,
+        )
+        registry.gauge(
+            "pv_simulator_scheduler_max_lag_seconds",
+            "Longest time a tick waited past its deadline to start.",
+            lambda: scheduler.max_lag,
+        )
+    if producer is not None:
+        registry.gauge("pv_simulator_kafka_queue_depth", "Messages waiting for delivery.", producer.queue_depth)
+        registry.counter(
+            "pv_simulator_kafka_delivered_total", "Messages delivered to Kafka.", lambda: producer.delivered
+        )
+        registry.counter(
+            "pv_simulator_kafka_failed_total", "Messages that failed to be delivered.", lambda: producer.failed
+        )
+        registry.counter(
+            "pv_simulator_kafka_dropped_total",
+            "Messages dropped because the producer queue stayed full.",
+            lambda: producer.dropped,
+        )
+
+
+class MetricsServer:
+    """
+    Serves the metrics of a Registry over HTTP at /metrics.
+    """
+
+    def __init__(self, registry, port=0, host="127.0.0.1"):
+        """
+        :param port: The port to listen on, 0 picks a free one (see self.port).
+        :param host: The address to listen on, only local connections by default.
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.exposition().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"Metrics request from {self.address_string()}: {format % args}")
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
@@ -1,23 +1,176 @@
+import struct
 from time import time_ns
 
+import numpy as np
 from streaming_data_types import serialise_f144
 
+# struct codes of the value types f144 supports, by NumPy kind and size
+_STRUCT_CODES = {
+    ("i", 1): "b",
+    ("u", 1): "B",
+    ("i", 2): "h",
+    ("u", 2): "H",
+    ("i", 4): "i",
+    ("u", 4): "I",
+    ("i", 8): "q",
+    ("u", 8): "Q",
+    ("f", 4): "f",
+    ("f", 8): "d",
+}
+# NumPy dtype of np.array(value) for plain Python scalars, as serialise_f144 converts them
+_PYTHON_SCALAR_DTYPES = {float: np.dtype(np.float64), int: np.dtype(np.int64)}
+# The timestamp is a long in the f144 schema
+_TIMESTAMP_CODE = "q"
+
+
+def _sentinel(code, fill):
+    """
+    A value of a struct type with every byte set to `fill`.
+    """
+    return struct.unpack(f"<{code}", bytes([fill]) * struct.calcsize(code))[0]
+
+
+def _changed_region(first, second):
+    """
+    Return the offset and length of the single region in which two messages differ.
+    """
+    if len(first) != len(second):
+        raise ValueError("The f144 message layout depends on the value")
+    changed = np.flatnonzero(np.frombuffer(first, np.uint8) != np.frombuffer(second, np.uint8))
+    if len(changed) == 0:
+        raise ValueError("The value is not stored in the f144 message")
+    start, end = int(changed[0]), int(changed[-1]) + 1
+    if len(changed) != end - start:
+        raise ValueError("The value is not stored in one place in the f144 message")
+    return start, end - start
+
+
+class F144Template:
+    """
+    A serialised f144 message of one source and value type, in which only
+    the value and the timestamp are replaced for every new message.
+
+    The template is made with serialise_f144 itself. The positions of the
+    value and the timestamp are found by serialising sentinel values that
+    differ in every byte, so the result is byte-identical to serialise_f144
+    without depending on the FlatBuffers layout. FlatBuffers leaves out
+    scalar fields that have their default value of zero, which changes the
+    layout, so serialise() returns None for those and the caller has to use
+    serialise_f144.
+    """
+
+    def __init__(self, source_name, dtype, shape=()):
+        """
+        :param source_name: The source name of the messages.
+        :param dtype: The NumPy dtype of the values, one that f144 supports.
+        :param shape: () for scalars, (n,) for arrays of n elements.
+        """
+        dtype = np.dtype(dtype)
+        code = _STRUCT_CODES.get((dtype.kind, dtype.itemsize))
+        if code is None or dtype.byteorder == ">" or len(shape) > 1:
+            raise ValueError(f"Unsupported f144 value type {dtype} with shape {shape}")
+        self.source_name = source_name
+        self.dtype = dtype
+        self.shape = tuple(shape)
+        self.is_array = len(self.shape) == 1
+
+        value_a = self._sentinel_value(code, 0x11)
+        value_b = self._sentinel_value(code, 0x22)
+        timestamp_a = _sentinel(_TIMESTAMP_CODE, 0x11)
+        timestamp_b = _sentinel(_TIMESTAMP_CODE, 0x22)
+        template = serialise_f144(source_name, value_a, timestamp_a)
+        value_offset, value_size = _changed_region(template, serialise_f144(source_name, value_b, timestamp_a))
+        timestamp_offset, _ = _changed_region(template, serialise_f144(source_name, value_a, timestamp_b))
+
+        # One struct packs the constant parts and both fields into a complete message
+        value_format = f"{value_size}s" if self.is_array else code
+        fields = sorted(
+            [(value_offset, value_format, value_size), (timestamp_offset, _TIMESTAMP_CODE, struct.calcsize(_TIMESTAMP_CODE))]
+        )
+        formats = []
+        self._constants = []
+        position = 0
+        for offset, field_format, size in fields:
+            formats += [f"{offset - position}s", field_format]
+            self._constants.append(template[position:offset])
+            position = offset + size
+        formats.append(f"{len(template) - position}s")
+        self._constants.append(template[position:])
+        self._struct = struct.Struct("<" + "".join(formats))
+        self._value_first = value_offset < timestamp_offset
+        self.size = len(template)
+
+    def _sentinel_value(self, code, fill):
+        if self.is_array:
+            return np.frombuffer(bytes([fill]) * (self.dtype.itemsize * self.shape[0]), dtype=self.dtype)
+        return self.dtype.type(_sentinel(code, fill))
+
+    def serialise(self, value, timestamp_unix_ns):
+        """
+        Return the message of a value, or None if it has to be made with serialise_f144.
+
+        :param value: A scalar, or a NumPy array of the template's dtype and shape.
+        :param timestamp_unix_ns: The timestamp in ns since the epoch.
+        """
+        if timestamp_unix_ns == 0:
+            return None
+        if self.is_array:
+            value = np.ascontiguousarray(value).tobytes()
+        elif value == 0:
+            return None
+        head, middle, tail = self._constants
+        try:
+            if self._value_first:
+                return self._struct.pack(head, value, middle, timestamp_unix_ns, tail)
+            return self._struct.pack(head, timestamp_unix_ns, middle, value, tail)
+        except struct.error:
+            # Out of range for the type, let serialise_f144 decide what to do with it
+            return None
+
 
 class DeviceF144:
-    def __init__(self, source_name=None, topic=None, dtype=None, value_units=None):
+    __slots__ = ("source_name", "topic", "dtype", "value_units", "array_size", "_templates")
+
+    def __init__(self, source_name=None, topic=None, dtype=None, value_units=None, array_size=None):
         self.source_name = source_name
         self.topic = topic
         self.dtype = dtype
         self.value_units = value_units
+        self.array_size = array_size
+        # F144Templates by value dtype and shape, made on first use
+        self._templates = None
 
     def gen_message(self, value, timestamp_unix_ns=None):
         if timestamp_unix_ns is None:
             timestamp_unix_ns = time_ns()
+        template = self._template(value)
+        if template is not None:
+            message = template.serialise(value, timestamp_unix_ns)
+            if message is not None:
+                return message
         return serialise_f144(
             source_name=self.source_name,
             value=value,
             timestamp_unix_ns=timestamp_unix_ns,
         )
 
+    def _template(self, value):
+        value_type = type(value)
+        if value_type in _PYTHON_SCALAR_DTYPES:
+            key = (_PYTHON_SCALAR_DTYPES[value_type], ())
+        elif isinstance(value, (np.ndarray, np.number)):
+            key = (value.dtype, value.shape)
+        else:
+            return None
+
+        if self._templates is None:
+            self._templates = {}
+        if key not in self._templates:
+            try:
+                self._templates[key] = F144Template(self.source_name, *key)
+            except (ValueError, NotImplementedError):
+                self._templates[key] = None
+        return self._templates[key]
+
     def __repr__(self):
-        return f"DeviceF144(source_name={self.source_name}, topic={self.topic}, dtype={self.dtype}, value_units={self.value_units})"
+        return f"DeviceF144(source_name={self.source_name}, topic={self.topic}, dtype={self.dtype}, value_units={self.value_units}, array_size={self.array_size})"
@@ -2,6 +2,8 @@ from streaming_data_types import serialise_tdct
 
 
 class DeviceTDCT:
+    __slots__ = ("source_name", "topic", "dtype", "value_units", "_counter")
+
     def __init__(self, source_name=None, topic=None, dtype=None, value_units=None):
         self.source_name = source_name
         self.topic = topic
@@ -1,27 +1,11 @@
-from src.module_f144 import DeviceF144
-from src.module_tdct import DeviceTDCT
+from src.device_table import DeviceTable
 
 
 class PVFactory:
     def __init__(self, config):
         self.config = config
-        self.devices = self._load_devices()
-
-    def _load_devices(self):
-        devices = {}
-        for path, details in self.config.items():
-            class_name = f"Device{details['module'].upper()}"
-            try:
-                device_class = globals()[class_name]
-                devices[path] = device_class(
-                    details["source"],
-                    details["topic"],
-                    details["dtype"],
-                    details["value_units"],
-                )
-            except KeyError:
-                print(f"Unknown device class: {class_name}")
-        return devices
+        self.table = DeviceTable.from_config(config)
+        self.devices = self.table.devices()
 
     def get_devices(self):
         return self.devices
@@ -1,3 +1,6 @@
+from time import time_ns
+
+import numpy as np
 from p4p import Type
 
 ess_bool_data_type = Type(
@@ -272,6 +275,77 @@ ess_s_data_type = Type(
 )
 
 
+ess_ai_data_type = Type(
+    [
+        ("value", "ai"),  # integer arrays
+        ("alarm", ("S", None, [("severity", "i"), ("status", "i"), ("message", "s"),])),
+        (
+            "timeStamp",
+            (
+                "S",
+                None,
+                [("secondsPastEpoch", "l"), ("nanoseconds", "i"), ("userTag", "i"),],
+            ),
+        ),
+        (
+            "display",
+            (
+                "S",
+                None,
+                [
+                    ("limitLow", "d"),
+                    ("limitHigh", "d"),
+                    ("description", "s"),
+                    ("units", "s"),
+                    ("precision", "i"),
+                    ("form", ("S", None, [("index", "i"), ("choices", "as"),])),
+                ],
+            ),
+        ),
+        (
+            "control",
+            ("S", None, [("limitLow", "d"), ("limitHigh", "d"), ("minStep", "d"),]),
+        ),
+    ],
+    id="epics:nt/NTScalarArray:1.0",
+)
+
+ess_ad_data_type = Type(
+    [
+        ("value", "ad"),  # double arrays
+        ("alarm", ("S", None, [("severity", "i"), ("status", "i"), ("message", "s"),])),
+        (
+            "timeStamp",
+            (
+                "S",
+                None,
+                [("secondsPastEpoch", "l"), ("nanoseconds", "i"), ("userTag", "i"),],
+            ),
+        ),
+        (
+            "display",
+            (
+                "S",
+                None,
+                [
+                    ("limitLow", "d"),
+                    ("limitHigh", "d"),
+                    ("description", "s"),
+                    ("units", "s"),
+                    ("precision", "i"),
+                    ("form", ("S", None, [("index", "i"), ("choices", "as"),])),
+                ],
+            ),
+        ),
+        (
+            "control",
+            ("S", None, [("limitLow", "d"), ("limitHigh", "d"), ("minStep", "d"),]),
+        ),
+    ],
+    id="epics:nt/NTScalarArray:1.0",
+)
+
+
 DTYPE_MAP = {
     "int": ess_i_data_type,
     "float": ess_f_data_type,
@@ -287,3 +361,71 @@ INITIAL_VALUES = {
     "string": "",
     "bool": False,
 }
+
+# Scalar dtypes whose values are simulated as floats, e.g. by a SimulationCore
+NUMERIC_DTYPES = ("int", "float", "double")
+
+# Waveform PVs, used for devices with an array_size
+ARRAY_DTYPE_MAP = {
+    "int": ess_ai_data_type,
+    "float": ess_ad_data_type,
+    "double": ess_ad_data_type,
+}
+
+# NumPy dtypes matching the array types, so buffers can be posted without conversion
+ARRAY_NUMPY_DTYPES = {
+    "int": np.int32,
+    "float": np.float64,
+    "double": np.float64,
+}
+
+
+def get_pv_type(device):
+    """
+    Return the p4p Type for a device, or None if its dtype is not supported.
+    """
+    if getattr(device, "array_size", None):
+        return ARRAY_DTYPE_MAP.get(device.dtype)
+    return DTYPE_MAP.get(device.dtype)
+
+
+def initial_value(device, target_value=None):
+    """
+    Return the initial value of a device's PV, an array for waveform devices.
+    """
+    array_size = getattr(device, "array_size", None)
+    if array_size:
+        value = np.zeros(array_size, dtype=ARRAY_NUMPY_DTYPES[device.dtype])
+        if target_value is not None:
+            value[:] = target_value
+        return value
+    return target_value if target_value is not None else INITIAL_VALUES[device.dtype]
+
+
+def split_timestamp(timestamp_ns=None):
+    """
+    Split a timestamp into the secondsPastEpoch and nanoseconds of an NT timeStamp.
+
+    :param timestamp_ns: Nanoseconds since the epoch, the current time if not given.
+    :return: A (secondsPastEpoch, nanoseconds) tuple.
+    """
+    if timestamp_ns is None:
+        timestamp_ns = time_ns()
+    return divmod(timestamp_ns, 1_000_000_000)
+
+
+def timestamp_fields(timestamp_ns=None):
+    """
+    Build an NT timeStamp structure from a single time_ns() reading.
+    """
+    seconds, nanoseconds = split_timestamp(timestamp_ns)
+    return {"secondsPastEpoch": seconds, "nanoseconds": nanoseconds, "userTag": 0}
+
+
+def set_timestamp(value, timestamp_ns=None):
+    """
+    Set the timeStamp of a Value in place, marking only its seconds and nanoseconds as changed.
+    """
+    seconds, nanoseconds = split_timestamp(timestamp_ns)
+    value["timeStamp.secondsPastEpoch"] = seconds
+    value["timeStamp.nanoseconds"] = nanoseconds
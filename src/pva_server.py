@@ -5,52 +5,255 @@ import threading
 import time
 
 from p4p import Value
-from p4p.server import Server
+from p4p.server import DynamicProvider, Server
 from p4p.server.thread import SharedPV
 
-from src.pv_types import DTYPE_MAP, INITIAL_VALUES
+from src.instrumentation import PUT
+from src.pv_types import get_pv_type, initial_value, set_timestamp, timestamp_fields
 
 logger = logging.getLogger(__name__)
 
 
 class EpicsPVAServer(threading.Thread):
-    def __init__(self, devices, gateway_config, target_config_path=None):
+    """
+    Serves the PVs of the simulated devices.
+
+    By default a SharedPV is created for every device at startup. With
+    lazy=True the server answers searches for all device names, but only
+    creates the SharedPV of a PV when a client first opens a channel to
+    it, and closes PVs again that had no client for `idle_timeout`
+    seconds. The callbacks set with set_lifecycle_callbacks() are called
+    when a PV is created and evicted, e.g. to start and stop simulating it.
+
+    The callbacks set with set_subscription_callbacks() are called when a
+    PV gets its first client and when its last client disconnects.
+    """
+
+    def __init__(
+        self,
+        devices,
+        gateway_config,
+        target_config_path=None,
+        update_targets=True,
+        instrumentation=None,
+        lazy=False,
+        idle_timeout=60.0,
+    ):
         super().__init__()
         self.devices = devices
         self.gateway_config = gateway_config
         self.target_config_path = target_config_path
+        self.update_targets = update_targets
+        self.instrumentation = instrumentation
+        self.lazy = lazy
+        self.idle_timeout = idle_timeout
         self.provider = None
         self.pvs = {}
+        self.updates = {}
+        self.handlers = {}
         self.context = None
+        self.ready = threading.Event()
+        self.on_materialise = None
+        self.on_evict = None
+        self.on_subscribe = None
+        self.on_unsubscribe = None
+        self.materialised = 0
+        self.evicted = 0
+        self._lazy_devices = {}
+        self._initial_config = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._reaper_stop = threading.Event()
 
     def run(self):
         config = self.read_config()
-
+        self.create_pvs(config)
+        if self.update_targets:
+            self.update_config(config)
+        self.serve()
+
+    def create_pvs(self, config, shared_pv_class=SharedPV):
+        """
+        Create a SharedPV for every device with a supported dtype, NTScalarArray
+        waveforms for devices with an array_size. In lazy mode only the
+        devices are collected and the PVs are created on demand.
+
+        :param config: The target config, used for the initial values.
+        :param shared_pv_class: The SharedPV implementation, e.g. the asyncio one.
+        """
         self.pvs = {}
-        for device in self.devices.values():
-            if device.dtype in DTYPE_MAP:
-                initial_structure = {
-                    "value": config[device.source_name]["target_value"]
-                    if config.get(device.source_name, {}).get("target_value", None) is not None
-                    else INITIAL_VALUES[device.dtype],
-                    "timeStamp": {
-                        "secondsPastEpoch": time.time(),
-                        "nanoseconds": time.time_ns() - int(time.time()) * 1e9,
-                        "userTag": 0,
-                    },
-                }
-                handler = self.PVHandler(device)
-                self.pvs[device.source_name] = SharedPV(
-                    initial=Value(DTYPE_MAP[device.dtype], initial_structure),
-                    handler=handler,
-                )
-                handler.set_pv(self.pvs[device.source_name])
-
-        self.update_config()
-
-        self.provider = {pv_name: self.pvs[pv_name] for pv_name in self.pvs}
+        self.updates = {}
+        self.handlers = {}
+        supported = [device for device in self.devices.values() if get_pv_type(device) is not None]
+        if self.lazy:
+            self._lazy_devices = {device.source_name: device for device in supported}
+            self._initial_config = config
+            return
+
+        for device in supported:
+            self._create_pv(device, config, shared_pv_class)
+
+    def _create_pv(self, device, config, shared_pv_class=SharedPV):
+        pv_type = get_pv_type(device)
+        initial_structure = {
+            "value": initial_value(
+                device, (config.get(device.source_name) or {}).get("target_value", None)
+            ),
+            "timeStamp": timestamp_fields(),
+        }
+        handler = self.PVHandler(device, self.instrumentation, self._connection_changed)
+        pv = shared_pv_class(initial=Value(pv_type, initial_structure), handler=handler)
+        handler.set_pv(pv)
+        # Reused for every post, only value and timeStamp are ever marked as changed
+        self.updates[device.source_name] = Value(pv_type, {})
+        self.handlers[device.source_name] = handler
+        self.pvs[device.source_name] = pv
+        return pv
+
+    def serve(self):
+        """
+        Start serving the created PVs, or all device names in lazy mode.
+        """
+        if self.lazy:
+            self.provider = DynamicProvider("pv-simulator", self.DynamicHandler(self))
+            self._reaper_stop.clear()
+            self._reaper = threading.Thread(target=self._reap, daemon=True)
+            self._reaper.start()
+            logger.info(
+                f"Serving {len(self._lazy_devices)} PVs on demand, evicting them after {self.idle_timeout} s without clients"
+            )
+        else:
+            self.provider = {pv_name: self.pvs[pv_name] for pv_name in self.pvs}
 
         self.context = Server(providers=[self.provider], conf=self.gateway_config)
+        self.ready.set()
+
+    def set_lifecycle_callbacks(self, on_materialise, on_evict):
+        """
+        Set the functions called with the PV name when a PV is created on
+        demand and when it is evicted. on_materialise is called right away
+        for the PVs that already exist.
+
+        The callbacks are called with the server's lock held, so the calls
+        for one PV never overlap. They must not call back into the server.
+        """
+        with self._lock:
+            self.on_materialise = on_materialise
+            self.on_evict = on_evict
+            for pv_name in self.pvs:
+                on_materialise(pv_name)
+
+    def set_subscription_callbacks(self, on_subscribe, on_unsubscribe):
+        """
+        Set the functions called with the PV name when a PV gets its first
+        client and loses its last one. One of them is called right away for
+        every PV with its current state, PVs not created yet in lazy mode
+        count as unsubscribed.
+
+        The callbacks are called with the server's lock held, like the
+        lifecycle callbacks.
+        """
+        with self._lock:
+            self.on_subscribe = on_subscribe
+            self.on_unsubscribe = on_unsubscribe
+            pv_names = self._lazy_devices if self.lazy else self.pvs
+            for pv_name in pv_names:
+                handler = self.handlers.get(pv_name)
+                if handler is not None and handler.connected:
+                    on_subscribe(pv_name)
+                else:
+                    on_unsubscribe(pv_name)
+
+    def _connection_changed(self, handler, connected):
+        with self._lock:
+            handler.connected = connected
+            if not connected:
+                handler.idle_since = time.monotonic()
+            # An evicted PV may still report its last disconnect
+            if self.handlers.get(handler.device.source_name) is not handler:
+                return
+            callback = self.on_subscribe if connected else self.on_unsubscribe
+            if callback is not None:
+                callback(handler.device.source_name)
+
+    def materialise(self, pv_name):
+        """
+        Return the SharedPV of a PV, creating it if it does not exist yet.
+
+        :return: The SharedPV, or None if there is no device of that name.
+        """
+        with self._lock:
+            pv = self.pvs.get(pv_name)
+            if pv is not None:
+                # A new channel to an idle PV, do not evict it before the client connects
+                self.handlers[pv_name].idle_since = time.monotonic()
+                return pv
+            device = self._lazy_devices.get(pv_name)
+            if device is None:
+                return None
+            pv = self._create_pv(device, self._initial_config)
+            self.materialised += 1
+            if self.on_materialise is not None:
+                self.on_materialise(pv_name)
+        logger.debug(f"Created PV {pv_name} on demand")
+        return pv
+
+    def evict_idle(self, now=None):
+        """
+        Close the PVs that have had no client for idle_timeout seconds.
+
+        :return: The names of the evicted PVs.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [
+                pv_name
+                for pv_name, handler in self.handlers.items()
+                if not handler.connected and now - handler.idle_since >= self.idle_timeout
+            ]
+            evicted = [self.pvs.pop(pv_name) for pv_name in idle]
+            for pv_name in idle:
+                del self.handlers[pv_name]
+                if self.on_evict is not None:
+                    self.on_evict(pv_name)
+            self.evicted += len(evicted)
+
+        for pv in evicted:
+            pv.close()
+        if idle:
+            logger.debug(f"Evicted {len(idle)} PVs after {self.idle_timeout} s without clients")
+        return idle
+
+    def _reap(self):
+        interval = min(max(self.idle_timeout / 4, 0.05), 5.0)
+        while not self._reaper_stop.wait(interval):
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.error(f"Failed to evict idle PVs: {e}")
+
+    def post(self, pv_name, value, timestamp_ns=None):
+        """
+        Post a new value straight to the SharedPV of a PV served by this
+        server, bypassing the client put round trip.
+
+        Only the value and timeStamp fields are marked as changed, so the
+        rest of the NTScalar structure is not copied.
+
+        :param pv_name: The name of the PV to update.
+        :param value: The new value, a NumPy array for waveform PVs.
+        :param timestamp_ns: Timestamp of the value in ns since the epoch, now if not given.
+        :return: True if the value was posted, False if the PV is not served (yet).
+        """
+        pv = self.pvs.get(pv_name)
+        if pv is None:
+            return False
+
+        update = self.updates[pv_name]
+        update["value"] = value
+        set_timestamp(update, timestamp_ns)
+        pv.post(update)
+        return True
 
     def get_context(self):
         return self.context
@@ -69,50 +272,98 @@ class EpicsPVAServer(threading.Thread):
             config = json.load(file)
         return config
 
-    def update_config(self):
+    def update_config(self, config=None):
+        """
+        Add entries for PVs that are missing from the target config file.
+        The file is only rewritten if something was added.
+
+        :param config: The already parsed target config, read from the file if not given.
+        """
         if self.target_config_path is None:
             logger.warning("No target config path provided, skipping update")
-
-        if not os.path.exists(self.target_config_path):
-            logger.warning(f"Target config path {self.target_config_path} does not exist, creating empty file")
-            with open(self.target_config_path, "w") as file:
-                json.dump({}, file, indent=2)
-
-        with open(self.target_config_path, "r") as file:
-            config = json.load(file)
-
-        for pv_name in self.pvs.keys():
-            if pv_name not in config:
-                config[pv_name] = {
-                    "target_value": None,
-                    "std_dev": None,
-                }
+            return
+
+        if config is None:
+            config = self.read_config()
+
+        missing = [
+            device.source_name
+            for device in self.devices.values()
+            if get_pv_type(device) is not None and device.source_name not in config
+        ]
+        if not missing:
+            return
+
+        for pv_name in missing:
+            config[pv_name] = {
+                "target_value": None,
+                "std_dev": None,
+            }
 
         with open(self.target_config_path, "w") as file:
             json.dump(config, file, indent=2)
 
     def stop(self):
+        self._reaper_stop.set()
+        if self._reaper is not None:
+            self._reaper.join()
+            self._reaper = None
         if self.context:
             self.context.stop()
             self.context = None
 
+    class DynamicHandler:
+        """
+        Handler of the DynamicProvider in lazy mode.
+        """
+
+        def __init__(self, server):
+            self.server = server
+
+        def testChannel(self, pv_name):
+            return pv_name in self.server._lazy_devices
+
+        def makeChannel(self, pv_name, peer):
+            return self.server.materialise(pv_name)
+
     class PVHandler:
-        def __init__(self, device):
+        def __init__(self, device, instrumentation=None, connection_changed=None):
+            """
+            :param connection_changed: Called with the handler and True on the first client connect, False on the last disconnect.
+            """
             self.device = device
+            self.instrumentation = instrumentation
+            self.connection_changed = connection_changed
             self.pv = None
+            self.connected = False
+            self.idle_since = time.monotonic()
 
         def set_pv(self, pv):
             self.pv = pv
 
+        def onFirstConnect(self, pv):
+            if self.connection_changed is not None:
+                self.connection_changed(self, True)
+            else:
+                self.connected = True
+
+        def onLastDisconnect(self, pv):
+            if self.connection_changed is not None:
+                self.connection_changed(self, False)
+            else:
+                self.connected = False
+                self.idle_since = time.monotonic()
+
         def put(self, pv_name, op):
+            started_ns = time.monotonic_ns()
             new_value = op.value()
-            new_value["timeStamp"] = {
-                "secondsPastEpoch": time.time(),
-                "nanoseconds": time.time_ns() - int(time.time()) * 1e9,
-                "userTag": 0,
-            }
+            set_timestamp(new_value)
             self.pv.post(new_value)
             op.done()
+            if self.instrumentation is not None:
+                self.instrumentation.record(
+                    PUT, "EpicsPVAServer", self.device.source_name, time.monotonic_ns() - started_ns
+                )
 
     def get_context(self):
         return self.context
@@ -0,0 +1,151 @@
+import numpy as np
+
+# The highest update rate a device can be configured with, in Hz
+MAX_RATE = 5000.0
+
+
+class RateProfile:
+    """
+    An update rate that changes over time.
+
+    Subclasses define rate(t), the rate in Hz at `t` seconds after the
+    profile started. Updates are either evenly spaced at the current rate
+    or, with poisson=True, Poisson arrivals with exponentially distributed
+    intervals around it.
+    """
+
+    def __init__(self, poisson=False, rng=None):
+        self.poisson = poisson
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def rate(self, t):
+        raise NotImplementedError("Subclasses must implement rate method")
+
+    def next_interval(self, t):
+        """
+        Return the seconds from an update at `t` to the next one.
+        """
+        rate = min(self.rate(t), MAX_RATE)
+        if rate <= 0:
+            return self._until_active(t)
+        if self.poisson:
+            return max(self.rng.exponential(1.0 / rate), 1.0 / MAX_RATE)
+        return 1.0 / rate
+
+    def _until_active(self, t):
+        raise ValueError(f"{type(self).__name__} has no positive rate at t={t}")
+
+
+class ConstantRate(RateProfile):
+    def __init__(self, rate, **kwargs):
+        super().__init__(**kwargs)
+        if rate <= 0:
+            raise ValueError("A constant rate must be positive")
+        self.constant_rate = rate
+
+    def rate(self, t):
+        return self.constant_rate
+
+
+class RampRate(RateProfile):
+    """
+    Ramps linearly from `start_rate` to `end_rate` over `duration` seconds,
+    then stays at `end_rate`, or starts over if `repeat` is set. While the
+    rate is not positive there are no updates.
+    """
+
+    def __init__(self, start_rate, end_rate, duration, repeat=False, **kwargs):
+        super().__init__(**kwargs)
+        if duration <= 0:
+            raise ValueError("The duration of a ramp must be positive")
+        if max(start_rate, end_rate) <= 0:
+            raise ValueError("A ramp needs a positive start or end rate")
+        if end_rate <= 0 and not repeat:
+            raise ValueError("A ramp that does not repeat needs a positive end rate, it would stop updating")
+        self.start_rate = start_rate
+        self.end_rate = end_rate
+        self.duration = duration
+        self.repeat = repeat
+
+    def rate(self, t):
+        if self.repeat:
+            t = t % self.duration
+        fraction = min(t / self.duration, 1.0)
+        return self.start_rate + (self.end_rate - self.start_rate) * fraction
+
+    def next_interval(self, t):
+        interval = super().next_interval(t)
+        if self.repeat:
+            # The rate jumps back to start_rate at the start of the next ramp
+            interval = min(interval, self.duration - t % self.duration)
+        return interval
+
+    def _until_active(self, t):
+        position = t % self.duration if self.repeat else min(t, self.duration)
+        if self.start_rate <= 0:
+            # Rising through 0, the first update is when one update is due at the rising rate
+            slope = (self.end_rate - self.start_rate) / self.duration
+            crossing = -self.start_rate / slope
+            return max(crossing - position, 0.0) + np.sqrt(2.0 / slope)
+        # Falling to 0 and repeating, the next update is at the start of the next ramp
+        return self.duration - position
+
+
+class BurstRate(RateProfile):
+    """
+    Runs at `burst_rate` for the first `burst_duration` seconds of every
+    `burst_interval`, and at `base_rate` (which may be 0) in between.
+    """
+
+    def __init__(self, base_rate, burst_rate, burst_duration, burst_interval, **kwargs):
+        super().__init__(**kwargs)
+        if not 0 < burst_duration <= burst_interval:
+            raise ValueError("A burst must be positive and not longer than the burst interval")
+        if burst_rate <= 0:
+            raise ValueError("The burst rate must be positive")
+        self.base_rate = base_rate
+        self.burst_rate = burst_rate
+        self.burst_duration = burst_duration
+        self.burst_interval = burst_interval
+
+    def rate(self, t):
+        return self.burst_rate if t % self.burst_interval < self.burst_duration else self.base_rate
+
+    def _until_active(self, t):
+        return self.burst_interval - t % self.burst_interval
+
+
+PROFILES = {
+    "constant": ConstantRate,
+    "ramp": RampRate,
+    "burst": BurstRate,
+    "poisson": ConstantRate,
+}
+
+
+def profile_from_config(config, rng=None):
+    """
+    Create a RateProfile from the "rate_profile" entry of a PV's target config, e.g.
+
+        {"type": "ramp", "start_rate": 10, "end_rate": 2000, "duration": 60}
+        {"type": "burst", "base_rate": 1, "burst_rate": 1000, "burst_duration": 2, "burst_interval": 30}
+        {"type": "poisson", "rate": 500}
+
+    Any profile can have Poisson arrivals with "poisson": true.
+
+    :return: The profile, or None if the config has no rate_profile.
+    """
+    profile_config = config.get("rate_profile", None)
+    if profile_config is None:
+        return None
+
+    profile_config = dict(profile_config)
+    profile_type = profile_config.pop("type", "constant")
+    if profile_type not in PROFILES:
+        raise ValueError(f"Unknown rate profile type {profile_type}, expected one of {list(PROFILES)}")
+    if profile_type == "poisson":
+        profile_config["poisson"] = True
+    try:
+        return PROFILES[profile_type](rng=rng, **profile_config)
+    except TypeError as e:
+        raise ValueError(f"Invalid {profile_type} rate profile {profile_config}: {e}")
@@ -0,0 +1,211 @@
+import logging
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RECORDING_MAGIC = b"PVSR"
+RECORDING_VERSION = 1
+
+# magic, version, record size, creation time in ns since the epoch
+_HEADER = struct.Struct("<4sHHq")
+RECORD_DTYPE = np.dtype([("pv", "<u4"), ("timestamp_ns", "<i8"), ("value", "<f8")])
+_REPLAY_CHUNK = 1 << 16
+# Replay does not sleep for less than this, it is within the accuracy of time.sleep anyway
+_MIN_SLEEP = 0.0005
+
+
+def names_path(path):
+    """
+    The sidecar file with the PV names of a recording, one per line in the order of their index.
+    """
+    return f"{path}.names"
+
+
+class Recorder:
+    """
+    Writes the values of simulated PVs to an append-only binary log.
+
+    The log is a short header followed by fixed-size records of the PV
+    index, the timestamp in ns since the epoch and the value as a double.
+    The PV names are written to a sidecar file when a PV is first
+    registered. Records are collected in a buffer and written in blocks,
+    so recording an update is an array assignment under a lock.
+    """
+
+    def __init__(self, path, buffer_records=4096):
+        self.path = path
+        self.names = []
+        self._indices = {}
+        self._buffer = np.empty(buffer_records, dtype=RECORD_DTYPE)
+        self._size = 0
+        self.records = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, RECORD_DTYPE.itemsize, time.time_ns()))
+        self._names_file = open(names_path(path), "w")
+
+    def pv_index(self, pv_name):
+        """
+        Register a PV, if it is not yet, and return its index for record().
+        """
+        with self._lock:
+            index = self._indices.get(pv_name)
+            if index is None:
+                index = self._indices[pv_name] = len(self.names)
+                self.names.append(pv_name)
+                self._names_file.write(pv_name + "\n")
+                self._names_file.flush()
+            return index
+
+    def record(self, pv_index, timestamp_ns, value):
+        with self._lock:
+            self._buffer[self._size] = (pv_index, timestamp_ns, value)
+            self._size += 1
+            if self._size == len(self._buffer):
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush()
+            self._file.close()
+            self._names_file.close()
+        logger.info(f"Recorded {self.records} updates of {len(self.names)} PVs to {self.path}")
+
+    def _flush(self):
+        if self._size:
+            self._file.write(self._buffer[: self._size].tobytes())
+            self.records += self._size
+            self._size = 0
+
+
+class Recording:
+    """
+    A recording written by a Recorder, memory-mapped for reading.
+
+    A trailing partial record, e.g. of a simulator that was killed while
+    writing, is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            header = file.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError(f"{path} is not a PV recording, it is too short")
+        magic, version, record_size, self.created_ns = _HEADER.unpack(header)
+        if magic != RECORDING_MAGIC or version != RECORDING_VERSION or record_size != RECORD_DTYPE.itemsize:
+            raise ValueError(f"{path} is not a version {RECORDING_VERSION} PV recording")
+
+        with open(names_path(path), "r") as file:
+            self.names = file.read().splitlines()
+
+        count = (os.path.getsize(path) - _HEADER.size) // RECORD_DTYPE.itemsize
+        if count:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=_HEADER.size, shape=(count,))
+        else:
+            self.records = np.empty(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    def duration_ns(self):
+        if len(self.records) == 0:
+            return 0
+        return int(self.records["timestamp_ns"][-1] - self.records["timestamp_ns"][0])
+
+
+class Replayer:
+    """
+    Publishes the updates of a Recording again, with the same spacing as
+    recorded, scaled by `speed`, or as fast as possible.
+
+    The targets map PV names to functions publish(value, timestamp_ns)
+    that return True if the value was published, usually the publish
+    method of the threads that simulate the PV. Updates of PVs without a
+    target are skipped.
+    """
+
+    def __init__(self, recording, targets, speed=1.0, original_timestamps=False):
+        """
+        :param recording: The Recording to replay.
+        :param targets: Dict of PV name to a publish function, or a list of them.
+        :param speed: Replay speed relative to the recording, None or 0 for as fast as possible.
+        :param original_timestamps: Publish with the recorded timestamps instead of the time of the replay.
+        """
+        self.recording = recording
+        self.speed = speed or None
+        self.original_timestamps = original_timestamps
+        self.publishers = []
+        for name in recording.names:
+            publishers = targets.get(name, ())
+            self.publishers.append(tuple(publishers) if isinstance(publishers, (list, tuple)) else (publishers,))
+        self.published = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def run(self, stop_event=None):
+        """
+        Replay the whole recording, or until `stop_event` is set.
+
+        :return: The number of updates published.
+        """
+        records = self.recording.records
+        if len(records) == 0:
+            return 0
+        first_ns = int(records["timestamp_ns"][0])
+        started = time.monotonic()
+        logger.info(
+            f"Replaying {len(records)} updates of {len(self.recording.names)} PVs from {self.recording.path} "
+            f"at {f'{self.speed}x speed' if self.speed else 'maximum speed'}"
+        )
+
+        for start in range(0, len(records), _REPLAY_CHUNK):
+            if stop_event is not None and stop_event.is_set():
+                break
+            chunk = records[start : start + _REPLAY_CHUNK]
+            for pv, timestamp_ns, value in zip(
+                chunk["pv"].tolist(), chunk["timestamp_ns"].tolist(), chunk["value"].tolist()
+            ):
+                if self.speed is not None:
+                    delay = started + (timestamp_ns - first_ns) * 1e-9 / self.speed - time.monotonic()
+                    if delay > _MIN_SLEEP:
+                        if stop_event is not None:
+                            if stop_event.wait(delay):
+                                break
+                        else:
+                            time.sleep(delay)
+                self._publish(pv, value, timestamp_ns if self.original_timestamps else None)
+
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"Replayed {self.published} updates in {elapsed:.3f} s ({self.published / max(elapsed, 1e-9):.0f} updates/s), "
+            f"{self.skipped} skipped, {self.errors} failed"
+        )
+        return self.published
+
+    def _publish(self, pv, value, timestamp_ns):
+        publishers = self.publishers[pv] if pv < len(self.publishers) else ()
+        if not publishers:
+            self.skipped += 1
+            return
+        for publish in publishers:
+            try:
+                if publish(value, timestamp_ns):
+                    self.published += 1
+                else:
+                    self.errors += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Failed to replay update of {self.recording.names[pv]}: {e}")
@@ -1,117 +1,620 @@
 import logging
 import threading
 import time
+from functools import partial
 
 import numpy as np
 
+from src.instrumentation import DELIVERY, END_TO_END, GENERATE, PUBLISH, TICK_LAG
+from src.pv_types import ARRAY_NUMPY_DTYPES, NUMERIC_DTYPES
+from src.rate_profiles import MAX_RATE, profile_from_config
+from src.signal_models import model_from_config
+from src.simulation_core import ChopperTimestamps, WaveformBuffer
+
 logger = logging.getLogger(__name__)
 
+CATCH_UP = "catch_up"
+SKIP = "skip"
+MISSED_TICK_POLICIES = (CATCH_UP, SKIP)
+
+# A tick starting later than this fraction of the period after its deadline is counted as late
+LATE_TICK_TOLERANCE = 0.1
+# Catch-up never runs more than this many missed ticks back to back, older ones are skipped
+MAX_CATCH_UP_TICKS = 10
+
+# Shortest update period, matching the highest rate a rate profile can reach
+MIN_UPDATE_PERIOD = 1.0 / MAX_RATE
+
+# Choppers rotate at the ESS source frequency unless configured otherwise
+DEFAULT_CHOPPER_FREQUENCY = 14.0
+DEFAULT_CHOPPER_JITTER_NS = 1000.0
+
 
 class RunThread:
-    def __init__(self, update_period=1., *args, **kwargs):
+    # A simulator runs one of these per PV, slots keep them small
+    __slots__ = (
+        "update_period",
+        "scheduler",
+        "fixed_rate",
+        "rate_profile",
+        "rate_rng",
+        "_rate_profile_started",
+        "_current_period",
+        "missed_tick_policy",
+        "late_ticks",
+        "skipped_ticks",
+        "updates",
+        "errors",
+        "thread",
+        "suspended",
+        "_running",
+        "_resume_event",
+        "_tick_lock",
+        "_schedule_generation",
+        "instrumentation",
+        "instrument_labels",
+        "_tick_started_ns",
+    )
+
+    def __init__(
+        self,
+        update_period=1.,
+        scheduler=None,
+        fixed_rate=False,
+        missed_tick_policy=SKIP,
+        instrumentation=None,
+        *args,
+        **kwargs,
+    ):
         self.update_period = update_period
+        self.scheduler = scheduler
+        self.fixed_rate = fixed_rate
+        self.rate_profile = None
+        # Made by _spawn_rate_rng() once a rate profile is configured
+        self.rate_rng = None
+        self._rate_profile_started = None
+        self._current_period = update_period
+        self.missed_tick_policy = None
+        self.set_missed_tick_policy(missed_tick_policy)
+        self.late_ticks = 0
+        self.skipped_ticks = 0
+        # Only written from _inner_run under the tick lock, read by the metrics
+        self.updates = 0
+        self.errors = 0
         self.thread = None
-        self._run_event = threading.Event()
+        self.suspended = False
+        # A plain flag, nothing waits for it and an Event per PV adds up
+        self._running = False
+        # Wakes up a suspended own thread, set unless suspended. Not needed with a scheduler.
+        self._resume_event = None
+        self._tick_lock = threading.Lock()
+        self._schedule_generation = 0
+        self.instrumentation = instrumentation
+        # Labels of the recorded timings, subclasses set the PV name
+        self.instrument_labels = (type(self).__name__, None)
+        self._tick_started_ns = None
 
     def start(self):
-        self._run_event.set()
+        """
+        Start updating, or only mark the thread as running if it is suspended.
+        """
+        self._running = True
+        if self.scheduler is not None:
+            if not self.suspended:
+                self.scheduler.add(self)
+            return
+        if self._resume_event is None:
+            self._resume_event = threading.Event()
+        if self.suspended:
+            self._resume_event.clear()
+        else:
+            self._resume_event.set()
         self.thread = threading.Thread(target=self._run)
         self.thread.start()
 
     def stop(self):
-        self._run_event.clear()
+        self._running = False
+        if self._resume_event is not None:
+            self._resume_event.set()
+        if self.scheduler is not None:
+            self.scheduler.remove(self)
+            # Wait for a tick that is already running on a worker to finish
+            with self._tick_lock:
+                pass
         if self.thread is not None:
             if self.thread.is_alive():
                 self.thread.join()
                 self.thread = None
 
+    def suspend(self):
+        """
+        Stop generating updates until resume(), e.g. while nobody watches the
+        PV. The thread stays alive. Can also be called before start().
+        """
+        if self.suspended:
+            return
+        self.suspended = True
+        if self._resume_event is not None:
+            self._resume_event.clear()
+        if self.scheduler is not None and self._running:
+            self.scheduler.remove(self)
+
+    def resume(self):
+        """
+        Continue generating updates after suspend(), starting with one right away.
+        """
+        if not self.suspended:
+            return
+        self.suspended = False
+        if not self._running:
+            return
+        self._tick()
+        if self.scheduler is not None:
+            now = time.monotonic()
+            self.scheduler.add(self, delay=self._next_due(now, now) - now)
+        if self._resume_event is not None:
+            self._resume_event.set()
+
     def set_update_period(self, update_period):
-        if update_period < 0.01:
+        if update_period < MIN_UPDATE_PERIOD:
             logger.warning(f"Received update period: {update_period}")
-            logger.warning("Update period is too low, setting to 0.01")
-            update_period = 0.01
+            logger.warning(f"Update period is too low, setting to {MIN_UPDATE_PERIOD}")
+            update_period = MIN_UPDATE_PERIOD
         logger.debug(f"Setting update period to {update_period}")
         self.update_period = update_period
+        self._current_period = update_period
+
+    def set_rate_profile(self, rate_profile):
+        """
+        Drive the updates from a RateProfile instead of the fixed update
+        period, or go back to the update period with None. Ticks of a rate
+        profile are always scheduled on absolute deadlines, like fixed rate.
+        """
+        self.rate_profile = rate_profile
+        self._rate_profile_started = None
+
+    def set_fixed_rate(self, fixed_rate):
+        logger.debug(f"Setting fixed rate to {fixed_rate}")
+        self.fixed_rate = fixed_rate
+
+    def set_missed_tick_policy(self, missed_tick_policy):
+        if missed_tick_policy not in MISSED_TICK_POLICIES:
+            raise ValueError(
+                f"Unknown missed tick policy {missed_tick_policy}, use {MISSED_TICK_POLICIES}"
+            )
+        self.missed_tick_policy = missed_tick_policy
+
+    def set_timing_config(self, config):
+        """
+        Apply the timing related entries of a target config. An invalid
+        rate profile or missed tick policy raises ValueError before anything
+        is changed.
+        """
+        if self.rate_rng is None and config.get("rate_profile") is not None:
+            self.rate_rng = self._spawn_rate_rng()
+        rate_profile = profile_from_config(config, rng=self.rate_rng)
+        missed_tick_policy = config.get("missed_tick_policy", None)
+        if missed_tick_policy is not None:
+            self.set_missed_tick_policy(missed_tick_policy)
+
+        update_period = config.get("update_period", None)
+        if update_period is not None:
+            logger.info(f"Setting custom update period to {update_period}")
+            self.set_update_period(update_period)
+
+        fixed_rate = config.get("fixed_rate", None)
+        if fixed_rate is not None:
+            self.set_fixed_rate(fixed_rate)
+
+        self.set_rate_profile(rate_profile)
+
+    def _spawn_rate_rng(self):
+        """
+        Return the random generator for rate profiles, None for a fresh one per profile.
+        """
+        return None
 
     def is_alive(self):
+        if self.scheduler is not None:
+            return self._running and self.scheduler.is_running()
         return self.thread.is_alive() if self.thread is not None else False
 
     def _run(self):
-        while self._run_event.is_set():
-            self._inner_run()
-            time.sleep(self.update_period)
+        due = time.monotonic()
+        while self._running:
+            if self.suspended:
+                self._resume_event.wait()
+                if not self._running:
+                    break
+                # resume() already ran a tick
+                now = due = time.monotonic()
+            else:
+                self._tick(due)
+                now = time.monotonic()
+            try:
+                due = self._next_due(due, now)
+            except Exception as e:
+                logger.error(f"Stopping updates of {self.instrument_labels[1] or type(self).__name__}, its next tick could not be scheduled: {e}")
+                return False
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
         return True
 
+    def _tick(self, due=None):
+        """
+        Run a single update, either from the own thread or from a Scheduler worker.
+
+        :param due: The monotonic time the tick was due, used to count late ticks.
+        :return: False if the thread has been stopped and the tick did not run.
+        """
+        with self._tick_lock:
+            if not self._running:
+                return False
+            if (
+                self.fixed_rate
+                and due is not None
+                and time.monotonic() - due > LATE_TICK_TOLERANCE * self._current_period
+            ):
+                self.late_ticks += 1
+            if self.instrumentation is not None:
+                self._tick_started_ns = time.monotonic_ns()
+                if due is not None:
+                    self._record(TICK_LAG, self._tick_started_ns - due * 1e9)
+            self._inner_run()
+            return True
+
+    def _record(self, stage, value_ns):
+        self.instrumentation.record(stage, *self.instrument_labels, value_ns)
+
+    def _next_due(self, due, now):
+        """
+        Return the monotonic time at which the next tick is due.
+
+        In the default fixed-delay mode the next tick is one period after the
+        current one finished. In fixed-rate mode ticks are scheduled on a grid
+        of absolute deadlines, so the work time does not add to the period.
+        Deadlines already missed are either run back to back (catch-up) or
+        skipped. With a rate profile the period is taken from the profile at
+        the time of the tick.
+
+        :param due: The time the tick that just ran was due.
+        :param now: The time the tick finished.
+        """
+        if self.rate_profile is not None:
+            if self._rate_profile_started is None:
+                self._rate_profile_started = due
+            period = self.rate_profile.next_interval(due - self._rate_profile_started)
+            self._current_period = period
+        elif not self.fixed_rate:
+            return now + self.update_period
+        else:
+            period = self.update_period
+
+        next_due = due + period
+        if next_due >= now:
+            return next_due
+
+        missed = int((now - next_due) // period) + 1
+        if self.missed_tick_policy == CATCH_UP:
+            skipped = max(missed - MAX_CATCH_UP_TICKS, 0)
+        else:
+            skipped = missed
+        self.skipped_ticks += skipped
+        return next_due + skipped * period
+
     def _inner_run(self):
         raise NotImplementedError("Subclasses must implement _inner_run method")
 
 
-class KafkaThreadF144(RunThread):
-    def __init__(self, device, producer, config=None, update_period=1):
-        super().__init__(update_period=update_period)
+class SimulatedThreadF144(RunThread):
+    """
+    Base class for threads simulating an f144 device as a target value plus
+    gaussian noise.
+
+    When a SimulationCore is given a numeric device registers a slot in it
+    and the noise comes from the core's pre-drawn blocks, otherwise it is
+    drawn per update. String and bool devices do not use the core and
+    publish their target value as configured. With a core the target value can also be replaced by a
+    SignalModel, configured with the "model" entry of the target config.
+    Devices with an array_size are simulated as waveforms, generated into
+    a preallocated buffer.
+
+    With a Recorder every published scalar value is also written to a
+    recording, which can be replayed through publish() later.
+    """
+
+    __slots__ = (
+        "device",
+        "config",
+        "core",
+        "slot",
+        "waveform",
+        "value",
+        "std_dev",
+        "model",
+        "recorder",
+        "_recorder_index",
+    )
+
+    def __init__(self, device, config=None, update_period=1, scheduler=None, core=None, recorder=None, **kwargs):
+        super().__init__(update_period=update_period, scheduler=scheduler, **kwargs)
         self.device = device
         self.config = config
-        self.producer = producer
+        # The core only holds floats, a string or bool target value can not be simulated in it
+        self.core = core if device.dtype in NUMERIC_DTYPES else None
+        self.instrument_labels = (type(self).__name__, device.source_name)
+        self.slot = None
+        self.waveform = None
         self.value = None
         self.std_dev = None
+        self.model = None
+        self.recorder = None
+        self._recorder_index = None
+        if recorder is not None:
+            self.set_recorder(recorder)
         if config is not None:
             self.set_config(config)
 
+    def set_recorder(self, recorder):
+        if self.device.array_size:
+            logger.warning(f"Not recording waveform PV {self.device.source_name}, only scalars can be recorded")
+            return
+        self.recorder = recorder
+        self._recorder_index = recorder.pv_index(self.device.source_name)
+
     def set_config(self, config):
+        """
+        Apply a target config. An invalid config raises ValueError and leaves the thread unchanged.
+        """
+        model = model_from_config(config)
+        # Models advance by the update period, so it is set first
+        self.set_timing_config(config)
         self.config = config
         self.value = config.get("target_value", None)
         self.std_dev = config.get("std_dev", None)
+        self.model = model
+        if self.model is not None and (self.device.array_size or self.core is None):
+            logger.warning(
+                f"Ignoring signal model of {self.device.source_name}, "
+                f"models are only supported for numeric scalars with a SimulationCore"
+            )
+            self.model = None
+        if self.device.array_size:
+            if self.waveform is None:
+                self.waveform = WaveformBuffer(
+                    self.device.array_size,
+                    dtype=ARRAY_NUMPY_DTYPES.get(self.device.dtype, np.float64),
+                    rng=self.core.rng if self.core is not None else None,
+                )
+            if isinstance(self.value, list):
+                self.value = np.asarray(self.value, dtype=np.float64)
+        elif self.core is not None:
+            if self.slot is None:
+                self.slot = self.core.add(self.value, self.std_dev, self.model, self.update_period)
+            else:
+                self.core.set(self.slot, self.value, self.std_dev, self.model, self.update_period)
 
-    def _inner_run(self):
+    def _spawn_rate_rng(self):
+        return self.core.spawn_rng() if self.core is not None else None
+
+    def _next_value(self):
+        if self.waveform is not None:
+            return self.waveform.generate(self.value, self.std_dev)
+        if self.core is not None:
+            return self.core.sample(self.slot)
         if self.std_dev is None:
-            value = self.value
-        else:
-            value = self.value + np.random.normal(0, self.std_dev)
-        f144_msg = self.device.gen_message(value)
-        self.producer.produce(self.device.topic, f144_msg)
-        self.producer.flush()
-        logger.debug(
-            f"Produced message with value: {value} to topic: {self.device.topic}"
+            return self.value
+        return self.value + np.random.normal(0, self.std_dev)
+
+    def publish(self, value, timestamp_ns=None):
+        """
+        Publish one value of the device, and record it when recording.
+
+        :param value: The value.
+        :param timestamp_ns: Timestamp of the value in ns since the epoch, now if not given.
+        :return: True if the value was published.
+        """
+        raise NotImplementedError("Subclasses must implement publish method")
+
+    def _record_value(self, value, timestamp_ns):
+        self.recorder.record(self._recorder_index, timestamp_ns, value)
+
+
+class KafkaThreadF144(SimulatedThreadF144):
+    """
+    Simulates an f144 device by producing messages to Kafka.
+
+    The producer is usually a BatchProducer shared by all devices. Messages
+    are not flushed per update, the owner of the producer flushes it on
+    shutdown.
+    """
+
+    __slots__ = ("producer",)
+
+    def __init__(self, device, producer, config=None, update_period=1, scheduler=None, **kwargs):
+        self.producer = producer
+        super().__init__(
+            device, config=config, update_period=update_period, scheduler=scheduler, **kwargs
         )
 
+    def _inner_run(self):
+        if self.value is None and self.model is None:
+            logger.debug(
+                f"Skipping {self.device.source_name} message, no target value in config"
+            )
+            return
+
+        value = self._next_value()
+        if self.instrumentation is None:
+            self.publish(value)
+            return
+
+        generated_ns = time.monotonic_ns()
+        self._record(GENERATE, generated_ns - self._tick_started_ns)
+        if self.publish(value, on_delivery=partial(self._on_delivery, self._tick_started_ns)):
+            self._record(PUBLISH, time.monotonic_ns() - generated_ns)
+
+    def publish(self, value, timestamp_ns=None, on_delivery=None):
+        """
+        :param on_delivery: Called with the time the message was produced, the error and the message on delivery.
+        """
+        if timestamp_ns is None and self.recorder is not None:
+            timestamp_ns = time.time_ns()
+        f144_msg = self.device.gen_message(value, timestamp_ns)
+        produce_kwargs = {} if on_delivery is None else {"callback": partial(on_delivery, time.monotonic_ns())}
+        try:
+            self.producer.produce(self.device.topic, f144_msg, **produce_kwargs)
+            self.updates += 1
+            logger.debug(
+                f"Produced message with value: {value} to topic: {self.device.topic}"
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.error(
+                f"Failed to produce message for {self.device.source_name} to topic {self.device.topic}: {e}"
+            )
+            return False
+        if self.recorder is not None:
+            self._record_value(value, timestamp_ns)
+        return True
+
+    def _on_delivery(self, tick_started_ns, produced_ns, err, msg):
+        if err is not None:
+            return
+        delivered_ns = time.monotonic_ns()
+        self._record(DELIVERY, delivered_ns - produced_ns)
+        self._record(END_TO_END, delivered_ns - tick_started_ns)
+
+
+class KafkaThreadTDCT(RunThread):
+    """
+    Simulates a chopper by producing tdct messages with its top dead centre
+    timestamps to Kafka.
+
+    Each update publishes all timestamps that became due since the last
+    one in a single message, so the update period sets the batch size
+    (14 timestamps per message at 14 Hz and the default 1 s period). The
+    target config can set "frequency" (Hz) and "jitter_ns" per chopper.
+    """
 
-class EpicsThreadF144(RunThread):
-    def __init__(self, device, context, config=None, update_period=1):
-        super().__init__(update_period=update_period)
+    __slots__ = ("device", "producer", "config", "timestamps")
+
+    def __init__(self, device, producer, config=None, update_period=1, scheduler=None, rng=None, **kwargs):
+        super().__init__(update_period=update_period, scheduler=scheduler, **kwargs)
         self.device = device
-        self.context = context
-        self.config = config
-        self.pv_name = device.source_name
-        self.value = None
-        self.std_dev = None
+        self.producer = producer
+        self.config = None
+        self.instrument_labels = (type(self).__name__, device.source_name)
+        self.timestamps = ChopperTimestamps(
+            frequency=DEFAULT_CHOPPER_FREQUENCY, jitter_ns=DEFAULT_CHOPPER_JITTER_NS, rng=rng
+        )
         if config is not None:
             self.set_config(config)
 
     def set_config(self, config):
+        """
+        Apply a target config. An invalid config raises ValueError and leaves the thread unchanged.
+        """
+        frequency = config.get("frequency", None)
+        jitter_ns = config.get("jitter_ns", None)
+        ChopperTimestamps.validate(frequency, jitter_ns)
+        self.set_timing_config(config)
         self.config = config
-        self.value = config.get("target_value", None)
-        self.std_dev = config.get("std_dev", None)
+        if frequency is not None and frequency != self.timestamps.frequency:
+            self.timestamps.set_frequency(frequency)
+        if jitter_ns is not None:
+            self.timestamps.jitter_ns = jitter_ns
 
-        update_period = config.get("update_period", None)
-        if update_period is not None:
-            logger.info(f"Setting custom update period to {update_period}")
-            self.set_update_period(update_period)
+    def _inner_run(self):
+        timestamps = self.timestamps.until()
+        if len(timestamps) == 0:
+            return
+
+        tdct_msg = self.device.gen_message(timestamps)
+        try:
+            self.producer.produce(self.device.topic, tdct_msg)
+            self.updates += 1
+            logger.debug(
+                f"Produced {len(timestamps)} timestamps for {self.device.source_name} to topic: {self.device.topic}"
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.error(
+                f"Failed to produce message for {self.device.source_name} to topic {self.device.topic}: {e}"
+            )
+
+
+class EpicsThreadF144(SimulatedThreadF144):
+    """
+    Simulates an f144 device as an EPICS PV.
+
+    Values are either written through a p4p client `context` (a put that
+    goes through the network back into the serving process) or, when a
+    `server` is given, posted directly to the SharedPV of an in-process
+    EpicsPVAServer.
+    """
+
+    __slots__ = ("context", "server", "pv_name")
+
+    def __init__(
+        self,
+        device,
+        context=None,
+        config=None,
+        update_period=1,
+        scheduler=None,
+        server=None,
+        **kwargs,
+    ):
+        if context is None and server is None:
+            raise ValueError("Either a context or a server is required")
+        self.context = context
+        self.server = server
+        self.pv_name = device.source_name
+        super().__init__(
+            device, config=config, update_period=update_period, scheduler=scheduler, **kwargs
+        )
 
     def _inner_run(self):
-        if self.value is None:
+        if self.value is None and self.model is None:
             logger.debug(f"Skipping PV {self.pv_name} update, no target value in config")
             return
 
-        if self.std_dev is None:
-            value = self.value
-        else:
-            value = self.value + np.random.normal(0, self.std_dev)
+        value = self._next_value()
+        if self.instrumentation is None:
+            self.publish(value)
+            return
+
+        generated_ns = time.monotonic_ns()
+        self._record(GENERATE, generated_ns - self._tick_started_ns)
+        if self.publish(value):
+            published_ns = time.monotonic_ns()
+            self._record(PUBLISH, published_ns - generated_ns)
+            self._record(END_TO_END, published_ns - self._tick_started_ns)
 
+    def publish(self, value, timestamp_ns=None):
+        """
+        With a client context the value is put and the server sets the timestamp.
+        """
+        if timestamp_ns is None and self.recorder is not None:
+            timestamp_ns = time.time_ns()
         try:
-            self.context.put(self.pv_name, value)
+            if self.server is not None:
+                if not self.server.post(self.pv_name, value, timestamp_ns):
+                    logger.debug(f"Skipping PV {self.pv_name} update, PV not served yet")
+                    return False
+            else:
+                self.context.put(self.pv_name, value)
+            self.updates += 1
             logger.debug(f"Updated PV {self.pv_name} with value: {value}")
         except Exception as e:
+            self.errors += 1
             logger.error(f"Failed to update PV {self.pv_name} with value {value}: {e}")
+            return False
+        if self.recorder is not None:
+            self._record_value(value, timestamp_ns)
+        return True
 
 
 if __name__ == "__main__":
@@ -0,0 +1,198 @@
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# A tick dispatched more than this many seconds after it was due means the scheduler is overloaded
+OVERLOAD_LAG = 0.05
+# Seconds over which overload is assessed, and so the minimum time between two warnings
+OVERLOAD_REPORT_INTERVAL = 10.0
+# Fraction of late or skipped ticks in a report interval above which the scheduler warns
+OVERLOAD_FRACTION = 0.01
+
+
+class Scheduler:
+    """
+    Drives many RunThread jobs from a single dispatcher thread and a small,
+    fixed pool of worker threads.
+
+    Jobs are kept in a heap keyed by their next due time (monotonic clock).
+    The dispatcher pops jobs as they become due and hands them to the
+    workers, which run one tick and push the job back onto the heap. A job
+    is never queued more than once, so a slow tick delays only that job.
+
+    The workers count the ticks that start more than `overload_lag` seconds
+    after they were due and the deadlines the jobs skip, and warn at most
+    every `report_interval` seconds when the configured load is more than
+    the scheduler can deliver.
+    """
+
+    def __init__(self, num_workers=4, overload_lag=OVERLOAD_LAG, report_interval=OVERLOAD_REPORT_INTERVAL):
+        self.num_workers = num_workers
+        self.overload_lag = overload_lag
+        self.report_interval = report_interval
+        self.dispatched = 0
+        self.late_dispatches = 0
+        self.skipped_ticks = 0
+        self.max_lag = 0.0
+        self._report_dispatched = 0
+        self._report_skipped = 0
+        self._report_late = 0
+        self._report_max_lag = 0.0
+        self._report_started = None
+        self._heap = []
+        self._condition = threading.Condition()
+        self._work_queue = queue.SimpleQueue()
+        self._sequence = itertools.count()
+        self._dispatcher = None
+        self._workers = []
+        self._running = False
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="scheduler-dispatch", daemon=True
+        )
+        self._dispatcher.start()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"scheduler-worker-{i}", daemon=True)
+            for i in range(self.num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        logger.debug(f"Started scheduler with {self.num_workers} workers")
+
+    def stop(self):
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            self._heap.clear()
+            self._condition.notify_all()
+
+        for _ in self._workers:
+            self._work_queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._dispatcher.join()
+        self._workers = []
+        self._dispatcher = None
+
+    def is_running(self):
+        return self._running
+
+    def add(self, job, delay=0.0):
+        """
+        Schedule a job to run its first tick after `delay` seconds.
+
+        Re-adding a job that is already scheduled replaces the old entry.
+        """
+        with self._condition:
+            job._schedule_generation += 1
+            self._push(job, time.monotonic() + delay)
+
+    def remove(self, job):
+        """
+        Remove a job from the schedule. Entries already in the heap are
+        discarded lazily when they come due.
+        """
+        with self._condition:
+            job._schedule_generation += 1
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _push(self, job, due):
+        entry = (due, next(self._sequence), job, job._schedule_generation)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._condition.notify()
+
+    def _dispatch(self):
+        with self._condition:
+            while self._running:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+
+                due, _, job, generation = self._heap[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+
+                heapq.heappop(self._heap)
+                if generation != job._schedule_generation:
+                    continue
+                self._work_queue.put((job, generation, due))
+
+    def _count_tick(self, lag, skipped, now):
+        """
+        Count a tick that started `lag` seconds after it was due and after
+        which its job skipped `skipped` deadlines. At the end of every report
+        interval warn if more than OVERLOAD_FRACTION of the deadlines were
+        late or skipped. Called with the condition held.
+        """
+        self.dispatched += 1
+        self.skipped_ticks += skipped
+        self.max_lag = max(self.max_lag, lag)
+        self._report_dispatched += 1
+        self._report_skipped += skipped
+        if lag > self.overload_lag:
+            self.late_dispatches += 1
+            self._report_late += 1
+            self._report_max_lag = max(self._report_max_lag, lag)
+
+        if self._report_started is None:
+            self._report_started = now
+        elif now - self._report_started >= self.report_interval:
+            self._report_overload()
+            self._report_started = now
+
+    def _report_overload(self):
+        deadlines = self._report_dispatched + self._report_skipped
+        missed = self._report_late + self._report_skipped
+        if deadlines and missed > OVERLOAD_FRACTION * deadlines:
+            logger.warning(
+                f"Scheduler overloaded: of {deadlines} ticks {self._report_late} started more than "
+                f"{self.overload_lag * 1e3:.0f} ms late (up to {self._report_max_lag * 1e3:.0f} ms) and "
+                f"{self._report_skipped} were skipped, the configured update rates exceed what "
+                f"{self.num_workers} workers can deliver"
+            )
+        self._report_dispatched = 0
+        self._report_late = 0
+        self._report_skipped = 0
+        self._report_max_lag = 0.0
+
+    def _work(self):
+        while True:
+            item = self._work_queue.get()
+            if item is None:
+                return
+
+            job, generation, due = item
+            lag = time.monotonic() - due
+            try:
+                job._tick(due)
+            except Exception as e:
+                logger.error(f"Unhandled error in scheduled job {job}: {e}")
+
+            with self._condition:
+                if self._running and generation == job._schedule_generation:
+                    now = time.monotonic()
+                    skipped_before = job.skipped_ticks
+                    try:
+                        next_due = job._next_due(due, now)
+                    except Exception as e:
+                        logger.error(f"Not rescheduling job {job}, its next tick could not be scheduled: {e}")
+                        continue
+                    self._push(job, next_due)
+                    self._count_tick(lag, job.skipped_ticks - skipped_before, now)
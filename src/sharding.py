@@ -0,0 +1,115 @@
+import logging
+import multiprocessing
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def shard_devices(devices, num_shards):
+    """
+    Split the devices into shards of (almost) equal size.
+
+    :param devices: Dict of devices keyed by NeXus path, as from PVFactory.get_devices().
+    :param num_shards: The number of shards.
+    :return: A list of `num_shards` dicts with the same layout as `devices`.
+    """
+    shards = [{} for _ in range(num_shards)]
+    for index, (path, device) in enumerate(devices.items()):
+        shards[index % num_shards][path] = device
+    return shards
+
+
+class Supervisor:
+    """
+    Runs one worker process per shard and supervises them.
+
+    Workers are started with the "spawn" method so they do not inherit the
+    threads and p4p state of the supervising process. A worker that exits
+    unexpectedly is restarted up to `max_restarts` times. All workers are
+    asked to stop through a shared event, and terminated if they do not
+    stop in time.
+    """
+
+    def __init__(self, target, shard_args, max_restarts=3, check_interval=1.0):
+        """
+        :param target: The worker function, called with the shard's arguments and the stop event.
+        :param shard_args: One tuple of arguments per worker.
+        :param max_restarts: How often a failing worker is restarted before giving up on it.
+        :param check_interval: Seconds between liveness checks.
+        """
+        self.target = target
+        self.shard_args = shard_args
+        self.max_restarts = max_restarts
+        self.check_interval = check_interval
+        self._context = multiprocessing.get_context("spawn")
+        self.stop_event = self._context.Event()
+        self.processes = [None] * len(shard_args)
+        self.restarts = [0] * len(shard_args)
+        self.failed = set()
+
+    def start(self):
+        for index in range(len(self.shard_args)):
+            self._start_worker(index)
+
+    def stop(self, timeout=10):
+        self.stop_event.set()
+        deadline = time.monotonic() + timeout
+        for index, process in enumerate(self.processes):
+            if process is None:
+                continue
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning(f"Shard {index} did not stop in time, terminating it")
+                process.terminate()
+                process.join()
+
+    def check_workers(self):
+        """
+        Restart workers that have exited, unless we are stopping.
+
+        :return: The number of workers that are still running.
+        """
+        running = 0
+        for index, process in enumerate(self.processes):
+            if index in self.failed:
+                continue
+            if process.is_alive():
+                running += 1
+                continue
+            if self.stop_event.is_set():
+                continue
+
+            logger.error(f"Shard {index} exited with code {process.exitcode}")
+            if self.restarts[index] >= self.max_restarts:
+                logger.error(f"Shard {index} failed {self.restarts[index]} times, giving up")
+                self.failed.add(index)
+                continue
+
+            self.restarts[index] += 1
+            logger.info(f"Restarting shard {index}, attempt {self.restarts[index]}")
+            self._start_worker(index)
+            running += 1
+        return running
+
+    def run(self):
+        """
+        Start the workers and supervise them until interrupted or all have failed.
+        """
+        self.start()
+        try:
+            while self.check_workers() > 0:
+                time.sleep(self.check_interval)
+            logger.error("All shards have failed")
+        except KeyboardInterrupt:
+            logger.info("Stopping shards")
+        finally:
+            self.stop()
+
+    def _start_worker(self, index):
+        process = self._context.Process(
+            target=self.target,
+            args=(*self.shard_args[index], self.stop_event),
+            name=f"pv-simulator-shard-{index}",
+        )
+        process.start()
+        self.processes[index] = process
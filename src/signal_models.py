@@ -0,0 +1,184 @@
+import numpy as np
+
+# Number of parameters a signal model can have, the columns SimulationCore keeps for them
+MAX_PARAMETERS = 4
+
+
+class SignalModel:
+    """
+    The noise-free signal of a simulated PV, on top of which the gaussian
+    noise of `std_dev` is added.
+
+    A model instance only holds the parameters of one PV. The signal is
+    generated by the classmethod generate() for all PVs that use the model
+    at once, for a block of their next updates, so it is a few array
+    operations per block however many PVs there are. Models advance by
+    the PV's update period per update.
+
+    Subclasses list their parameters with defaults in PARAMETERS, None for
+    a required one.
+    """
+
+    name = None
+    PARAMETERS = {}
+
+    def __init__(self, **parameters):
+        unknown = set(parameters) - set(self.PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown {self.name} model parameters {sorted(unknown)}")
+        self.params = np.full(MAX_PARAMETERS, np.nan)
+        for index, (name, default) in enumerate(self.PARAMETERS.items()):
+            value = parameters.get(name, default)
+            if value is None and default is None:
+                raise ValueError(f"The {self.name} model requires the parameter {name}")
+            self.params[index] = np.nan if value is None else float(value)
+        self.validate()
+
+    def validate(self):
+        pass
+
+    @classmethod
+    def generate(cls, state, tick, target, period, params, rng, block_ticks):
+        """
+        Return the signal of the next `block_ticks` updates of n PVs.
+
+        :param state: The signal of the last update per PV, NaN if there was none.
+        :param tick: The number of updates so far per PV.
+        :param target: The target value per PV, 0 if not configured.
+        :param period: The update period per PV in seconds.
+        :param params: The (n, MAX_PARAMETERS) parameters.
+        :param rng: The np.random.Generator for models that draw random numbers.
+        :param block_ticks: The number of updates to generate.
+        :return: A (block_ticks, n) array.
+        """
+        raise NotImplementedError("Subclasses must implement generate method")
+
+    def __eq__(self, other):
+        return type(self) is type(other) and np.array_equal(self.params, other.params, equal_nan=True)
+
+    def __repr__(self):
+        parameters = ", ".join(f"{name}={value}" for name, value in zip(self.PARAMETERS, self.params))
+        return f"{type(self).__name__}({parameters})"
+
+
+def _times(tick, period, block_ticks):
+    return (tick + np.arange(block_ticks)[:, None]) * period
+
+
+class RandomWalk(SignalModel):
+    """
+    Drifts away from the target value in random steps, like a temperature.
+    `step` is the standard deviation of the drift after one second, and
+    `reversion` the rate in 1/s at which the signal is pulled back to the
+    target value, 0 for a free random walk.
+    """
+
+    name = "random_walk"
+    PARAMETERS = {"step": None, "reversion": 0.0}
+
+    def validate(self):
+        if self.params[0] < 0 or self.params[1] < 0:
+            raise ValueError("The step and reversion of a random walk can not be negative")
+
+    @classmethod
+    def generate(cls, state, tick, target, period, params, rng, block_ticks):
+        signal = np.empty((block_ticks, len(state)))
+        rng.standard_normal(out=signal)
+        signal *= params[:, 0] * np.sqrt(period)
+        decay = np.exp(-params[:, 1] * period)
+        value = np.where(np.isnan(state), target, state)
+        # One array operation per update, for all PVs
+        for row in signal:
+            value = target + (value - target) * decay + row
+            row[...] = value
+        return signal
+
+
+class Sine(SignalModel):
+    """
+    Oscillates around the target value with an `amplitude`, a `period` in
+    seconds and a `phase` in radians, like the phase of a chopper.
+    """
+
+    name = "sine"
+    PARAMETERS = {"amplitude": None, "period": None, "phase": 0.0}
+
+    def validate(self):
+        if self.params[1] <= 0:
+            raise ValueError("The period of a sine must be positive")
+
+    @classmethod
+    def generate(cls, state, tick, target, period, params, rng, block_ticks):
+        angle = _times(tick, period, block_ticks) * (2 * np.pi / params[:, 1]) + params[:, 2]
+        return target + params[:, 0] * np.sin(angle)
+
+
+class Ramp(SignalModel):
+    """
+    Ramps linearly from `start` to `end` over `duration` seconds, then
+    stays at `end`, or starts over if `repeat` is set, like a pressure
+    being pumped down. The target value is not used.
+    """
+
+    name = "ramp"
+    PARAMETERS = {"start": None, "end": None, "duration": None, "repeat": False}
+
+    def validate(self):
+        if self.params[2] <= 0:
+            raise ValueError("The duration of a ramp must be positive")
+
+    @classmethod
+    def generate(cls, state, tick, target, period, params, rng, block_ticks):
+        fraction = _times(tick, period, block_ticks) / params[:, 2]
+        fraction = np.where(params[:, 3] != 0, fraction % 1.0, np.minimum(fraction, 1.0))
+        return params[:, 0] + (params[:, 1] - params[:, 0]) * fraction
+
+
+class FirstOrderLag(SignalModel):
+    """
+    Settles exponentially towards the target value with a `time_constant`
+    in seconds, like a motor moving to a new setpoint when the target value
+    is changed. Starts at `initial_value`, or at the target value.
+    """
+
+    name = "lag"
+    PARAMETERS = {"time_constant": None, "initial_value": np.nan}
+
+    def validate(self):
+        if self.params[0] <= 0:
+            raise ValueError("The time constant of a lag must be positive")
+
+    @classmethod
+    def generate(cls, state, tick, target, period, params, rng, block_ticks):
+        start = np.where(np.isnan(state), params[:, 1], state)
+        start = np.where(np.isnan(start), target, start)
+        decay = np.exp(-period / params[:, 0])
+        return target + (start - target) * decay ** np.arange(1, block_ticks + 1)[:, None]
+
+
+MODELS = {model.name: model for model in (RandomWalk, Sine, Ramp, FirstOrderLag)}
+
+
+def model_from_config(config):
+    """
+    Create a SignalModel from the "model" entry of a PV's target config, e.g.
+
+        {"type": "random_walk", "step": 0.05, "reversion": 0.01}
+        {"type": "sine", "amplitude": 2.5, "period": 10, "phase": 0}
+        {"type": "ramp", "start": 1e-3, "end": 1e-7, "duration": 600, "repeat": false}
+        {"type": "lag", "time_constant": 2, "initial_value": 0}
+
+    :return: The model, or None if the config has no model.
+    """
+    model_config = config.get("model", None)
+    if model_config is None:
+        return None
+
+    model_config = dict(model_config)
+    model_type = model_config.pop("type", None)
+    if model_type not in MODELS:
+        raise ValueError(f"Unknown signal model type {model_type}, expected one of {list(MODELS)}")
+    try:
+        return MODELS[model_type](**model_config)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid {model_type} signal model {model_config}: {e}")
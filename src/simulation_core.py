@@ -0,0 +1,304 @@
+import threading
+import time
+
+import numpy as np
+
+from src.signal_models import MAX_PARAMETERS, MODELS
+
+# Model codes of the slots, 0 for a constant target value
+_MODEL_CLASSES = [None] + list(MODELS.values())
+_MODEL_CODES = {model: code for code, model in enumerate(_MODEL_CLASSES) if model is not None}
+
+
+class SimulationCore:
+    """
+    Holds the target values and noise levels of all simulated devices in
+    contiguous arrays and generates their values in bulk.
+
+    Each device registers once and gets a slot with a block of values for
+    its next ticks, which it reads one sample at a time. A block is only
+    generated again when it is used up, together with the blocks of all
+    other devices that have used up theirs, with one call to a seedable
+    np.random.Generator for the noise. A device that updates much faster
+    than the others therefore only regenerates its own block.
+
+    Devices can have a SignalModel instead of a constant target value. The
+    signal of all devices with the same model in a refill is generated
+    together, and each model continues from the last tick that was
+    sampled, so a model costs no more per sample than a constant value.
+    """
+
+    def __init__(self, seed=None, block_ticks=64, capacity=1024):
+        self.rng = np.random.default_rng(seed)
+        self.block_ticks = block_ticks
+        self.target = np.full(capacity, np.nan)
+        self.std_dev = np.zeros(capacity)
+        self._size = 0
+        # The block of every slot, one row per slot, and the next tick to sample from it
+        self._values = np.empty((capacity, block_ticks))
+        self._cursor = np.full(capacity, block_ticks, dtype=np.intp)
+        # Per slot: the model code and parameters and the update period a model advances by per tick
+        self.model = np.zeros(capacity, dtype=np.uint8)
+        self.params = np.full((capacity, MAX_PARAMETERS), np.nan)
+        self.period = np.ones(capacity)
+        # The signal of the models in the blocks, None while no device has a model. Per slot,
+        # the model was generated from tick _start of the block on, continuing from the
+        # signal _state after _tick ticks.
+        self._signal = None
+        self._start = np.zeros(capacity, dtype=np.intp)
+        self._state = np.full(capacity, np.nan)
+        self._tick = np.zeros(capacity, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def add(self, target_value=None, std_dev=None, model=None, period=None):
+        """
+        Register a device.
+
+        :param model: A SignalModel, None for a constant target value.
+        :param period: The update period of the device, the time a model advances per tick.
+        :return: The slot of the device, used for all later calls.
+        """
+        with self._lock:
+            if self._size == len(self.target):
+                self._grow()
+            slot = self._size
+            self._size += 1
+            self._set(slot, target_value, std_dev, model, period)
+        return slot
+
+    def set(self, slot, target_value=None, std_dev=None, model=None, period=None):
+        """
+        Change the config of a device from its next sample on. A model of
+        the same type continues where it is, e.g. a lag settles from its
+        current value to a new target value.
+        """
+        with self._lock:
+            self._set(slot, target_value, std_dev, model, period)
+
+    def spawn_rng(self):
+        """
+        Return an independent np.random.Generator derived from the core's seed,
+        for devices that draw their own random numbers from another thread.
+        """
+        with self._lock:
+            return self.rng.spawn(1)[0]
+
+    def sample(self, slot):
+        """
+        Return the next value of one device.
+        """
+        with self._lock:
+            tick = self._cursor[slot]
+            if tick >= self.block_ticks:
+                self._refill()
+                tick = 0
+            self._cursor[slot] = tick + 1
+            return self._values[slot, tick]
+
+    def _set(self, slot, target_value, std_dev, model=None, period=None):
+        previous = self.model[slot]
+        if previous:
+            self._advance(np.array([slot]))
+
+        self.target[slot] = np.nan if target_value is None else target_value
+        self.std_dev[slot] = 0.0 if std_dev is None else std_dev
+        if period is not None:
+            self.period[slot] = period
+        code = 0 if model is None else _MODEL_CODES[type(model)]
+        if code != previous:
+            self.model[slot] = code
+            self._state[slot] = np.nan
+            self._tick[slot] = 0
+        self.params[slot] = np.nan if model is None else model.params
+
+        # Replace the values of the block that have not been sampled yet
+        tick = self._cursor[slot]
+        self._start[slot] = tick
+        if tick < self.block_ticks:
+            self._generate(np.array([slot]), tick)
+
+    def _advance(self, slots):
+        """
+        Move the model state of slots to the last tick sampled from their blocks.
+        """
+        sampled = np.minimum(self._cursor[slots], self.block_ticks)
+        advanced = sampled > self._start[slots]
+        slots, sampled = slots[advanced], sampled[advanced]
+        self._state[slots] = self._signal[slots, sampled - 1]
+        self._tick[slots] += sampled - self._start[slots]
+        self._start[slots] = sampled
+
+    def _refill(self):
+        """
+        Generate new blocks for all devices that have used up theirs.
+        """
+        slots = np.flatnonzero(self._cursor[: self._size] >= self.block_ticks)
+        if self._signal is not None:
+            self._advance(slots[self.model[slots] != 0])
+        self._cursor[slots] = 0
+        self._start[slots] = 0
+        self._generate(slots)
+
+    def _generate(self, slots, first_tick=0):
+        """
+        Generate the values of slots from `first_tick` to the end of their blocks.
+        """
+        ticks = self.block_ticks - first_tick
+        std_dev = self.std_dev[slots, None]
+        values = self.rng.standard_normal((len(slots), ticks))
+        models = self.model[slots]
+        groups = [(code, np.flatnonzero(models == code)) for code in np.unique(models[models != 0]).tolist()]
+        noise = [values[group] for _, group in groups]
+        values *= std_dev
+        values += self.target[slots, None]
+        # One call per model for all devices that use it
+        for (code, group), group_noise in zip(groups, noise):
+            group_slots = slots[group]
+            signal = _MODEL_CLASSES[code].generate(
+                self._state[group_slots],
+                self._tick[group_slots],
+                np.nan_to_num(self.target[group_slots]),
+                self.period[group_slots],
+                self.params[group_slots],
+                self.rng,
+                ticks,
+            ).T
+            if self._signal is None:
+                self._signal = np.full(self._values.shape, np.nan)
+            self._signal[group_slots, first_tick:] = signal
+            group_noise *= std_dev[group]
+            group_noise += signal
+            values[group] = group_noise
+        self._values[slots, first_tick:] = values
+
+    def _grow(self):
+        capacity = 2 * len(self.target)
+        extra = capacity - len(self.target)
+        self.target = np.concatenate([self.target, np.full(extra, np.nan)])
+        self.std_dev = np.concatenate([self.std_dev, np.zeros(extra)])
+        self._values = np.concatenate([self._values, np.empty((extra, self.block_ticks))])
+        self._cursor = np.concatenate([self._cursor, np.full(extra, self.block_ticks, dtype=np.intp)])
+        self.model = np.concatenate([self.model, np.zeros(extra, dtype=np.uint8)])
+        self.params = np.concatenate([self.params, np.full((extra, MAX_PARAMETERS), np.nan)])
+        self.period = np.concatenate([self.period, np.ones(extra)])
+        if self._signal is not None:
+            self._signal = np.concatenate([self._signal, np.full((extra, self.block_ticks), np.nan)])
+        self._start = np.concatenate([self._start, np.zeros(extra, dtype=np.intp)])
+        self._state = np.concatenate([self._state, np.full(extra, np.nan)])
+        self._tick = np.concatenate([self._tick, np.zeros(extra, dtype=np.int64)])
+
+
+class WaveformBuffer:
+    """
+    Generates the values of a waveform device into preallocated NumPy
+    buffers, so large arrays do not allocate or go through Python lists on
+    every update.
+
+    The returned array is reused by the next call to generate(), so it must
+    be consumed (posted or serialised) before then.
+    """
+
+    def __init__(self, size, dtype=np.float64, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self._work = np.empty(size)
+        self._out = self._work if np.dtype(dtype) == self._work.dtype else np.empty(size, dtype)
+
+    def __len__(self):
+        return len(self._work)
+
+    def generate(self, target_value, std_dev=None):
+        """
+        :param target_value: A scalar, or an array with one target per element.
+        :param std_dev: Standard deviation of the gaussian noise, None for no noise.
+        """
+        if std_dev is None:
+            self._work[...] = target_value
+        else:
+            self.rng.standard_normal(out=self._work)
+            self._work *= std_dev
+            self._work += target_value
+        if self._out is not self._work:
+            np.copyto(self._out, self._work, casting="unsafe")
+        return self._out
+
+
+class ChopperTimestamps:
+    """
+    Generates the top dead centre (TDC) timestamps of a chopper rotating at
+    a fixed frequency, with gaussian jitter on every revolution.
+
+    The nominal TDC times are kept as a revolution count from a fixed
+    start, so they do not drift however long the simulation runs, and all
+    timestamps that are due are generated with one vectorised call.
+    """
+
+    def __init__(self, frequency=14.0, jitter_ns=0.0, start_ns=None, rng=None):
+        """
+        :param frequency: Revolutions per second, 14 Hz for the ESS source frequency.
+        :param jitter_ns: Standard deviation of the TDC times around the nominal ones.
+        :param start_ns: Time of the first revolution in ns since the epoch, now plus a random phase if not given.
+        :param rng: The np.random.Generator to draw the jitter and phase from.
+        """
+        self.validate(frequency, jitter_ns)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.frequency = frequency
+        self.jitter_ns = jitter_ns
+        if start_ns is None:
+            start_ns = time.time_ns() + int(self.rng.uniform(0, self.period_ns))
+        self._start_ns = start_ns
+        self._revolution = 0
+
+    @staticmethod
+    def validate(frequency=None, jitter_ns=None):
+        """
+        Raise ValueError for a frequency or jitter a chopper can not have, None is not checked.
+        """
+        if frequency is not None and not frequency > 0:
+            raise ValueError(f"The frequency of a chopper must be positive, got {frequency}")
+        if jitter_ns is not None and not jitter_ns >= 0:
+            raise ValueError(f"The jitter of a chopper can not be negative, got {jitter_ns}")
+
+    @property
+    def period_ns(self):
+        return 1e9 / self.frequency
+
+    def set_frequency(self, frequency):
+        """
+        Change the frequency, continuing from the next due revolution.
+        """
+        self.validate(frequency)
+        self._start_ns = self._nominal(self._revolution)
+        self._revolution = 0
+        self.frequency = frequency
+
+    def until(self, now_ns=None):
+        """
+        Return the timestamps of all revolutions up to `now_ns` that have not been returned yet.
+
+        :param now_ns: The current time in ns since the epoch, time.time_ns() if not given.
+        :return: A sorted np.uint64 array, empty if no revolution is due.
+        """
+        if now_ns is None:
+            now_ns = time.time_ns()
+        elapsed = now_ns - self._start_ns
+        if elapsed < 0:
+            return np.empty(0, dtype=np.uint64)
+
+        last = int(elapsed * self.frequency // 1e9)
+        if last < self._revolution:
+            return np.empty(0, dtype=np.uint64)
+
+        revolutions = np.arange(self._revolution, last + 1, dtype=np.float64)
+        offsets = revolutions * self.period_ns
+        if self.jitter_ns:
+            offsets += self.rng.normal(0.0, self.jitter_ns, len(offsets))
+        self._revolution = last + 1
+        # Jitter larger than half a period could reorder the revolutions
+        offsets.sort()
+        return (self._start_ns + np.rint(offsets).astype(np.int64)).astype(np.uint64)
+
+    def _nominal(self, revolution):
+        return self._start_ns + int(round(revolution * self.period_ns))
@@ -1,3 +1,5 @@
+import threading
+
 from confluent_kafka import KafkaException
 
 
@@ -6,11 +8,38 @@ class ProducerSpy:
         self.conf = conf
         self.data = []
         self.should_throw = should_throw
+        self._pending_callbacks = []
+        self._lock = threading.Lock()
 
     def produce(self, topic, value=None, key=None, headers=None, timestamp=None, callback=None):
         if self.should_throw:
             raise KafkaException()
         self.data.append({"topic": topic, "value": value, "key": key, "headers": headers, "timestamp": timestamp})
+        if callback is not None:
+            with self._lock:
+                self._pending_callbacks.append(callback)
+
+    def poll(self, timeout=None):
+        with self._lock:
+            callbacks, self._pending_callbacks = self._pending_callbacks, []
+        for callback in callbacks:
+            callback(None, None)
+        return len(callbacks)
 
     def flush(self, timeout=None):
-        return True
\ No newline at end of file
+        self.poll()
+        return 0
+
+    def __len__(self):
+        return len(self._pending_callbacks)
+
+
+class ProducerFactorySpy:
+    def __init__(self, should_throw=False):
+        self.should_throw = should_throw
+        self.producers = []
+
+    def create_producer(self, config):
+        producer = ProducerSpy(config, should_throw=self.should_throw)
+        self.producers.append(producer)
+        return producer
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from src.async_runtime import AsyncRuntime, AsyncScheduler
+from src.module_f144 import DeviceF144
+from src.pva_server import EpicsPVAServer
+from src.run_thread import EpicsThreadF144, RunThread
+from tests.test_pva_server import ISOLATED_CONFIG
+
+
+class CountingThread(RunThread):
+    def __init__(self, update_period=1., scheduler=None):
+        super().__init__(update_period=update_period, scheduler=scheduler)
+        self.run_count = 0
+
+    def _inner_run(self):
+        self.run_count += 1
+
+
+def test_async_scheduler_runs_jobs():
+    async def run():
+        scheduler = AsyncScheduler()
+        scheduler.start()
+        threads = [CountingThread(update_period=0.01, scheduler=scheduler) for _ in range(100)]
+        for thread in threads:
+            thread.start()
+        await asyncio.sleep(0.1)
+        for thread in threads:
+            thread.stop()
+        counts = [thread.run_count for thread in threads]
+        await asyncio.sleep(0.05)
+        return counts, [thread.run_count for thread in threads]
+
+    counts, counts_after_stop = asyncio.run(run())
+
+    assert all(count > 1 for count in counts)
+    assert counts == counts_after_stop
+
+
+
+class UnschedulableThread(CountingThread):
+    def _next_due(self, due, now):
+        raise ValueError("no next tick")
+
+
+def test_async_job_that_cannot_be_rescheduled_is_dropped(caplog):
+    async def run():
+        scheduler = AsyncScheduler()
+        scheduler.start()
+        broken = UnschedulableThread(update_period=0.01, scheduler=scheduler)
+        working = CountingThread(update_period=0.01, scheduler=scheduler)
+        for thread in (broken, working):
+            thread.start()
+        await asyncio.sleep(0.1)
+        for thread in (broken, working):
+            thread.stop()
+        return broken.run_count, working.run_count
+
+    broken_count, working_count = asyncio.run(run())
+
+    assert broken_count == 1
+    assert working_count > 1
+    assert "could not be scheduled" in caplog.text
+
+def test_runtime_serves_and_updates_pvs(tmp_path):
+    device = DeviceF144(source_name="SIM_motor", topic="some_topic", dtype="double")
+    server = EpicsPVAServer(
+        devices={"entry/motor": device},
+        gateway_config=ISOLATED_CONFIG,
+        target_config_path=str(tmp_path / "targets.json"),
+    )
+    runtime = AsyncRuntime(server)
+
+    def make_threads():
+        return [
+            EpicsThreadF144(
+                device,
+                server=server,
+                config={"target_value": 2.0, "std_dev": None},
+                update_period=0.01,
+                scheduler=runtime.scheduler,
+            )
+        ]
+
+    async def run():
+        task = asyncio.create_task(runtime.run(make_threads))
+        await asyncio.sleep(0.1)
+        value = server.pvs["SIM_motor"].current()["value"]
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return value
+
+    assert asyncio.run(run()) == 2.0
+    assert runtime.threads[0].is_alive() is False
@@ -0,0 +1,157 @@
+import time
+
+import pytest
+
+from tests.doubles.producer import ProducerFactorySpy
+
+from src.batch_producer import BatchProducer
+from src.module_f144 import DeviceF144
+from src.run_thread import KafkaThreadF144
+
+
+@pytest.fixture
+def batch_producer():
+    factory = ProducerFactorySpy()
+    producer = BatchProducer(
+        {"bootstrap.servers": "localhost:9092"},
+        producer_factory=factory,
+        linger_ms=20,
+        batch_size=500,
+        poll_interval=0.01,
+    )
+
+    yield producer, factory.producers[0]
+
+    producer.close()
+
+
+def test_batch_settings_are_passed_to_producer(batch_producer):
+    producer, spy = batch_producer
+
+    assert spy.conf["bootstrap.servers"] == "localhost:9092"
+    assert spy.conf["linger.ms"] == 20
+    assert spy.conf["batch.num.messages"] == 500
+
+
+def test_config_overrides_batch_settings():
+    factory = ProducerFactorySpy()
+
+    BatchProducer({"linger.ms": 100}, producer_factory=factory, linger_ms=20)
+
+    assert factory.producers[0].conf["linger.ms"] == 100
+
+
+def test_produce_does_not_flush(batch_producer):
+    producer, spy = batch_producer
+
+    producer.produce("some_topic", b"msg")
+
+    assert len(spy.data) == 1
+    assert producer.queue_depth() == 1
+    assert producer.delivered == 0
+
+
+def test_poll_thread_serves_delivery_callbacks(batch_producer):
+    producer, spy = batch_producer
+    producer.start()
+
+    for _ in range(100):
+        producer.produce("some_topic", b"msg")
+    time.sleep(0.05)
+
+    assert producer.delivered == 100
+    assert producer.queue_depth() == 0
+
+
+def test_close_flushes(batch_producer):
+    producer, spy = batch_producer
+
+    producer.produce("some_topic", b"msg")
+    producer.close()
+
+    assert producer.delivered == 1
+
+
+def test_retries_when_queue_is_full(batch_producer):
+    producer, spy = batch_producer
+    produce = spy.produce
+    calls = []
+
+    def produce_once_full(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise BufferError()
+        return produce(*args, **kwargs)
+
+    spy.produce = produce_once_full
+
+    producer.produce("some_topic", b"msg")
+
+    assert len(calls) == 2
+    assert len(spy.data) == 1
+
+
+def always_full(*args, **kwargs):
+    raise BufferError()
+
+
+def test_gives_up_when_queue_stays_full(batch_producer):
+    producer, spy = batch_producer
+    spy.produce = always_full
+
+    start = time.monotonic()
+    with pytest.raises(BufferError):
+        producer.produce("some_topic", b"msg")
+
+    assert time.monotonic() - start < 1.0
+    assert producer.dropped == 1
+
+
+def test_no_retries_after_close(batch_producer):
+    producer, spy = batch_producer
+    producer.close()
+    polls = []
+    spy.produce = always_full
+    spy.poll = lambda timeout=None: polls.append(timeout)
+
+    with pytest.raises(BufferError):
+        producer.produce("some_topic", b"msg")
+
+    assert polls == []
+
+
+def test_thread_counts_message_dropped_on_full_queue_as_error(batch_producer):
+    producer, spy = batch_producer
+    spy.produce = always_full
+    thread = KafkaThreadF144(
+        DeviceF144(source_name="some_source", topic="some_topic", dtype="double"),
+        producer,
+        config={"target_value": 1.0, "std_dev": None},
+    )
+
+    thread._inner_run()
+
+    assert thread.errors == 1
+
+
+def test_threads_share_producer(batch_producer):
+    producer, spy = batch_producer
+    producer.start()
+    threads = [
+        KafkaThreadF144(
+            DeviceF144(source_name=f"source_{i}", topic="some_topic", dtype="double"),
+            producer,
+            config={"target_value": i, "std_dev": None},
+            update_period=0.01,
+        )
+        for i in range(10)
+    ]
+
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    for thread in threads:
+        thread.stop()
+
+    assert len(spy.data) >= 10
+    assert {msg["topic"] for msg in spy.data} == {"some_topic"}
@@ -0,0 +1,128 @@
+import io
+import json
+
+import pytest
+
+from src.config_from_json import (
+    build_config,
+    build_config_streaming,
+    find_all_modules_with_named_paths,
+    find_modules_with_type,
+)
+from src.config_stream import JsonTokenizer, iter_modules_streaming
+
+
+def f144(source, dtype="double", **config):
+    return {
+        "module": "f144",
+        "config": {"source": source, "topic": "motion", "dtype": dtype, "value_units": "mm", **config},
+    }
+
+
+@pytest.fixture
+def nexus_json():
+    return {
+        "children": [
+            {
+                "name": "entry",
+                "type": "group",
+                "attributes": [{"name": "NX_class", "dtype": "string", "values": "NXentry"}],
+                "children": [
+                    {
+                        "module": "dataset",
+                        "config": {"name": "data", "values": [[1.5, -2e-3, 3], [4, 5, 6]], "type": "double"},
+                    },
+                    {
+                        "type": "group",
+                        "children": [
+                            f144("SIM_temperature"),
+                            f144("SIM_wave", array_size=16, shape=[{"size": 16}]),
+                            f144("REAL_pressure"),
+                            {"module": "tdct", "config": {"source": "SIM_chopper", "topic": "choppers"}},
+                        ],
+                        # The name of a group can come after its children
+                        "name": "sample \"stage\" å",
+                    },
+                    {"module": "ev44", "config": {"source": "SIM_detector", "topic": "detector"}},
+                    {"module": "f144", "config": {"topic": "no source"}},
+                ],
+            },
+            {"name": "ignored", "attributes": [f144("SIM_not_under_children")]},
+            {"extra": {"nested": [f144("SIM_unnamed_parents", dtype="int")]}},
+        ]
+    }
+
+
+def stream(json_obj, chunk_size=1 << 20):
+    return list(iter_modules_streaming(io.StringIO(json.dumps(json_obj, indent=1)), chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_streamed_modules_match_loaded_json(nexus_json, chunk_size):
+    expected = find_all_modules_with_named_paths(nexus_json)
+    for module in expected:
+        # Nested containers in module configs are not kept when streaming
+        module["config"] = {
+            key: value for key, value in module["config"].items() if not isinstance(value, (dict, list))
+        }
+
+    assert stream(nexus_json, chunk_size) == expected
+
+
+def test_streamed_config_matches_build_config(nexus_json):
+    config = build_config_streaming(io.StringIO(json.dumps(nexus_json)))
+
+    assert config == build_config(nexus_json)
+    assert config[""]["source"] == "SIM_unnamed_parents"
+    assert config["entry/sample \"stage\" å"]["source"] == "SIM_chopper"
+
+
+def test_tokenizer_skips_values_across_chunks():
+    text = '[{"a": "x]}\\"y", "b": [1, [2, 3]]}, 12.5e3, true, null, "end"]'
+    tokens = JsonTokenizer(io.StringIO(text), chunk_size=3)
+
+    assert tokens.next() == ("[", None)
+    tokens.skip_value()
+    assert tokens.next() == (",", None)
+    assert tokens.next() == ("value", 12.5e3)
+    tokens.next()
+    assert tokens.next() == ("value", True)
+    tokens.next()
+    assert tokens.next() == ("value", None)
+    tokens.next()
+    assert tokens.next() == ("value", "end")
+    assert tokens.next() == ("]", None)
+    assert tokens.peek() == ""
+
+
+def test_scalar_top_level_has_no_modules():
+    assert stream(42) == []
+
+
+def deep_tree(depth):
+    node = f144("SIM_deep")
+    for level in range(depth):
+        node = {"name": f"g{level}", "children": [node]} if level % 2 else {"nested": [node]}
+    return node
+
+
+def test_deep_tree_does_not_hit_recursion_limit():
+    modules = find_all_modules_with_named_paths(deep_tree(5000))
+
+    assert len(modules) == 1
+    assert modules[0]["path"] == "/".join(f"g{level}" for level in range(4999, 0, -2))
+
+
+def test_traverse_json_paths(nexus_json):
+    found = find_modules_with_type(nexus_json, "tdct")
+
+    path = ["children", 0, "children", 1, "children", 3]
+    assert found == [(nexus_json["children"][0]["children"][1]["children"][3], path)]
+
+
+def test_find_modules_with_type_does_not_share_results(nexus_json):
+    first = find_modules_with_type(nexus_json, "tdct")
+    second = find_modules_with_type(nexus_json, "ev44")
+
+    assert len(first) == 1
+    assert [node["module"] for node, _ in second] == ["ev44"]
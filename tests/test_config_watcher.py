@@ -0,0 +1,84 @@
+import json
+import os
+
+import pytest
+
+from src.config_watcher import ConfigWatcher, diff_configs
+
+
+def write_config(path, config):
+    with open(path, "w") as file:
+        json.dump(config, file)
+    # Make sure the change is visible even on file systems with coarse timestamps
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    path = tmp_path / "targets.json"
+    write_config(
+        path,
+        {
+            "SIM_a": {"target_value": 1, "std_dev": 0.1},
+            "SIM_b": {"target_value": 2, "std_dev": 0.1},
+        },
+    )
+    changes = []
+    watcher = ConfigWatcher(str(path), changes.append)
+    watcher.load()
+
+    yield watcher, path, changes
+
+    watcher.stop()
+
+
+def test_diff_configs_finds_added_and_changed():
+    old = {"a": {"target_value": 1}, "b": {"target_value": 2}}
+    new = {"a": {"target_value": 1}, "b": {"target_value": 3}, "c": {"target_value": 4}}
+
+    assert diff_configs(old, new) == {"b": {"target_value": 3}, "c": {"target_value": 4}}
+
+
+def test_load_does_not_notify(watcher):
+    watcher, path, changes = watcher
+
+    assert watcher.config["SIM_a"]["target_value"] == 1
+    assert changes == []
+
+
+def test_unchanged_file_is_not_reparsed(watcher):
+    watcher, path, changes = watcher
+
+    assert watcher.check() == {}
+    assert changes == []
+
+
+def test_only_changed_pvs_are_reported(watcher):
+    watcher, path, changes = watcher
+    write_config(
+        path,
+        {
+            "SIM_a": {"target_value": 1, "std_dev": 0.1},
+            "SIM_b": {"target_value": 5, "std_dev": 0.1},
+        },
+    )
+
+    watcher.check()
+
+    assert changes == [{"SIM_b": {"target_value": 5, "std_dev": 0.1}}]
+
+
+def test_invalid_json_is_retried(watcher):
+    watcher, path, changes = watcher
+    with open(path, "w") as file:
+        file.write('{"SIM_a": {"target_v')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+
+    assert watcher.check() == {}
+
+    write_config(path, {"SIM_a": {"target_value": 7, "std_dev": 0.1}})
+
+    assert watcher.check() == {"SIM_a": {"target_value": 7, "std_dev": 0.1}}
+    assert watcher.config["SIM_a"]["target_value"] == 7
@@ -0,0 +1,101 @@
+import json
+import os
+
+import pytest
+
+from src.device_cache import DeviceCache, load_device_config
+
+
+@pytest.fixture
+def config():
+    return {
+        "entry/motor": {
+            "module": "f144",
+            "source": "SIM_motor",
+            "topic": "motion",
+            "dtype": "double",
+            "value_units": "mm",
+            "array_size": None,
+        },
+        "entry/détecteur": {
+            "module": "f144",
+            "source": "SIM_wave",
+            "topic": "motion",
+            "dtype": "int",
+            "value_units": None,
+            "array_size": 128,
+        },
+        "entry/chopper": {
+            "module": "tdct",
+            "source": "SIM_chopper",
+            "topic": "choppers",
+            "dtype": None,
+            "value_units": None,
+            "array_size": None,
+        },
+    }
+
+
+@pytest.fixture
+def json_path(tmp_path):
+    path = tmp_path / "instrument.json"
+    path.write_text(json.dumps({"children": []}))
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DeviceCache(str(tmp_path / "cache"))
+
+
+def test_round_trip(cache, json_path, config):
+    cache.store(json_path, config)
+
+    assert cache.load(json_path) == config
+
+
+def test_round_trip_empty_config(cache, json_path):
+    cache.store(json_path, {})
+
+    assert cache.load(json_path) == {}
+
+
+def test_missing_cache_is_a_miss(cache, json_path):
+    assert cache.load(json_path) is None
+
+
+def test_changed_json_invalidates_cache(cache, json_path, config):
+    cache.store(json_path, config)
+    with open(json_path, "w") as file:
+        file.write(json.dumps({"children": [1]}))
+
+    assert cache.load(json_path) is None
+
+
+def test_touched_json_with_same_content_is_a_hit(cache, json_path, config):
+    cache.store(json_path, config)
+    stat = os.stat(json_path)
+    os.utime(json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert cache.load(json_path) == config
+
+
+def test_corrupt_cache_is_a_miss(cache, json_path, config):
+    cache.store(json_path, config)
+    with open(cache.cache_path(json_path), "r+b") as file:
+        file.truncate(60)
+
+    assert cache.load(json_path) is None
+
+
+def test_load_device_config_builds_once(cache, json_path, config):
+    calls = []
+
+    def build(path):
+        calls.append(path)
+        return config
+
+    assert load_device_config(json_path, build, cache) == config
+    assert load_device_config(json_path, build, cache) == config
+    assert calls == [json_path]
+
@@ -0,0 +1,91 @@
+import pytest
+
+from src.device_table import DeviceTable
+from src.module_f144 import DeviceF144
+from src.module_tdct import DeviceTDCT
+from src.pv_factory import PVFactory
+
+CONFIG = {
+    "entry/motor": {"module": "f144", "source": "SIM:motor", "topic": "motion", "dtype": "double", "value_units": "mm"},
+    "entry/slit": {"module": "f144", "source": "SIM:slit", "topic": "motion", "dtype": "double", "value_units": "mm"},
+    "entry/chopper": {"module": "tdct", "source": "SIM:chopper", "topic": "choppers", "dtype": None, "value_units": None},
+    "entry/detector": {
+        "module": "F144",
+        "source": "SIM:spectrum",
+        "topic": "detector",
+        "dtype": "double",
+        "value_units": "counts",
+        "array_size": 100,
+    },
+}
+
+
+def test_devices_match_config():
+    table = DeviceTable.from_config(CONFIG)
+    devices = table.devices()
+
+    assert len(table) == 4
+    assert list(devices) == list(CONFIG)
+    assert isinstance(devices["entry/motor"], DeviceF144)
+    assert isinstance(devices["entry/chopper"], DeviceTDCT)
+    assert devices["entry/motor"].topic == "motion"
+    assert devices["entry/chopper"].value_units is None
+    assert devices["entry/detector"].array_size == 100
+    assert devices["entry/motor"].array_size is None
+
+
+def test_shared_strings_are_stored_once():
+    table = DeviceTable.from_config(CONFIG)
+
+    assert table.strings.count("motion") == 1
+    assert table.devices()["entry/motor"].topic is table.devices()["entry/slit"].topic
+
+
+def test_device_objects_are_made_once():
+    table = DeviceTable.from_config(CONFIG)
+
+    assert table.device(0) is table.device(0)
+    assert table.devices()["entry/motor"] is table.device(table.row("entry/motor"))
+
+
+def test_select_by_module_and_topic():
+    table = DeviceTable.from_config(CONFIG)
+
+    assert table.column("path") == list(CONFIG)
+    assert [table.column("source_name")[row] for row in table.select(module="f144")] == [
+        "SIM:motor",
+        "SIM:slit",
+        "SIM:spectrum",
+    ]
+    assert list(table.devices(table.select(topic="motion"))) == ["entry/motor", "entry/slit"]
+    assert list(table.select(module="tdct", topic="motion")) == []
+    assert list(table.select(topic="unknown")) == []
+
+
+def test_table_grows_beyond_capacity():
+    table = DeviceTable(capacity=1)
+    for index in range(10):
+        table.add(f"entry/pv_{index}", {**CONFIG["entry/motor"], "source": f"SIM:pv_{index}"})
+
+    assert len(table) == 10
+    assert table.device(9).source_name == "SIM:pv_9"
+
+
+def test_unknown_modules_are_skipped():
+    table = DeviceTable()
+
+    assert table.add("entry/event_data", {**CONFIG["entry/motor"], "module": "ev44"}) is None
+    assert len(table) == 0
+
+
+def test_duplicate_path_is_rejected():
+    table = DeviceTable.from_config(CONFIG)
+
+    with pytest.raises(ValueError):
+        table.add("entry/motor", CONFIG["entry/motor"])
+
+
+def test_pv_factory_devices_come_from_the_table():
+    factory = PVFactory(CONFIG)
+
+    assert factory.get_devices() == factory.table.devices()
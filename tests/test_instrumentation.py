@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from tests.doubles.producer import ProducerFactorySpy
+
+from src.batch_producer import BatchProducer
+from src.instrumentation import (
+    DELIVERY,
+    END_TO_END,
+    GENERATE,
+    PUBLISH,
+    Instrumentation,
+    LatencyHistogram,
+)
+from src.module_f144 import DeviceF144
+from src.run_thread import KafkaThreadF144
+
+
+def test_histogram_is_exact_for_small_values():
+    histogram = LatencyHistogram(significant_bits=6)
+    for value in range(64):
+        histogram.record(value)
+
+    assert histogram.percentile(50) == 31
+    assert histogram.percentile(100) == 63
+
+
+@pytest.mark.parametrize("value", [100, 12_345, 987_654_321, 2**62 + 12345])
+def test_histogram_bucket_precision(value):
+    histogram = LatencyHistogram(significant_bits=6)
+    histogram.record(value)
+
+    index = next(iter(histogram.counts))
+    low, high = histogram.bucket_bounds(index)
+    assert low <= value <= high
+    assert (high - low + 1) / low <= 1 / 32
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for value in range(1, 100_001):
+        histogram.record(value * 1000)
+
+    assert histogram.percentile(50) == pytest.approx(50_000_000, rel=0.04)
+    assert histogram.percentile(99) == pytest.approx(99_000_000, rel=0.04)
+    assert histogram.summary()["max"] == 100_000_000
+    assert histogram.summary()["mean"] == pytest.approx(50_000_500)
+
+
+def test_recordings_from_all_threads_are_merged():
+    instrumentation = Instrumentation()
+
+    def record():
+        for value in range(1000):
+            instrumentation.record(PUBLISH, "SomeThread", "SIM_pv", value)
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    dump = instrumentation.dump()
+    assert dump["stages"][PUBLISH]["SomeThread"]["count"] == 4000
+    assert dump["pvs"]["SIM_pv"][PUBLISH]["SomeThread"]["max"] == 999
+
+
+def test_kafka_thread_records_delivery():
+    instrumentation = Instrumentation()
+    producer = BatchProducer({}, producer_factory=ProducerFactorySpy())
+    device = DeviceF144(source_name="SIM_pv", topic="some_topic", dtype="double")
+    thread = KafkaThreadF144(
+        device, producer, config={"target_value": 1.0, "std_dev": 0.1}, instrumentation=instrumentation
+    )
+    thread._running = True
+
+    thread._tick(due=None)
+    producer.flush()
+
+    stages = instrumentation.dump()["stages"]
+    for stage in (GENERATE, PUBLISH, DELIVERY, END_TO_END):
+        assert stages[stage]["KafkaThreadF144"]["count"] == 1
+    assert producer.delivered == 1
@@ -1,12 +1,13 @@
 import pytest
 import time
 
-from streaming_data_types import deserialise_f144
+from streaming_data_types import deserialise_f144, deserialise_tdct
 
 from tests.doubles.producer import ProducerSpy
 
-from src.run_thread import KafkaThreadF144
+from src.run_thread import KafkaThreadF144, KafkaThreadTDCT
 from src.module_f144 import DeviceF144
+from src.module_tdct import DeviceTDCT
 
 
 @pytest.fixture
@@ -90,3 +91,50 @@ def test_can_run_thread(thread_f144):
     assert start_ts <= timestamp <= end_ts
 
 
+def test_can_produce_waveform():
+    device = DeviceF144(
+        source_name="some_waveform",
+        topic="some_topic",
+        dtype="double",
+        array_size=10000,
+    )
+    producer = ProducerSpy({})
+    thread = KafkaThreadF144(
+        device, producer, config={"target_value": [1.0] * 10000, "std_dev": None}
+    )
+
+    thread._inner_run()
+
+    deserialised_msg = deserialise_f144(producer.data[-1]["value"])
+    assert deserialised_msg.value.shape == (10000,)
+    assert (deserialised_msg.value == 1.0).all()
+
+
+def test_can_produce_batched_chopper_timestamps():
+    device = DeviceTDCT(source_name="some_chopper", topic="some_topic")
+    producer = ProducerSpy({})
+    thread = KafkaThreadTDCT(device, producer, config={"frequency": 14.0, "jitter_ns": 0})
+    thread.timestamps._start_ns = time.time_ns() - 10**9
+
+    thread._inner_run()
+    thread._inner_run()
+
+    assert len(producer.data) == 1
+    deserialised_msg = deserialise_tdct(producer.data[-1]["value"])
+    assert producer.data[-1]["topic"] == "some_topic"
+    assert deserialised_msg.name == "some_chopper"
+    assert len(deserialised_msg.timestamps) in (14, 15)
+    assert deserialised_msg.sequence_counter == 1
+
+
+@pytest.mark.parametrize("config", [{"frequency": 0}, {"frequency": -14.0}, {"jitter_ns": -1}])
+def test_invalid_chopper_config_leaves_thread_unchanged(config):
+    device = DeviceTDCT(source_name="some_chopper", topic="some_topic")
+    thread = KafkaThreadTDCT(device, ProducerSpy({}), config={"frequency": 14.0, "jitter_ns": 0})
+
+    with pytest.raises(ValueError):
+        thread.set_config(config)
+
+    assert thread.timestamps.frequency == 14.0
+    assert thread.timestamps.jitter_ns == 0
+    assert thread.config == {"frequency": 14.0, "jitter_ns": 0}
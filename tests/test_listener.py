@@ -0,0 +1,87 @@
+import time
+
+import numpy as np
+import pytest
+from p4p.client.thread import Context
+
+from src.listener import PVStats, pv_callback, summarise
+from tests.test_pva_server import server  # noqa: F401
+
+
+def test_stats_rate_and_latency():
+    stats = PVStats(expected_period=0.1)
+    for tick in range(10):
+        stats.update(1.0, timestamp=100.0 + tick * 0.1, received=100.01 + tick * 0.1)
+
+    snapshot = stats.snapshot(elapsed=2.0)
+
+    assert snapshot["updates"] == 10
+    assert snapshot["rate"] == 5.0
+    assert snapshot["latency_mean"] == pytest.approx(0.01)
+    assert snapshot["latency_max"] == pytest.approx(0.01)
+    assert snapshot["gaps"] == 0
+
+
+def test_stats_value_statistics():
+    stats = PVStats()
+    values = [1.0, 2.0, 4.0, 7.0]
+    for value in values:
+        stats.update(value, timestamp=0.0, received=0.0)
+    stats.update(np.array([3.0, 5.0]), timestamp=0.0, received=0.0)
+
+    snapshot = stats.snapshot(elapsed=1.0)
+
+    assert snapshot["value_mean"] == pytest.approx(np.mean(values + [4.0]))
+    assert snapshot["value_std"] == pytest.approx(np.std(values + [4.0]))
+    assert snapshot["value_min"] == 1.0
+    assert snapshot["value_max"] == 7.0
+
+
+def test_stats_counts_gaps():
+    stats = PVStats(expected_period=0.1, gap_factor=2.0)
+    for received in [0.0, 0.1, 0.2, 0.5, 0.6]:
+        stats.update(1.0, timestamp=received, received=received)
+
+    snapshot = stats.snapshot(elapsed=1.0)
+
+    assert snapshot["gaps"] == 1
+    assert snapshot["max_interval"] == pytest.approx(0.3)
+
+
+def test_snapshot_resets_interval():
+    stats = PVStats()
+    stats.update(1.0, timestamp=0.0, received=0.0)
+    stats.snapshot(elapsed=1.0)
+
+    snapshot = stats.snapshot(elapsed=1.0)
+
+    assert snapshot["updates"] == 0
+    assert snapshot["value_mean"] is None
+    assert stats.total_updates == 1
+
+
+def test_summary_counts_silent_pvs():
+    active, silent = PVStats(), PVStats()
+    active.update(1.0, timestamp=0.0, received=0.002)
+
+    summary = summarise({"a": active.snapshot(1.0), "b": silent.snapshot(1.0)}, 1.0)
+
+    assert summary["pvs"] == 2
+    assert summary["silent_pvs"] == 1
+    assert summary["rate"] == 1.0
+    assert summary["latency_max"] == pytest.approx(0.002)
+
+
+def test_monitor_records_posted_updates(server):  # noqa: F811
+    stats = PVStats()
+    with Context("pva", conf=server.get_context().conf(), useenv=False, nt=False) as context:
+        monitor = context.monitor("SIM_motor", pv_callback("SIM_motor", stats), notify_disconnect=True)
+        time.sleep(0.2)
+        for value in [1.0, 2.0, 3.0]:
+            server.post("SIM_motor", value)
+            time.sleep(0.05)
+        time.sleep(0.2)
+        monitor.close()
+
+    assert stats.total_updates >= 3
+    assert stats.last_value == 3.0
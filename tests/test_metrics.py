@@ -0,0 +1,115 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from tests.doubles.producer import ProducerFactorySpy, ProducerSpy
+
+from src.batch_producer import BatchProducer
+from src.metrics import MetricsServer, Registry, register_simulator_metrics
+from src.module_f144 import DeviceF144
+from src.run_thread import KafkaThreadF144
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+@pytest.fixture
+def metrics_server(registry):
+    server = MetricsServer(registry, port=0)
+    server.start()
+
+    yield server
+
+    server.stop()
+
+
+def scrape(server, path="/metrics"):
+    with urllib.request.urlopen(f"http://127.0.0.1:{server.port}{path}", timeout=5) as response:
+        return response.headers["Content-Type"], response.read().decode()
+
+
+def test_exposition_format(registry):
+    counter = registry.counter("requests_total", "Requests.")
+    counter.inc(device_type="a")
+    counter.inc(2, device_type="a")
+    registry.gauge("queue_depth", "Queue depth.", lambda: 7)
+
+    assert registry.exposition() == (
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{device_type="a"} 3.0\n'
+        "# HELP queue_depth Queue depth.\n"
+        "# TYPE queue_depth gauge\n"
+        "queue_depth 7.0\n"
+    )
+
+
+def test_label_values_are_escaped(registry):
+    registry.gauge("some_gauge", "Help.").set(1, name='a "quoted"\\name')
+
+    assert 'some_gauge{name="a \\"quoted\\"\\\\name"} 1.0' in registry.exposition()
+
+
+def test_duplicate_metric_is_rejected(registry):
+    registry.counter("requests_total", "Requests.")
+
+    with pytest.raises(ValueError):
+        registry.gauge("requests_total", "Requests.")
+
+
+def test_serves_metrics_over_http(registry, metrics_server):
+    registry.counter("requests_total", "Requests.").inc()
+
+    content_type, body = scrape(metrics_server)
+
+    assert content_type.startswith("text/plain")
+    assert "requests_total 1.0" in body
+
+
+def test_unknown_path_is_not_found(metrics_server):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        scrape(metrics_server, "/other")
+
+    assert error.value.code == 404
+
+
+def test_simulator_metrics(registry, metrics_server):
+    producer = ProducerSpy({}, should_throw=True)
+    device = DeviceF144(source_name="SIM_pv", topic="some_topic", dtype="double")
+    threads = [
+        KafkaThreadF144(device, ProducerSpy({}), config={"target_value": 1.0, "std_dev": None}),
+        KafkaThreadF144(device, producer, config={"target_value": 1.0, "std_dev": None}),
+    ]
+    for thread in threads:
+        thread._inner_run()
+    register_simulator_metrics(registry, lambda: threads)
+
+    _, body = scrape(metrics_server)
+
+    assert 'pv_simulator_updates_total{device_type="KafkaThreadF144"} 1.0' in body
+    assert 'pv_simulator_update_errors_total{device_type="KafkaThreadF144"} 1.0' in body
+    assert 'pv_simulator_threads{device_type="KafkaThreadF144",state="stopped"} 2.0' in body
+
+
+def test_producer_metrics(registry, metrics_server):
+    factory = ProducerFactorySpy()
+    producer = BatchProducer({}, producer_factory=factory, queue_full_timeout=0)
+    producer.produce("some_topic", b"msg")
+    producer.close()
+
+    def always_full(*args, **kwargs):
+        raise BufferError()
+
+    factory.producers[0].produce = always_full
+    with pytest.raises(BufferError):
+        producer.produce("some_topic", b"msg")
+    register_simulator_metrics(registry, lambda: [], producer=producer)
+
+    _, body = scrape(metrics_server)
+
+    assert "pv_simulator_kafka_delivered_total 1.0" in body
+    assert "pv_simulator_kafka_failed_total 0.0" in body
+    assert "pv_simulator_kafka_dropped_total 1.0" in body
@@ -0,0 +1,81 @@
+import time
+
+import numpy as np
+import pytest
+from streaming_data_types import deserialise_f144, serialise_f144
+
+from src.module_f144 import DeviceF144, F144Template
+
+SOURCE_NAME = "SIM:instrument:motor:position"
+
+
+@pytest.fixture
+def device():
+    return DeviceF144(source_name=SOURCE_NAME, topic="motion", dtype="double")
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        1.5,
+        -2.25,
+        float("nan"),
+        float("inf"),
+        7,
+        -3,
+        2**63 - 1,
+        np.float32(1.5),
+        np.int16(-5),
+        np.uint8(200),
+        np.uint64(2**64 - 1),
+        np.array(2.5),
+        np.linspace(-1, 1, 100),
+        np.arange(1, 51, dtype=np.int32),
+        np.zeros(10),
+        np.linspace(0, 1, 8)[::2],
+    ],
+)
+def test_messages_are_identical_to_serialise_f144(device, value):
+    for timestamp_ns in [1, time.time_ns(), -5]:
+        assert device.gen_message(value, timestamp_ns) == serialise_f144(SOURCE_NAME, value, timestamp_ns)
+
+
+@pytest.mark.parametrize("value, timestamp_ns", [(0.0, 1), (-0.0, 1), (0, 1), (1.5, 0), (np.empty(0), 1)])
+def test_default_values_fall_back_to_serialise_f144(device, value, timestamp_ns):
+    assert device.gen_message(value, timestamp_ns) == serialise_f144(SOURCE_NAME, value, timestamp_ns)
+
+
+def test_many_random_values_are_identical(device):
+    timestamp_ns = time.time_ns()
+    for value in np.random.default_rng(1).normal(0, 100, 2000).tolist():
+        assert device.gen_message(value, timestamp_ns) == serialise_f144(SOURCE_NAME, value, timestamp_ns)
+
+
+def test_unsupported_values_still_raise(device):
+    with pytest.raises(NotImplementedError):
+        device.gen_message(True, 1)
+    with pytest.raises(NotImplementedError):
+        device.gen_message(2**64, 1)
+
+
+def test_template_is_made_once_per_type(device):
+    device.gen_message(1.0)
+    device.gen_message(2.0)
+    device.gen_message(np.ones(4))
+
+    assert len(device._templates) == 2
+
+
+def test_template_round_trip():
+    template = F144Template(SOURCE_NAME, np.float64)
+
+    message = deserialise_f144(template.serialise(12.5, 1_700_000_000_123_456_789))
+
+    assert message.source_name == SOURCE_NAME
+    assert message.value == 12.5
+    assert message.timestamp_unix_ns == 1_700_000_000_123_456_789
+
+
+def test_unsupported_template_type():
+    with pytest.raises(ValueError):
+        F144Template(SOURCE_NAME, np.bool_)
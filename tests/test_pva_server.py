@@ -0,0 +1,284 @@
+import time
+
+import pytest
+
+from src.module_f144 import DeviceF144
+from src.pv_types import split_timestamp
+from src.pva_server import EpicsPVAServer
+from src.run_thread import EpicsThreadF144
+from src.scheduler import Scheduler
+
+ISOLATED_CONFIG = {
+    "EPICS_PVAS_INTF_ADDR_LIST": "127.0.0.1",
+    "EPICS_PVA_ADDR_LIST": "127.0.0.1",
+    "EPICS_PVA_AUTO_ADDR_LIST": "NO",
+    "EPICS_PVA_SERVER_PORT": "0",
+    "EPICS_PVA_BROADCAST_PORT": "0",
+}
+
+
+@pytest.fixture
+def server(tmp_path):
+    devices = {
+        "entry/motor": DeviceF144(
+            source_name="SIM_motor", topic="some_topic", dtype="double", value_units="mm",
+        )
+    }
+
+    server = EpicsPVAServer(
+        devices=devices,
+        gateway_config=ISOLATED_CONFIG,
+        target_config_path=str(tmp_path / "targets.json"),
+    )
+    server.start()
+    server.ready.wait(timeout=5)
+
+    yield server
+
+    server.stop()
+    server.join()
+
+
+def test_server_creates_pvs(server):
+    assert list(server.pvs.keys()) == ["SIM_motor"]
+
+
+def test_can_post_directly(server):
+    before_ns = time.time_ns()
+
+    assert server.post("SIM_motor", 12.5) is True
+
+    current = server.pvs["SIM_motor"].current()
+    timestamp_ns = (
+        current["timeStamp"]["secondsPastEpoch"] * 1_000_000_000
+        + current["timeStamp"]["nanoseconds"]
+    )
+    assert current["value"] == 12.5
+    assert timestamp_ns >= before_ns - 1_000_000_000
+
+
+def test_post_to_unknown_pv_is_skipped(server):
+    assert server.post("SIM_unknown", 1.0) is False
+
+
+def test_thread_posts_to_server(server):
+    device = server.devices["entry/motor"]
+    thread = EpicsThreadF144(
+        device, server=server, config={"target_value": 3.0, "std_dev": None}, update_period=0.01
+    )
+
+    thread.start()
+    time.sleep(0.05)
+    thread.stop()
+
+    assert server.pvs["SIM_motor"].current()["value"] == 3.0
+
+
+def test_thread_requires_context_or_server():
+    device = DeviceF144(source_name="SIM_motor", dtype="double")
+
+    with pytest.raises(ValueError):
+        EpicsThreadF144(device)
+
+
+def test_post_uses_given_timestamp(server):
+    server.post("SIM_motor", 1.0, timestamp_ns=1_700_000_000_123_456_789)
+
+    timestamp = server.pvs["SIM_motor"].current()["timeStamp"]
+    assert timestamp["secondsPastEpoch"] == 1_700_000_000
+    assert timestamp["nanoseconds"] == 123_456_789
+
+
+def test_post_only_changes_value_and_timestamp(server):
+    server.post("SIM_motor", 1.0)
+
+    assert server.updates["SIM_motor"].changedSet() == {
+        "value",
+        "timeStamp.secondsPastEpoch",
+        "timeStamp.nanoseconds",
+    }
+
+
+def test_client_put_is_timestamped(server):
+    from p4p.client.thread import Context
+
+    with Context("pva", conf=server.get_context().conf(), useenv=False) as context:
+        context.put("SIM_motor", 42.0)
+        result = context.get("SIM_motor")
+
+    assert result == 42.0
+    assert abs(result.timestamp - time.time()) < 5
+
+
+def test_split_timestamp():
+    assert split_timestamp(1_500_000_000) == (1, 500_000_000)
+
+
+def test_waveform_pv(tmp_path):
+    import numpy as np
+
+    device = DeviceF144(source_name="SIM_wave", topic="t", dtype="double", array_size=1000)
+    server = EpicsPVAServer(
+        devices={"entry/wave": device},
+        gateway_config=ISOLATED_CONFIG,
+        target_config_path=str(tmp_path / "targets.json"),
+    )
+    server.start()
+    server.ready.wait(timeout=5)
+    thread = EpicsThreadF144(
+        device, server=server, config={"target_value": 2.0, "std_dev": 0.1}, update_period=0.01
+    )
+
+    thread.start()
+    time.sleep(0.05)
+    thread.stop()
+    server.stop()
+    server.join()
+
+    value = server.pvs["SIM_wave"].current()["value"]
+    assert value.shape == (1000,)
+    assert value.mean() == pytest.approx(2.0, abs=0.05)
+    assert np.std(value) > 0
+
+
+@pytest.fixture
+def lazy_server(tmp_path):
+    devices = {
+        f"entry/motor_{i}": DeviceF144(source_name=f"SIM_motor_{i}", topic="t", dtype="double")
+        for i in range(3)
+    }
+    server = EpicsPVAServer(
+        devices=devices,
+        gateway_config=ISOLATED_CONFIG,
+        target_config_path=str(tmp_path / "targets.json"),
+        lazy=True,
+        idle_timeout=0.2,
+    )
+    server.start()
+    server.ready.wait(timeout=5)
+
+    yield server
+
+    server.stop()
+    server.join()
+
+
+def test_lazy_server_creates_pvs_on_first_connect(lazy_server):
+    from p4p.client.thread import Context
+
+    materialised = []
+    lazy_server.set_lifecycle_callbacks(materialised.append, lambda pv_name: None)
+
+    assert lazy_server.pvs == {}
+    with Context("pva", conf=lazy_server.get_context().conf(), useenv=False) as context:
+        context.put("SIM_motor_1", 7.0)
+        assert context.get("SIM_motor_1") == 7.0
+
+    assert list(lazy_server.pvs) == ["SIM_motor_1"]
+    assert materialised == ["SIM_motor_1"]
+
+
+def test_lazy_server_evicts_idle_pvs(lazy_server):
+    from p4p.client.thread import Context
+
+    evicted = []
+    lazy_server.set_lifecycle_callbacks(lambda pv_name: None, evicted.append)
+    with Context("pva", conf=lazy_server.get_context().conf(), useenv=False) as context:
+        context.get("SIM_motor_0")
+        time.sleep(0.5)
+        # Still connected, so not evicted
+        assert "SIM_motor_0" in lazy_server.pvs
+
+    deadline = time.monotonic() + 5
+    while "SIM_motor_0" in lazy_server.pvs and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert lazy_server.pvs == {}
+    assert evicted == ["SIM_motor_0"]
+    assert lazy_server.post("SIM_motor_0", 1.0) is False
+
+
+def test_lazy_server_does_not_create_unknown_pvs(lazy_server):
+    assert lazy_server.materialise("SIM_unknown") is None
+    assert lazy_server.pvs == {}
+
+
+def test_subscription_callbacks(server):
+    from p4p.client.thread import Context
+
+    events = []
+    server.set_subscription_callbacks(
+        lambda pv_name: events.append(("subscribe", pv_name)),
+        lambda pv_name: events.append(("unsubscribe", pv_name)),
+    )
+    assert events == [("unsubscribe", "SIM_motor")]
+
+    with Context("pva", conf=server.get_context().conf(), useenv=False) as context:
+        context.get("SIM_motor")
+        time.sleep(0.1)
+        assert events[-1] == ("subscribe", "SIM_motor")
+
+    deadline = time.monotonic() + 5
+    while events[-1][0] != "unsubscribe" and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert events[-1] == ("unsubscribe", "SIM_motor")
+
+
+def test_suspended_thread_resumes_with_fresh_value_on_connect(server):
+    from p4p.client.thread import Context
+
+    device = server.devices["entry/motor"]
+    scheduler = Scheduler(num_workers=1)
+    scheduler.start()
+    thread = EpicsThreadF144(
+        device,
+        server=server,
+        config={"target_value": 3.0, "std_dev": None},
+        update_period=10.0,
+        scheduler=scheduler,
+    )
+    server.set_subscription_callbacks(lambda pv_name: thread.resume(), lambda pv_name: thread.suspend())
+    thread.start()
+    time.sleep(0.05)
+    assert thread.updates == 0
+
+    values = []
+    with Context("pva", conf=server.get_context().conf(), useenv=False) as context:
+        subscription = context.monitor("SIM_motor", values.append)
+        deadline = time.monotonic() + 5
+        while 3.0 not in values and time.monotonic() < deadline:
+            time.sleep(0.05)
+        subscription.close()
+
+    thread.stop()
+    scheduler.stop()
+    assert thread.updates == 1
+    assert values[-1] == 3.0
+
+
+@pytest.mark.parametrize("dtype, target_value", [("string", "auto"), ("bool", True)])
+def test_non_numeric_pv_publishes_its_target_value(tmp_path, dtype, target_value):
+    from types import SimpleNamespace
+
+    from src.main import create_threads
+    from src.run_thread import SKIP
+    from src.simulation_core import SimulationCore
+
+    devices = {"entry/mode": DeviceF144(source_name="SIM_mode", topic="t", dtype=dtype)}
+    server = EpicsPVAServer(
+        devices=devices,
+        gateway_config=ISOLATED_CONFIG,
+        target_config_path=str(tmp_path / "targets.json"),
+    )
+    server.start()
+    server.ready.wait(timeout=5)
+    args = SimpleNamespace(fixed_rate=False, missed_ticks=SKIP)
+    target_config = {"SIM_mode": {"target_value": target_value}}
+
+    [thread] = create_threads(args, devices, target_config, server, None, None, None, SimulationCore(seed=0))
+    thread._inner_run()
+    server.stop()
+    server.join()
+
+    assert thread.errors == 0
+    assert server.pvs["SIM_mode"].current()["value"] == target_value
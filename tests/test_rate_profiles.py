@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from src.rate_profiles import (
+    MAX_RATE,
+    BurstRate,
+    ConstantRate,
+    RampRate,
+    profile_from_config,
+)
+
+
+def test_constant_rate():
+    assert ConstantRate(100).next_interval(5.0) == pytest.approx(0.01)
+
+
+def test_rate_is_capped():
+    assert ConstantRate(10 * MAX_RATE).next_interval(0.0) == pytest.approx(1 / MAX_RATE)
+
+
+def test_ramp_rate():
+    ramp = RampRate(start_rate=10, end_rate=110, duration=10)
+
+    assert ramp.rate(0) == 10
+    assert ramp.rate(5) == 60
+    assert ramp.rate(20) == 110
+
+
+def test_repeated_ramp_starts_over():
+    ramp = RampRate(start_rate=10, end_rate=110, duration=10, repeat=True)
+
+    assert ramp.rate(15) == 60
+
+
+def test_burst_rate():
+    burst = BurstRate(base_rate=0, burst_rate=1000, burst_duration=2, burst_interval=10)
+
+    assert burst.next_interval(1.0) == pytest.approx(0.001)
+    # Without a base rate the next update is at the start of the next burst
+    assert burst.next_interval(4.0) == pytest.approx(6.0)
+
+
+def test_poisson_intervals():
+    profile = profile_from_config({"rate_profile": {"type": "poisson", "rate": 500}}, rng=np.random.default_rng(1))
+
+    intervals = np.array([profile.next_interval(0.0) for _ in range(20000)])
+
+    assert intervals.mean() == pytest.approx(1 / 500, rel=0.05)
+    assert intervals.std() == pytest.approx(1 / 500, rel=0.05)
+
+
+def test_profile_from_config():
+    profile = profile_from_config(
+        {"rate_profile": {"type": "ramp", "start_rate": 1, "end_rate": 2, "duration": 3, "poisson": True}}
+    )
+
+    assert isinstance(profile, RampRate)
+    assert profile.poisson is True
+    assert profile_from_config({"target_value": 1}) is None
+
+
+def test_ramp_from_zero_waits_for_positive_rate():
+    ramp = RampRate(start_rate=-10, end_rate=100, duration=11)
+
+    # The rate crosses 0 after 1 s and rises by 10 Hz/s, one update is due sqrt(0.2) s later
+    assert ramp.next_interval(0.0) == pytest.approx(1.0 + np.sqrt(0.2))
+    assert RampRate(start_rate=0, end_rate=100, duration=10).next_interval(0.0) == pytest.approx(np.sqrt(0.2))
+
+
+def test_repeated_ramp_down_to_zero_waits_for_next_ramp():
+    ramp = RampRate(start_rate=100, end_rate=-100, duration=10, repeat=True)
+
+    assert ramp.next_interval(26.0) == pytest.approx(4.0)
+    # Not waiting for the almost stopped rate, at the start of the next ramp it is 100 Hz again
+    assert ramp.next_interval(5.0 - 1e-9) == pytest.approx(5.0)
+
+
+@pytest.mark.parametrize(
+    "profile_config",
+    [
+        {"type": "sawtooth"},
+        {"type": "constant"},
+        {"type": "constant", "rate": 0},
+        {"type": "poisson", "rate": -1},
+        {"type": "ramp", "start_rate": 0, "end_rate": 0, "duration": 10},
+        {"type": "ramp", "start_rate": 100, "end_rate": 0, "duration": 10},
+        {"type": "burst", "base_rate": 1, "burst_rate": 1},
+    ],
+)
+def test_invalid_profile_config_raises(profile_config):
+    with pytest.raises(ValueError):
+        profile_from_config({"rate_profile": profile_config})
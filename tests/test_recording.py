@@ -0,0 +1,154 @@
+import time
+
+import numpy as np
+import pytest
+from streaming_data_types import deserialise_f144
+
+from src.module_f144 import DeviceF144
+from src.recording import RECORD_DTYPE, Recorder, Recording, Replayer
+from src.run_thread import KafkaThreadF144
+from tests.doubles.producer import ProducerSpy
+
+
+@pytest.fixture
+def recording_path(tmp_path):
+    return str(tmp_path / "simulation.rec")
+
+
+def record(path, updates, buffer_records=4096):
+    recorder = Recorder(path, buffer_records=buffer_records)
+    for pv_name, timestamp_ns, value in updates:
+        recorder.record(recorder.pv_index(pv_name), timestamp_ns, value)
+    recorder.close()
+
+
+class PublishSpy:
+    def __init__(self):
+        self.published = []
+
+    def __call__(self, value, timestamp_ns):
+        self.published.append((value, timestamp_ns, time.monotonic()))
+        return True
+
+
+def test_recording_round_trip(recording_path):
+    updates = [("PV:A", 1_000, 1.5), ("PV:B", 2_000, -2.0), ("PV:A", 3_000, 2.5)]
+
+    record(recording_path, updates, buffer_records=2)
+    recording = Recording(recording_path)
+
+    assert recording.names == ["PV:A", "PV:B"]
+    assert len(recording) == 3
+    assert recording.records["pv"].tolist() == [0, 1, 0]
+    assert recording.records["timestamp_ns"].tolist() == [1_000, 2_000, 3_000]
+    assert recording.records["value"].tolist() == [1.5, -2.0, 2.5]
+    assert recording.duration_ns() == 2_000
+
+
+def test_partial_trailing_record_is_ignored(recording_path):
+    record(recording_path, [("PV:A", 1_000, 1.0), ("PV:A", 2_000, 2.0)])
+    with open(recording_path, "ab") as file:
+        file.write(b"\x00" * (RECORD_DTYPE.itemsize - 1))
+
+    assert len(Recording(recording_path)) == 2
+
+
+def test_rejects_file_that_is_not_a_recording(recording_path):
+    with open(recording_path, "wb") as file:
+        file.write(b"not a recording at all")
+
+    with pytest.raises(ValueError):
+        Recording(recording_path)
+
+
+def test_replay_at_maximum_speed_publishes_all_updates(recording_path):
+    updates = [(f"PV:{i % 3}", i * 1_000_000_000, float(i)) for i in range(30)]
+    record(recording_path, updates)
+    spies = {f"PV:{i}": PublishSpy() for i in range(3)}
+
+    started = time.monotonic()
+    replayer = Replayer(Recording(recording_path), spies, speed=0, original_timestamps=True)
+
+    assert replayer.run() == 30
+    assert time.monotonic() - started < 1.0
+    assert [value for value, _, _ in spies["PV:1"].published] == [float(i) for i in range(1, 30, 3)]
+    assert spies["PV:1"].published[0][1] == 1_000_000_000
+
+
+def test_replay_keeps_scaled_spacing(recording_path):
+    record(recording_path, [("PV:A", 0, 1.0), ("PV:A", 200_000_000, 2.0), ("PV:A", 400_000_000, 3.0)])
+    spy = PublishSpy()
+
+    Replayer(Recording(recording_path), {"PV:A": spy}, speed=2.0).run()
+
+    times = [received for _, _, received in spy.published]
+    assert times[2] - times[0] == pytest.approx(0.2, abs=0.05)
+    assert all(timestamp_ns is None for _, timestamp_ns, _ in spy.published)
+
+
+def test_replay_skips_pvs_without_target(recording_path):
+    record(recording_path, [("PV:A", 0, 1.0), ("PV:B", 1, 2.0)])
+    spy = PublishSpy()
+
+    replayer = Replayer(Recording(recording_path), {"PV:A": spy}, speed=None)
+    replayer.run()
+
+    assert replayer.published == 1
+    assert replayer.skipped == 1
+
+
+def test_replay_counts_updates_that_were_not_published_as_errors(recording_path):
+    record(recording_path, [("PV:A", 0, 1.0), ("PV:A", 1, 2.0)])
+
+    replayer = Replayer(Recording(recording_path), {"PV:A": lambda value, timestamp_ns: False}, speed=None)
+    replayer.run()
+
+    assert replayer.published == 0
+    assert replayer.errors == 2
+
+
+def test_replay_publishes_to_the_recorded_pvs_only(recording_path):
+    from types import SimpleNamespace
+
+    from src.main import create_replayer
+    from src.run_thread import EpicsThreadF144
+
+    record(recording_path, [("some_source", 0, 1.0)])
+    device = DeviceF144(source_name="some_source", topic="some_topic", dtype="double")
+    epics_thread = EpicsThreadF144(device, server=object())
+    kafka_thread = KafkaThreadF144(device, ProducerSpy({}))
+    args = SimpleNamespace(replay=recording_path, replay_speed=0, replay_original_timestamps=False)
+
+    replayer = create_replayer(args, [epics_thread, kafka_thread])
+
+    assert replayer.publishers == [(epics_thread.publish,)]
+
+
+def test_replay_cannot_be_combined_with_lazy_pvs(monkeypatch):
+    from src.main import parse_arguments
+
+    monkeypatch.setattr("sys.argv", ["main.py", "-j", "a.json", "-t", "b.json", "--replay", "run.rec", "--lazy-pvs"])
+
+    with pytest.raises(SystemExit):
+        parse_arguments()
+
+
+def test_recorded_thread_replays_identical_messages(recording_path):
+    device = DeviceF144(source_name="some_source", topic="some_topic", dtype="double", value_units="mm")
+    recorder = Recorder(recording_path)
+    producer = ProducerSpy({})
+    thread = KafkaThreadF144(device, producer, config={"target_value": 5, "std_dev": 1}, recorder=recorder)
+    for _ in range(10):
+        thread._inner_run()
+    recorder.close()
+
+    replay_producer = ProducerSpy({})
+    replay_thread = KafkaThreadF144(device, replay_producer)
+    Replayer(Recording(recording_path), {"some_source": replay_thread.publish}, speed=0, original_timestamps=True).run()
+
+    originals = [deserialise_f144(message["value"]) for message in producer.data]
+    replayed = [deserialise_f144(message["value"]) for message in replay_producer.data]
+    assert len(replayed) == 10
+    assert [message.value for message in replayed] == [message.value for message in originals]
+    assert [message.timestamp_unix_ns for message in replayed] == [message.timestamp_unix_ns for message in originals]
+    assert np.std([message.value for message in replayed]) > 0
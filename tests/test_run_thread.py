@@ -4,7 +4,8 @@ import numpy as np
 import pytest
 import time
 
-from src.run_thread import RunThread
+from src.rate_profiles import BurstRate, ConstantRate
+from src.run_thread import CATCH_UP, MIN_UPDATE_PERIOD, RunThread
 from src.module_f144 import DeviceF144
 
 
@@ -112,9 +113,9 @@ def test_can_run_thread(thread_f144):
 def test_set_update_period_too_low(thread_f144):
     thread = thread_f144
 
-    thread.set_update_period(0.0001)
+    thread.set_update_period(0.00001)
 
-    assert thread.update_period == 0.01
+    assert thread.update_period == MIN_UPDATE_PERIOD
 
 
 def test_set_update_period(thread_f144):
@@ -123,3 +124,163 @@ def test_set_update_period(thread_f144):
     thread.set_update_period(0.1)
 
     assert thread.update_period == 0.1
+
+
+def test_fixed_delay_schedules_after_finish(thread_f144):
+    thread = thread_f144
+
+    assert thread._next_due(due=10.0, now=10.005) == pytest.approx(10.015)
+
+
+def test_fixed_rate_schedules_on_deadline_grid(thread_f144):
+    thread = thread_f144
+    thread.set_fixed_rate(True)
+
+    assert thread._next_due(due=10.0, now=10.005) == pytest.approx(10.01)
+    assert thread.skipped_ticks == 0
+
+
+def test_fixed_rate_skips_missed_deadlines(thread_f144):
+    thread = thread_f144
+    thread.set_fixed_rate(True)
+    thread.set_missed_tick_policy("skip")
+
+    next_due = thread._next_due(due=10.0, now=10.035)
+
+    assert next_due == pytest.approx(10.04)
+    assert thread.skipped_ticks == 3
+
+
+def test_fixed_rate_catches_up_missed_deadlines(thread_f144):
+    thread = thread_f144
+    thread.set_fixed_rate(True)
+    thread.set_missed_tick_policy("catch_up")
+
+    next_due = thread._next_due(due=10.0, now=10.035)
+
+    assert next_due == pytest.approx(10.01)
+    assert thread.skipped_ticks == 0
+
+
+def test_catch_up_is_bounded(thread_f144):
+    thread = thread_f144
+    thread.set_fixed_rate(True)
+    thread.set_missed_tick_policy("catch_up")
+
+    next_due = thread._next_due(due=10.0, now=11.0)
+
+    assert next_due < 11.0
+    assert thread.skipped_ticks > 0
+
+
+def test_unknown_missed_tick_policy_raises(thread_f144):
+    thread = thread_f144
+
+    with pytest.raises(ValueError):
+        thread.set_missed_tick_policy("rewind")
+
+
+def test_late_ticks_are_counted(thread_f144):
+    thread = thread_f144
+    thread.set_fixed_rate(True)
+    thread._running = True
+
+    thread._tick(due=time.monotonic() - 1.0)
+    thread._tick(due=time.monotonic() + 1.0)
+
+    assert thread.late_ticks == 1
+
+
+def test_fixed_rate_keeps_rate_with_slow_work(thread_f144):
+    thread = thread_f144
+    thread.set_update_period(0.02)
+    thread.set_fixed_rate(True)
+    inner_run = thread._inner_run
+
+    def slow_inner_run():
+        inner_run()
+        time.sleep(0.01)
+
+    thread._inner_run = slow_inner_run
+
+    thread.start()
+    time.sleep(0.5)
+    thread.stop()
+
+    assert len(thread.run_data) >= 22
+
+
+def test_rate_profile_sets_period(thread_f144):
+    thread = thread_f144
+    thread.set_rate_profile(BurstRate(base_rate=10, burst_rate=1000, burst_duration=1, burst_interval=10))
+
+    assert thread._next_due(due=10.0, now=10.0001) == pytest.approx(10.001)
+    assert thread._next_due(due=12.0, now=12.0001) == pytest.approx(12.1)
+
+
+def test_rate_profile_from_timing_config(thread_f144):
+    thread = thread_f144
+
+    thread.set_timing_config({"rate_profile": {"type": "constant", "rate": 2000}})
+    assert isinstance(thread.rate_profile, ConstantRate)
+
+    thread.set_timing_config({})
+    assert thread.rate_profile is None
+
+
+def test_high_rate_profile_is_sustained(thread_f144):
+    thread = thread_f144
+    thread.set_rate_profile(ConstantRate(2000))
+    # Ticks missed while the test machine is busy are run late instead of lost
+    thread.set_missed_tick_policy(CATCH_UP)
+
+    thread.start()
+    time.sleep(0.5)
+    thread.stop()
+
+    assert len(thread.run_data) >= 800
+
+
+def test_suspended_thread_does_not_update(thread_f144):
+    thread = thread_f144
+
+    thread.start()
+    time.sleep(0.05)
+    thread.suspend()
+    count = len(thread.run_data)
+    time.sleep(0.05)
+
+    assert thread.is_alive() is True
+    assert len(thread.run_data) <= count + 1
+
+    thread.stop()
+
+
+def test_resume_updates_right_away(thread_f144):
+    thread = thread_f144
+    thread.set_update_period(10.0)
+    thread.suspend()
+    thread.start()
+    time.sleep(0.05)
+
+    assert thread.run_data == []
+
+    thread.resume()
+
+    assert len(thread.run_data) == 1
+    thread.stop()
+    assert thread.is_alive() is False
+
+
+def test_stop_while_suspended(thread_f144):
+    thread = thread_f144
+    thread.set_update_period(10.0)
+    thread.suspend()
+    thread.start()
+    time.sleep(0.05)
+
+    started = time.monotonic()
+    thread.stop()
+
+    assert time.monotonic() - started < 1.0
+    assert thread.is_alive() is False
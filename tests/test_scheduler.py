@@ -0,0 +1,198 @@
+import threading
+import time
+
+import pytest
+
+from src.run_thread import RunThread
+from src.scheduler import Scheduler
+
+
+class CountingThread(RunThread):
+    def __init__(self, update_period=1., scheduler=None):
+        super().__init__(update_period=update_period, scheduler=scheduler)
+        self.run_count = 0
+        self.thread_names = set()
+
+    def _inner_run(self):
+        self.run_count += 1
+        self.thread_names.add(threading.current_thread().name)
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Scheduler(num_workers=2)
+    scheduler.start()
+
+    yield scheduler
+
+    scheduler.stop()
+
+
+def test_scheduled_thread_does_not_create_own_thread(scheduler):
+    thread = CountingThread(update_period=0.01, scheduler=scheduler)
+
+    thread.start()
+
+    assert thread.is_alive() is True
+    assert thread.thread is None
+
+    thread.stop()
+
+
+def test_can_run_scheduled_thread(scheduler):
+    thread = CountingThread(update_period=0.01, scheduler=scheduler)
+
+    thread.start()
+    time.sleep(0.1)
+    thread.stop()
+
+    assert thread.run_count > 0
+    assert thread.is_alive() is False
+
+
+def test_no_runs_after_stop(scheduler):
+    thread = CountingThread(update_period=0.01, scheduler=scheduler)
+
+    thread.start()
+    time.sleep(0.05)
+    thread.stop()
+    count = thread.run_count
+    time.sleep(0.05)
+
+    assert thread.run_count == count
+
+
+def test_can_restart_scheduled_thread(scheduler):
+    thread = CountingThread(update_period=0.01, scheduler=scheduler)
+
+    thread.start()
+    thread.stop()
+    thread.start()
+    time.sleep(0.05)
+    thread.stop()
+
+    assert thread.run_count > 0
+    assert len(scheduler) <= 1
+
+
+def test_many_threads_share_worker_pool(scheduler):
+    threads = [CountingThread(update_period=0.01, scheduler=scheduler) for _ in range(1000)]
+
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    for thread in threads:
+        thread.stop()
+
+    assert all(thread.run_count > 0 for thread in threads)
+    names = set().union(*(thread.thread_names for thread in threads))
+    assert names <= {"scheduler-worker-0", "scheduler-worker-1"}
+
+
+class TimedThread(CountingThread):
+    def __init__(self, update_period=1., scheduler=None):
+        super().__init__(update_period=update_period, scheduler=scheduler)
+        self.tick_times = []
+
+    def _inner_run(self):
+        super()._inner_run()
+        self.tick_times.append(time.monotonic())
+
+
+def test_update_period_change_applies_to_next_tick(scheduler):
+    thread = TimedThread(update_period=0.2, scheduler=scheduler)
+
+    thread.start()
+    time.sleep(0.05)
+    thread.set_update_period(0.02)
+    time.sleep(0.3)
+    thread.stop()
+
+    # The tick already scheduled keeps the old period, the ones after it use the new one
+    gaps = [later - earlier for earlier, later in zip(thread.tick_times, thread.tick_times[1:])]
+    assert gaps[0] == pytest.approx(0.2, abs=0.05)
+    assert len(gaps) > 3
+    assert max(gaps[1:]) < 0.1
+
+
+class SlowThread(CountingThread):
+    def _inner_run(self):
+        super()._inner_run()
+        time.sleep(0.01)
+
+
+def test_overload_is_counted_and_reported(caplog):
+    scheduler = Scheduler(num_workers=1, overload_lag=0.005, report_interval=0.1)
+    scheduler.start()
+    threads = [SlowThread(update_period=0.005, scheduler=scheduler) for _ in range(5)]
+
+    with caplog.at_level("WARNING", logger="src.scheduler"):
+        for thread in threads:
+            thread.start()
+        time.sleep(0.4)
+        for thread in threads:
+            thread.stop()
+        scheduler.stop()
+
+    assert scheduler.dispatched > 0
+    assert scheduler.late_dispatches > 0
+    assert scheduler.max_lag > 0.005
+    assert "Scheduler overloaded" in caplog.text
+
+
+def test_no_overload_reported_within_capacity(caplog):
+    scheduler = Scheduler(num_workers=2, report_interval=0.1)
+    scheduler.start()
+    thread = CountingThread(update_period=0.01, scheduler=scheduler)
+
+    with caplog.at_level("WARNING", logger="src.scheduler"):
+        thread.start()
+        time.sleep(0.3)
+        thread.stop()
+        scheduler.stop()
+
+    assert scheduler.dispatched > 0
+    assert scheduler.late_dispatches == 0
+    assert "Scheduler overloaded" not in caplog.text
+
+
+def test_suspended_job_is_not_scheduled(scheduler):
+    thread = CountingThread(update_period=0.01, scheduler=scheduler)
+    thread.suspend()
+
+    thread.start()
+    time.sleep(0.05)
+    assert thread.run_count == 0
+
+    thread.resume()
+    assert thread.run_count == 1
+    time.sleep(0.05)
+    assert thread.run_count > 1
+
+    thread.suspend()
+    time.sleep(0.02)
+    count = thread.run_count
+    time.sleep(0.05)
+    assert thread.run_count == count
+
+    thread.stop()
+
+
+class UnschedulableThread(CountingThread):
+    def _next_due(self, due, now):
+        raise ValueError("no next tick")
+
+
+def test_job_that_cannot_be_rescheduled_does_not_stop_the_workers(scheduler):
+    broken = UnschedulableThread(update_period=0.01, scheduler=scheduler)
+    threads = [UnschedulableThread(update_period=0.01, scheduler=scheduler) for _ in range(4)]
+    working = CountingThread(update_period=0.01, scheduler=scheduler)
+
+    for thread in [broken, *threads, working]:
+        thread.start()
+    time.sleep(0.2)
+    for thread in [broken, *threads, working]:
+        thread.stop()
+
+    assert broken.run_count == 1
+    assert working.run_count > 5
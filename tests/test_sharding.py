@@ -0,0 +1,61 @@
+import sys
+
+from src.module_f144 import DeviceF144
+from src.sharding import Supervisor, shard_devices
+
+
+def wait_for_stop(name, stop_event):
+    stop_event.wait()
+
+
+def fail(name, stop_event):
+    sys.exit(1)
+
+
+def make_devices(count):
+    return {
+        f"entry/device_{i}": DeviceF144(source_name=f"SIM_{i}", topic="t", dtype="double")
+        for i in range(count)
+    }
+
+
+def test_shards_are_balanced():
+    shards = shard_devices(make_devices(10), 3)
+
+    assert [len(shard) for shard in shards] == [4, 3, 3]
+
+
+def test_every_device_is_in_exactly_one_shard():
+    devices = make_devices(10)
+
+    shards = shard_devices(devices, 4)
+
+    merged = {}
+    for shard in shards:
+        merged.update(shard)
+    assert merged == devices
+
+
+def test_more_shards_than_devices():
+    shards = shard_devices(make_devices(2), 3)
+
+    assert [len(shard) for shard in shards] == [1, 1, 0]
+
+
+def test_supervisor_stops_workers():
+    supervisor = Supervisor(wait_for_stop, [("a",), ("b",)])
+
+    supervisor.start()
+    assert supervisor.check_workers() == 2
+    supervisor.stop()
+
+    assert all(process.exitcode == 0 for process in supervisor.processes)
+
+
+def test_supervisor_restarts_failed_workers():
+    supervisor = Supervisor(fail, [("a",)], max_restarts=2, check_interval=0.05)
+
+    supervisor.run()
+
+    assert supervisor.restarts == [2]
+    assert supervisor.failed == {0}
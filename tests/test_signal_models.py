@@ -0,0 +1,148 @@
+import numpy as np
+import pytest
+
+from tests.doubles.producer import ProducerSpy
+
+from src.module_f144 import DeviceF144
+from src.run_thread import KafkaThreadF144
+from src.signal_models import FirstOrderLag, RandomWalk, Ramp, Sine, model_from_config
+from src.simulation_core import SimulationCore
+
+
+def samples(core, slot, count):
+    return np.array([core.sample(slot) for _ in range(count)])
+
+
+@pytest.fixture
+def core():
+    return SimulationCore(seed=7, block_ticks=8)
+
+
+def test_sine(core):
+    slot = core.add(10.0, None, Sine(amplitude=2, period=4), period=1.0)
+
+    assert samples(core, slot, 20) == pytest.approx([10, 12, 10, 8] * 5)
+
+
+def test_ramp_stays_at_end(core):
+    slot = core.add(None, None, Ramp(start=0, end=10, duration=5), period=1.0)
+
+    assert samples(core, slot, 12).tolist() == [0, 2, 4, 6, 8] + [10] * 7
+
+
+def test_repeated_ramp_starts_over(core):
+    slot = core.add(None, None, Ramp(start=0, end=10, duration=5, repeat=True), period=1.0)
+
+    assert samples(core, slot, 7) == pytest.approx([0, 2, 4, 6, 8, 0, 2])
+
+
+def test_lag_settles_on_new_target(core):
+    slot = core.add(0.0, None, FirstOrderLag(time_constant=1), period=0.5)
+
+    assert samples(core, slot, 5).tolist() == [0.0] * 5
+    core.set(slot, 10.0, None, FirstOrderLag(time_constant=1), period=0.5)
+    values = samples(core, slot, 30)
+
+    assert values[0] == pytest.approx(10 * (1 - np.exp(-0.5)))
+    assert np.all(np.diff(values) > 0)
+    assert values[-1] == pytest.approx(10.0, abs=1e-5)
+
+
+def test_random_walk_continues_across_blocks(core):
+    slot = core.add(100.0, None, RandomWalk(step=1.0), period=1.0)
+
+    steps = np.diff(samples(core, slot, 4000))
+
+    # No jumps back to the target value at the start of a block
+    assert steps.std() == pytest.approx(1.0, rel=0.1)
+
+
+def test_random_walk_reverts_to_target(core):
+    slot = core.add(5.0, None, RandomWalk(step=0.1, reversion=1.0), period=0.1)
+
+    assert samples(core, slot, 5000).mean() == pytest.approx(5.0, abs=0.1)
+
+
+def test_models_and_constants_share_a_core(core):
+    constant = core.add(3.0, None)
+    sine = core.add(0.0, None, Sine(amplitude=1, period=4), period=1.0)
+    ramp = core.add(None, None, Ramp(start=0, end=1, duration=4), period=1.0)
+
+    values = [(core.sample(constant), core.sample(sine), core.sample(ramp)) for _ in range(10)]
+
+    assert [value[0] for value in values] == [3.0] * 10
+    assert [value[1] for value in values] == pytest.approx([0, 1, 0, -1] * 2 + [0, 1], abs=1e-12)
+    assert [value[2] for value in values] == [0, 0.25, 0.5, 0.75] + [1.0] * 6
+
+
+def test_noise_is_added_to_the_model(core):
+    slot = core.add(0.0, 0.5, Sine(amplitude=1, period=2), period=0.5)
+
+    residuals = samples(core, slot, 4000) - np.sin(np.arange(4000) * np.pi / 2)
+
+    assert residuals.std() == pytest.approx(0.5, rel=0.1)
+
+
+def test_removing_the_model_goes_back_to_the_target(core):
+    slot = core.add(1.0, None, Ramp(start=5, end=6, duration=10), period=1.0)
+    core.sample(slot)
+
+    core.set(slot, 1.0, None)
+
+    assert samples(core, slot, 10).tolist() == [1.0] * 10
+
+
+def test_same_seed_gives_same_values():
+    values = []
+    for _ in range(2):
+        core = SimulationCore(seed=3, block_ticks=8)
+        slots = [core.add(0.0, 0.1, RandomWalk(step=1.0), period=0.1), core.add(1.0, 0.1)]
+        values.append([core.sample(slots[i % 2]) for i in range(100)])
+
+    assert values[0] == values[1]
+
+
+def test_model_from_config():
+    model = model_from_config({"model": {"type": "sine", "amplitude": 2.5, "period": 10}})
+
+    assert model == Sine(amplitude=2.5, period=10, phase=0)
+    assert model_from_config({"target_value": 1}) is None
+
+
+@pytest.mark.parametrize(
+    "model_config",
+    [
+        {"type": "square", "amplitude": 1},
+        {"type": "sine", "amplitude": 1},
+        {"type": "sine", "amplitude": 1, "period": 0},
+        {"type": "lag", "time_constant": 1, "speed": 2},
+        {"type": "random_walk", "step": -1},
+    ],
+)
+def test_invalid_model_config_raises(model_config):
+    with pytest.raises(ValueError):
+        model_from_config({"model": model_config})
+
+
+def test_thread_simulates_model_without_target_value(core):
+    producer = ProducerSpy({})
+    device = DeviceF144(source_name="some_source", topic="some_topic", dtype="double")
+    config = {"update_period": 0.5, "model": {"type": "ramp", "start": 0, "end": 1, "duration": 1}}
+    thread = KafkaThreadF144(device, producer, config=config, core=core)
+
+    for _ in range(3):
+        thread._inner_run()
+
+    assert len(producer.data) == 3
+    assert core.period[thread.slot] == 0.5
+
+
+def test_invalid_config_leaves_thread_unchanged(core):
+    device = DeviceF144(source_name="some_source", topic="some_topic", dtype="double")
+    thread = KafkaThreadF144(device, ProducerSpy({}), config={"target_value": 1.0, "update_period": 0.5}, core=core)
+
+    with pytest.raises(ValueError):
+        thread.set_config({"target_value": 2.0, "update_period": 0.1, "model": {"type": "square"}})
+
+    assert thread.value == 1.0
+    assert thread.update_period == 0.5
@@ -0,0 +1,160 @@
+import numpy as np
+import pytest
+
+from tests.doubles.producer import ProducerSpy
+
+from src.module_f144 import DeviceF144
+from src.run_thread import KafkaThreadF144
+from src.simulation_core import ChopperTimestamps, SimulationCore, WaveformBuffer
+
+
+@pytest.fixture
+def core():
+    return SimulationCore(seed=42, block_ticks=8, capacity=2)
+
+
+def test_add_returns_consecutive_slots(core):
+    assert core.add(1.0, 0.1) == 0
+    assert core.add(2.0, 0.1) == 1
+    assert len(core) == 2
+
+
+def test_grows_beyond_capacity(core):
+    slots = [core.add(i, None) for i in range(10)]
+
+    assert slots == list(range(10))
+    assert [core.sample(slot) for slot in slots] == list(range(10))
+
+
+def test_sample_without_noise_is_target(core):
+    slot = core.add(5.0, None)
+
+    assert core.sample(slot) == 5.0
+
+
+def test_sample_has_configured_noise(core):
+    slot = core.add(10.0, 2.0)
+
+    samples = np.array([core.sample(slot) for _ in range(5000)])
+
+    assert samples.mean() == pytest.approx(10.0, abs=0.2)
+    assert samples.std() == pytest.approx(2.0, rel=0.1)
+
+
+def test_samples_are_not_reused_across_blocks(core):
+    slot = core.add(0.0, 1.0)
+
+    samples = [core.sample(slot) for _ in range(3 * core.block_ticks)]
+
+    assert len(set(samples)) == len(samples)
+
+
+def test_same_seed_gives_same_samples():
+    first = SimulationCore(seed=1)
+    second = SimulationCore(seed=1)
+    for sim in (first, second):
+        sim.add(1.0, 0.5)
+        sim.add(2.0, 0.5)
+
+    assert [first.sample(i % 2) for i in range(100)] == [second.sample(i % 2) for i in range(100)]
+
+
+def test_fast_device_only_refills_its_own_block(core):
+    slow = core.add(0.0, 1.0)
+    fast = core.add(0.0, 1.0)
+    core.sample(slow)
+    upcoming = core._values[slow, 1:].tolist()
+
+    for _ in range(10 * core.block_ticks):
+        core.sample(fast)
+
+    assert [core.sample(slow) for _ in range(core.block_ticks - 1)] == upcoming
+
+
+def test_set_updates_target(core):
+    slot = core.add(1.0, None)
+
+    core.set(slot, 3.0, None)
+
+    assert core.sample(slot) == 3.0
+
+
+def test_thread_uses_core(core):
+    producer = ProducerSpy({})
+    device = DeviceF144(source_name="some_source", topic="some_topic", dtype="double")
+    thread = KafkaThreadF144(
+        device, producer, config={"target_value": 4.0, "std_dev": None}, core=core
+    )
+
+    thread._inner_run()
+    thread.set_config({"target_value": 6.0, "std_dev": None})
+    thread._inner_run()
+
+    assert thread.slot == 0
+    assert len(core) == 1
+    assert len(producer.data) == 2
+
+
+def test_waveform_buffer_is_reused():
+    waveform = WaveformBuffer(100, rng=np.random.default_rng(0))
+
+    first = waveform.generate(1.0, 0.1)
+    second = waveform.generate(1.0, 0.1)
+
+    assert first is second
+    assert second.shape == (100,)
+
+
+def test_waveform_buffer_per_element_targets():
+    waveform = WaveformBuffer(3)
+
+    assert waveform.generate(np.array([1.0, 2.0, 3.0])).tolist() == [1.0, 2.0, 3.0]
+
+
+def test_waveform_buffer_int_dtype():
+    waveform = WaveformBuffer(1000, dtype=np.int32, rng=np.random.default_rng(0))
+
+    values = waveform.generate(100, 5)
+
+    assert values.dtype == np.int32
+    assert abs(values.mean() - 100) < 1
+
+
+def test_chopper_timestamps_are_due_revolutions():
+    timestamps = ChopperTimestamps(frequency=14.0, start_ns=0)
+
+    first = timestamps.until(999_999_999)
+    second = timestamps.until(2_000_000_000)
+
+    assert first.dtype == np.uint64
+    assert len(first) == 14
+    assert first[0] == 0
+    assert np.allclose(np.diff(first.astype(np.int64)), 1e9 / 14, atol=1)
+    # Revolutions are never returned twice
+    assert len(second) == 15
+    assert second[0] == round(14 * 1e9 / 14)
+
+
+def test_chopper_timestamps_jitter():
+    timestamps = ChopperTimestamps(frequency=14.0, jitter_ns=100.0, start_ns=0, rng=np.random.default_rng(1))
+
+    jittered = timestamps.until(1000 * 10**9).astype(np.int64)
+    nominal = np.rint(np.arange(len(jittered)) * 1e9 / 14).astype(np.int64)
+
+    assert len(jittered) == 14001
+    assert np.std(jittered - nominal) == pytest.approx(100.0, rel=0.1)
+
+
+def test_chopper_timestamps_before_start():
+    timestamps = ChopperTimestamps(start_ns=10**9)
+
+    assert len(timestamps.until(0)) == 0
+
+
+def test_chopper_frequency_change_continues_from_next_revolution():
+    timestamps = ChopperTimestamps(frequency=10.0, start_ns=0)
+    timestamps.until(10**9 - 1)
+
+    timestamps.set_frequency(20.0)
+
+    assert timestamps.until(10**9 + 100_000_000).tolist() == [10**9, 10**9 + 50_000_000, 10**9 + 100_000_000]